@@ -0,0 +1,454 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol, Tuple
+
+from completion_cache import CompletionCache
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Backends selectable from the "llm" section of config.json
+BACKEND_OPENAI = "openai"
+BACKEND_STUB = "stub"
+
+# Envelope used when several classification prompts share one completion
+_BATCH_HEADER = "=== Request {index} ==="
+_BATCH_PATTERN = re.compile(r"^=== Request (\d+) ===$", re.MULTILINE)
+_BATCH_INSTRUCTIONS = (
+    "\n\nYou will receive {count} independent requests, each one starting with a line "
+    "'=== Request <number> ==='. Answer every request exactly as you would answer it alone, "
+    "following the instructions above. Return only a JSON array of {count} strings, "
+    "where the i-th string is your complete answer to request i."
+)
+
+
+class Backend(Protocol):
+    """
+    Interface of the chat completion providers used by LLMGateway.
+    """
+
+    async def complete(self, model: str, messages: List[dict], **params) -> str:
+        ...
+
+
+class OpenAIBackend:
+    """
+    Chat completions through the OpenAI async client.
+    """
+
+    def __init__(self, api_key: Optional[str]) -> None:
+        self.api_key = api_key
+        self._client = None
+
+    async def complete(self, model: str, messages: List[dict], **params) -> str:
+        if self._client is None:
+            import openai
+            self._client = openai.AsyncOpenAI(api_key=self.api_key)
+        response = await self._client.chat.completions.create(model=model, messages=messages, **params)
+        return response.choices[0].message.content
+
+
+def _stub_answer(messages: List[dict]) -> str:
+    digest = hashlib.sha1(str(messages[-1].get("content", "")).encode("utf-8")).hexdigest()[:12]
+    return f"stub completion {digest}"
+
+
+class StubBackend:
+    """
+    Offline backend for tests and benchmarks: waits `latency` seconds and answers with
+    `responder(messages)`, a deterministic digest of the last message by default.
+
+    Batched classification prompts are split back into their requests, so a batch gets
+    the same answers as the individual calls would.
+    """
+
+    def __init__(self, latency: float = 0.0, responder: Optional[Callable[[List[dict]], str]] = None) -> None:
+        self.latency = latency
+        self.responder = responder or _stub_answer
+        self.calls = 0
+
+    async def complete(self, model: str, messages: List[dict], **params) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        parts = split_batch(messages)
+        if parts is None:
+            return self.responder(messages)
+        return json.dumps([self.responder(part) for part in parts])
+
+
+def split_batch(messages: List[dict]) -> Optional[List[List[dict]]]:
+    """
+    Recover the individual [system, user] conversations of a batched prompt, or None if
+    `messages` is not a batch.
+    """
+    if len(messages) != 2 or messages[0].get("role") != "system":
+        return None
+    system = messages[0]["content"]
+    marker = system.rfind("\n\nYou will receive ")
+    body = messages[1]["content"]
+    headers = list(_BATCH_PATTERN.finditer(body))
+    if marker < 0 or not headers:
+        return None
+    system = system[:marker]
+    parts = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(body)
+        parts.append([{"role": "system", "content": system},
+                      {"role": "user", "content": body[header.end():end].strip("\n")}])
+    return parts
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `requests_per_minute` calls, with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: Optional[int] = None) -> None:
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(requests_per_minute // 60) or 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> float:
+        """
+        Wait for a token and return the time spent waiting.
+        """
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return waited
+            delay = (1.0 - self.tokens) / self.rate
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+class GatewayStats:
+    """
+    Counters of the gateway: requests, coalesced duplicates, backend calls, batches and errors.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.coalesced = 0
+        self.backend_calls = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.batch_fallbacks = 0
+        self.errors = 0
+        self.cache_rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limit_wait = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class LLMGateway:
+    """
+    Single entry point for every chat completion of a node.
+
+    Calls run on a private event loop thread, so blocking agents (`complete`) and asyncio
+    code (`acomplete`) share the same bounded pool of backend calls. Identical prompts in
+    flight at the same time share one backend call, each model is rate limited with a
+    token bucket, and classification prompts can opt in to micro-batching: the ones that
+    share a system prompt and arrive within `batch_window` seconds are answered by a single
+    completion. Call sites whose prompt is a pure function of its inputs can also opt in to
+    the on-disk completion cache, with a check keeping the answers they cannot use out of it.
+    """
+
+    def __init__(self, backend: Backend, max_concurrency: int = 8,
+                 rate_limits: Optional[Dict[str, float]] = None,
+                 batch_window: float = 0.02, max_batch_size: int = 8,
+                 cache: Optional[CompletionCache] = None) -> None:
+        """
+        Args:
+            backend (Backend): The completion provider.
+            max_concurrency (int): Maximum backend calls running at once.
+            rate_limits (Dict[str, float], optional): Requests per minute allowed per model.
+            batch_window (float): Seconds a batchable prompt waits for companions.
+            max_batch_size (int): Maximum prompts answered by one batched completion.
+            cache (CompletionCache, optional): Persistent store of the cacheable completions.
+        """
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.rate_limits = dict(rate_limits or {})
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self.stats = GatewayStats()
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._batches: Dict[Tuple[str, str, str], List[Tuple[str, asyncio.Future]]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, api_key: Optional[str], config: Optional[dict]) -> "LLMGateway":
+        """
+        Build a gateway from the optional "llm" section of config.json.
+        """
+        config = dict(config or {})
+        backend_name = config.pop("backend", BACKEND_OPENAI)
+        stub_latency = float(config.pop("stub_latency", 0.0))
+        config.pop("batch_find_type", None)  # read by the hub, not by the gateway
+        cache_path = config.pop("cache_path", "completion_cache.db")
+        cache_max_bytes = int(config.pop("cache_max_bytes", 64 * 1024 * 1024))
+        cache_max_entries = int(config.pop("cache_max_entries", 100_000))
+        cache_ttl = config.pop("cache_ttl", 7 * 24 * 3600)
+        if cache_path:
+            config["cache"] = CompletionCache(cache_path, cache_max_bytes, cache_max_entries,
+                                              float(cache_ttl) if cache_ttl else None)
+        if backend_name == BACKEND_STUB:
+            backend = StubBackend(latency=stub_latency)
+        else:
+            backend = OpenAIBackend(api_key)
+        return cls(backend, **config)
+
+    # ------------------------------------------------------------ event loop
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="llm-gateway", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def _submit(self, messages: List[dict], model: str, batch: bool, cache: bool,
+                cache_check: Optional[Callable[[str], bool]], params: dict) -> concurrent.futures.Future:
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(
+            self._complete(messages, model, batch, cache, cache_check, params), loop)
+
+    def close(self) -> None:
+        """
+        Stop the gateway thread. Calls still running are abandoned.
+        """
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    # ------------------------------------------------------------ public API
+
+    def complete(self, messages: List[dict], model: str = DEFAULT_MODEL, batch: bool = False,
+                 cache: bool = False, cache_check: Optional[Callable[[str], bool]] = None, **params) -> str:
+        """
+        Blocking chat completion.
+
+        Args:
+            messages (List[dict]): The conversation sent to the model.
+            model (str): The model name.
+            batch (bool): Allow micro-batching with other [system, user] classification prompts.
+            cache (bool): Answer from, and store into, the on-disk completion cache.
+            cache_check (Callable[[str], bool], optional): Whether an answer is usable (e.g. it
+                parses); the others are returned but not stored.
+            **params: Extra completion parameters (temperature, ...).
+
+        Returns:
+            str: The content of the answer.
+        """
+        return self._submit(messages, model, batch, cache, cache_check, params).result()
+
+    async def acomplete(self, messages: List[dict], model: str = DEFAULT_MODEL, batch: bool = False,
+                        cache: bool = False, cache_check: Optional[Callable[[str], bool]] = None,
+                        **params) -> str:
+        """
+        Chat completion for asyncio code; same arguments as `complete`.
+        """
+        return await asyncio.wrap_future(self._submit(messages, model, batch, cache, cache_check, params))
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Gateway counters, the number of prompts waiting in a batch and the completion cache stats.
+        """
+        result = self.stats.as_dict()
+        result["queued_for_batch"] = sum(len(items) for items in self._batches.values())
+        if self.cache is not None:
+            result["completion_cache"] = self.cache.stats()
+        return result
+
+    # ------------------------------------------------------ gateway loop side
+
+    async def _complete(self, messages: List[dict], model: str, batch: bool, cache: bool,
+                        cache_check: Optional[Callable[[str], bool]], params: dict) -> str:
+        self.stats.requests += 1
+        key = _request_key(model, messages, params)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            cache = cache and self.cache is not None
+            if cache:
+                stored = await asyncio.to_thread(self.cache.get, key)
+                if stored is not None:
+                    return stored
+                task = self._inflight.get(key)  # another caller may have started it meanwhile
+            if task is not None:
+                self.stats.coalesced += 1
+                return await asyncio.shield(task)
+            if batch and _is_batchable(messages):
+                coroutine = self._enqueue_batch(messages, model, params)
+            else:
+                coroutine = self._call(model, messages, params)
+            if cache:
+                coroutine = self._store(key, model, coroutine, cache_check)
+            task = asyncio.ensure_future(coroutine)
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        # Shielded so one caller giving up does not cancel the answer of the others
+        return await asyncio.shield(task)
+
+    async def _store(self, key: str, model: str, coroutine: Awaitable[str],
+                     cache_check: Optional[Callable[[str], bool]] = None) -> str:
+        completion = await coroutine
+        if cache_check is not None and not cache_check(completion):
+            # An answer the caller cannot parse would otherwise be replayed until it expires
+            self.stats.cache_rejected += 1
+            return completion
+        try:
+            await asyncio.to_thread(self.cache.put, key, model, completion)
+        except Exception as e:
+            print(f"Failed to store the completion in the cache: {e}")
+        return completion
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.errors += 1
+
+    async def _call(self, model: str, messages: List[dict], params: dict) -> str:
+        limiter = self._limiter(model)
+        async with self._semaphore:
+            if limiter is not None:
+                self.stats.rate_limit_wait += await limiter.acquire()
+            self.stats.backend_calls += 1
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+            try:
+                return await self.backend.complete(model, messages, **params)
+            finally:
+                self.stats.in_flight -= 1
+
+    def _limiter(self, model: str) -> Optional[RateLimiter]:
+        limiter = self._limiters.get(model)
+        if limiter is None and model in self.rate_limits:
+            limiter = RateLimiter(float(self.rate_limits[model]))
+            self._limiters[model] = limiter
+        return limiter
+
+    async def _enqueue_batch(self, messages: List[dict], model: str, params: dict) -> str:
+        group = (model, messages[0]["content"], json.dumps(params, sort_keys=True))
+        future = asyncio.get_running_loop().create_future()
+        items = self._batches.setdefault(group, [])
+        items.append((messages[1]["content"], future))
+        if len(items) == 1:
+            asyncio.get_running_loop().call_later(self.batch_window, self._flush_batch, group, items)
+        elif len(items) >= self.max_batch_size:
+            self._flush_batch(group, items)
+        return await future
+
+    def _flush_batch(self, group: Tuple[str, str, str], items: list) -> None:
+        if self._batches.get(group) is not items:
+            return  # already flushed when it reached max_batch_size
+        del self._batches[group]
+        asyncio.ensure_future(self._run_batch(group, items))
+
+    async def _run_batch(self, group: Tuple[str, str, str], items: list) -> None:
+        model, system, params_json = group
+        params = json.loads(params_json)
+        live = [(content, future) for content, future in items if not future.done()]
+        if not live:
+            return
+        answers: Optional[List[str]] = None
+        if len(live) > 1:
+            self.stats.batches += 1
+            self.stats.batched_requests += len(live)
+            batch_messages = [
+                {"role": "system", "content": system + _BATCH_INSTRUCTIONS.format(count=len(live))},
+                {"role": "user", "content": "\n\n".join(
+                    f"{_BATCH_HEADER.format(index=i + 1)}\n{content}" for i, (content, _) in enumerate(live))},
+            ]
+            try:
+                answers = _parse_batch_answer(await self._call(model, batch_messages, params), len(live))
+            except Exception as e:
+                print(f"Batched completion failed, answering one by one: {e}")
+            if answers is None:
+                self.stats.batch_fallbacks += 1
+        if answers is None:
+            results = await asyncio.gather(
+                *(self._call(model, [{"role": "system", "content": system}, {"role": "user", "content": content}], params)
+                  for content, _ in live),
+                return_exceptions=True,
+            )
+        else:
+            results = answers
+        for (_, future), result in zip(live, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def _request_key(model: str, messages: List[dict], params: dict) -> str:
+    payload = json.dumps([model, messages, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _is_batchable(messages: List[dict]) -> bool:
+    return (len(messages) == 2 and messages[0].get("role") == "system"
+            and messages[1].get("role") == "user" and isinstance(messages[1].get("content"), str))
+
+
+def _parse_batch_answer(text: str, count: int) -> Optional[List[str]]:
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.DOTALL)
+    try:
+        answers = json.loads(match.group(1) if match else text)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(answers, list) or len(answers) != count:
+        return None
+    return [answer if isinstance(answer, str) else json.dumps(answer) for answer in answers]
+
+
+_shared_gateway: Optional[LLMGateway] = None
+
+
+def shared_gateway(api_key: Optional[str] = None, config: Optional[dict] = None) -> LLMGateway:
+    """
+    Return the process-wide LLM gateway, creating it from `config` on first use.
+    """
+    global _shared_gateway
+    if _shared_gateway is None:
+        _shared_gateway = LLMGateway.from_config(api_key, config)
+    return _shared_gateway
@@ -1,15 +1,26 @@
-import openai
 import yaml
 import json
 import logging
 from typing import NewType, Tuple, List, Dict, Any
 from db_chat import ChatDatabase
 from hotel_database import HotelDatabase
+from llm_gateway import shared_gateway
 import re
 
 # Configure the logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+
+def holds_yaml_block(text: str) -> bool:
+    # Whether the answer has a ```yaml block end_conversation can parse, worth caching
+    yaml_match = re.search(r'```yaml(.*?)```', text, re.DOTALL)
+    if not yaml_match:
+        return False
+    try:
+        return isinstance(yaml.safe_load(yaml_match.group(1).strip()), dict)
+    except yaml.YAMLError:
+        return False
+
 class ReservationAssistant:
     def __init__(self, config_file='config.json'):
         logging.info("Initializing ReservationAssistant")
@@ -21,7 +32,8 @@ class ReservationAssistant:
                 api_key = config.get("api_key")
                 if not api_key:
                     raise ValueError("API key must be provided.")
-                openai.api_key = api_key
+                # Shared LLM gateway: bounded, rate limited and coalescing OpenAI calls
+                self.llm = shared_gateway(api_key, config.get("llm"))
                 logging.info("API key loaded successfully")
         except FileNotFoundError:
             logging.error("Configuration file not found")
@@ -105,13 +117,10 @@ class ReservationAssistant:
         conversation_for_dates = self.prepare_date_extraction_conversation(conversation)
         logging.info("Sending date extraction request to OpenAI")
 
-        date_extraction_response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=conversation_for_dates
-        )
+        date_extraction_response = self.llm.complete(conversation_for_dates, model="gpt-4o-mini")
         logging.info("Date extraction response received")
 
-        return self.parse_dates(date_extraction_response.choices[0].message.content)
+        return self.parse_dates(date_extraction_response)
 
     def prepare_date_extraction_conversation(self, conversation: List[Dict[str, str]]) -> List[Dict[str, str]]:
         # Define the system prompt for extracting reservation dates
@@ -247,13 +256,8 @@ class ReservationAssistant:
         logging.info("Fetching room recommendations based on dates and preferences")
 
         conversation.append({"role": "user", "content": recommendation_prompt})
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=conversation
-        )
+        assistant_reply = self.llm.complete(conversation, model="gpt-4o-mini")
         logging.info("Room recommendation response received from OpenAI")
-
-        assistant_reply = response.choices[0].message.content
         logging.info(f"Assistant reply: {assistant_reply}")
         # conversation.append({"role": "assistant", "content": assistant_reply})
 
@@ -275,15 +279,9 @@ class ReservationAssistant:
             {"role": "user", "content": prompt}
         ]
 
-        # Generate a response using OpenAI's chat completions API
-        api_response = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=conversation
-        )
+        # Generate a response using OpenAI's chat completions API; it only depends on the prompt line
+        yaml_output = self.llm.complete(conversation, model="gpt-4o-mini", cache=True, cache_check=holds_yaml_block)
         logging.info("Received response from OpenAI for ending conversation")
-
-        # Extract the YAML output from the response
-        yaml_output = api_response.choices[0].message.content
         logging.info(f"YAML output: {yaml_output}")
 
         # Use regex to extract the YAML block between ```yaml and ```
@@ -337,14 +335,8 @@ class ReservationAssistant:
         ]
 
         
-        api_response = openai.chat.completions.create(
-            model=model,
-            messages=conversation
-        )
+        yaml_output = self.llm.complete(conversation, model=model)
         logging.info("Received response from OpenAI for link reservation")
-
-        # Extract the YAML output from the response
-        yaml_output = api_response.choices[0].message.content
         logging.info(f"YAML output: {yaml_output}")
 
         # Use regex to extract the YAML block between ```yaml and ```
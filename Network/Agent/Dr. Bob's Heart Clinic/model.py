@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-import openai
 import json
+from llm_gateway import shared_gateway
 # Request and Response models
 class ConsultationRequest(BaseModel):
     situation: str
@@ -19,7 +19,8 @@ class Doctor:
         with open('config.json') as config_file:
             config = json.load(config_file)
             self.api_key = config.get("api_key")
-        openai.api_key = self.api_key
+        # Shared LLM gateway: bounded, rate limited and coalescing OpenAI calls
+        self.llm = shared_gateway(self.api_key, config.get("llm"))
 
     def consult(self, health_status: str) -> str:
         """
@@ -37,8 +38,7 @@ class Doctor:
         ]
         # OpenAI API call (you need to have your API key set up)
         try:
-            response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages)
-            return response.choices[0].message.content
+            return self.llm.complete(messages, model="gpt-4o-mini")
         except Exception as e:
             return f"Error getting advice: {str(e)}"
 
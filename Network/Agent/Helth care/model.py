@@ -1,11 +1,12 @@
 from typing import NewType, Tuple, List, Dict
-import requests
-import openai
+import httpx
 import json
 import csv
 import yaml
 import re
 from utils import read_file_as_strings
+from transport import shared_transport
+from llm_gateway import shared_gateway
 
 # Custom types for IP, Port, Address, Name, and Friend
 IP = NewType('IP', str)
@@ -31,7 +32,10 @@ class HealthcareAssistant:
             config = json.load(config_file)
             self.api_key = config.get("api_key")
 
-        openai.api_key = self.api_key
+        # Shared keep-alive HTTP transport for every call to hubs, doctors and pharmacies
+        self.transport = shared_transport(config.get("transport"))
+        # Shared LLM gateway: bounded, rate limited and coalescing OpenAI calls
+        self.llm = shared_gateway(self.api_key, config.get("llm"))
 
     def _load_hubs(self) -> List[Friend]:
         """
@@ -62,9 +66,10 @@ class HealthcareAssistant:
         with open(file_path, 'r') as file:
             return file.read()
 
-    def _get_openai_response(self, system_prompt: str, user_prompt: str) -> str:
+    def _get_openai_response(self, system_prompt: str, user_prompt: str, cache: bool = False) -> str:
         """
         Get a response from the OpenAI API based on system and user prompts.
+        With `cache`, identical prompts are answered from the on-disk completion cache.
         """
         messages = [
             {"role": "system", "content": system_prompt},
@@ -72,8 +77,7 @@ class HealthcareAssistant:
         ]
         # OpenAI API call (you need to have your API key set up)
         try:
-            response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages)
-            return response.choices[0].message.content
+            return self.llm.complete(messages, model="gpt-4o-mini", cache=cache)
         except Exception as e:
             return f"Error getting advice: {str(e)}"
 
@@ -104,7 +108,7 @@ class HealthcareAssistant:
         Find a doctor for the given health condition by querying hubs and returning the results.
         """
         system_prompt = self._read_file_as_string("system_prompt_find_doctor.txt")
-        doctor_type = self._get_openai_response(system_prompt, f"I need a doctor for {health_condition}.")
+        doctor_type = self._get_openai_response(system_prompt, f"I need a doctor for {health_condition}.", cache=True)
         
         # Log the conversation about finding a doctor
         self._log_chat("system", system_prompt, f"I need a doctor for {health_condition}.", doctor_type)
@@ -121,7 +125,7 @@ class HealthcareAssistant:
             }
             hubs_seen.append(hub)
             try:
-                response = requests.post(hub_url, params={'prompt': f"Can you find doctors specializing in {doctor_type}?", 'name_agent': self.name},
+                response = self.transport.post(hub_url, params={'prompt': f"Can you find doctors specializing in {doctor_type}?", 'name_agent': self.name},
                                         headers={'accept': 'application/json', 'Content-Type': 'application/json'},
                                         json=payload)
                 response_data = response.json()
@@ -129,7 +133,7 @@ class HealthcareAssistant:
                 if response_data.get("status") == "Find":
                    return self._get_sorted_friends(response_data.get('agents'))
         
-            except requests.exceptions.HTTPError as http_err:
+            except httpx.HTTPError as http_err:
                 print(f"HTTP error: {http_err}")
             except Exception as err:
                 print(f"An error occurred: {err}")
@@ -140,9 +144,9 @@ class HealthcareAssistant:
         """
         doctor_ip, doctor_port = doctor[1]
         try:
-            response = requests.post(f"http://{doctor_ip}:{doctor_port}/consult", json={"situation": health_status})
+            response = self.transport.post(f"http://{doctor_ip}:{doctor_port}/consult", json={"situation": health_status})
             return response.json().get('advice', "No advice provided")
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             return f"Error consulting doctor: {e}"
 
     def buy_medicine(self, pharmacies: List[Friend], prescription: Dict[str, int]) -> str:
@@ -163,8 +167,8 @@ class HealthcareAssistant:
             
             try:
                 # Fetch API document from the pharmacy
-                api_document = requests.get(pharmacy_url).text
-            except requests.RequestException as e:
+                api_document = self.transport.get(pharmacy_url).text
+            except httpx.HTTPError as e:
                 print(f"Error fetching API document from pharmacy {pharmacy_ip}:{pharmacy_port} - {e}")
                 continue
 
@@ -377,7 +381,7 @@ class HealthcareAssistant:
             
             try:
                 # Query the hub to find pharmacies
-                response = requests.post(hub_url, 
+                response = self.transport.post(hub_url, 
                                         params={'prompt': f"Can you find pharmacies ?",'name_agent': self.name}, 
                                         headers={'accept': 'application/json', 'Content-Type': 'application/json'}, 
                                         json=payload)
@@ -386,7 +390,7 @@ class HealthcareAssistant:
                 if response_data.get("status") == "Find":
                     return self._get_sorted_friends(response_data.get('agents'))  # Return the sorted list of pharmacy agents
 
-            except requests.exceptions.HTTPError as http_err:
+            except httpx.HTTPError as http_err:
                 print(f"HTTP error occurred while finding pharmacy: {http_err}")
             except Exception as err:
                 print(f"An error occurred while finding pharmacy: {err}")
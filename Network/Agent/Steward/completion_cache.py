@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class CompletionCache:
+    """
+    Content-addressed store of chat completions, persisted in a SQLite file.
+
+    Entries are keyed by a hash of (model, messages, params) computed by the LLM gateway,
+    so a prompt built from the same static prompt file and the same input is answered from
+    disk across restarts. When the stored answers exceed `max_bytes`, or `max_entries`, the
+    least recently used ones are evicted. An entry older than `ttl` seconds is dropped when
+    it is looked up, so even a wrong answer is not replayed forever.
+    """
+
+    def __init__(self, path: str = "completion_cache.db", max_bytes: int = 64 * 1024 * 1024,
+                 max_entries: int = 100_000, ttl: Optional[float] = 7 * 24 * 3600) -> None:
+        """
+        Args:
+            path (str): SQLite database file.
+            max_bytes (int): Upper bound of the stored completion text, in bytes.
+            max_entries (int): Upper bound of the number of stored completions.
+            ttl (float, optional): Lifetime of an entry in seconds, None to keep entries until evicted.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, completion TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+        self._entries, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Return the stored completion for `key`, or None when missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT completion, size, created FROM completions WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._entries -= 1
+                self._bytes -= row[1]
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, model: str, completion: str) -> None:
+        """
+        Store a completion, then evict the least recently used entries over the bounds.
+        """
+        size = len(completion.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._conn.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions (key, model, completion, size, created, accessed)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", (key, model, completion, size, now, now))
+                if old is None:
+                    self._entries += 1
+                    self._bytes += size
+                else:
+                    self._bytes += size - old[0]
+                self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM completions ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._entries -= 1
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._entries, self._bytes = 0, 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Hit/miss counters and the current size of the store.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,10 @@
-import openai
-import requests
+import httpx
 import json
 import logging
 from typing import NewType, Tuple, List, Dict, Optional
 from utils import read_file_as_strings
+from transport import shared_transport
+from llm_gateway import shared_gateway
 import re
 import yaml
 
@@ -28,8 +29,11 @@ class Steward:
                 api_key = config.get("api_key")
                 if not api_key:
                     raise ValueError("API key must be provided.")
-                openai.api_key = api_key
+                # Shared LLM gateway: bounded, rate limited and coalescing OpenAI calls
+                self.llm = shared_gateway(api_key, config.get("llm"))
                 logging.info("API key loaded successfully")
+                # Shared keep-alive HTTP transport for every call to hubs and hotels
+                self.transport = shared_transport(config.get("transport"))
         except FileNotFoundError:
             logging.error("Configuration file not found")
             raise Exception("Configuration file not found.")
@@ -54,9 +58,9 @@ class Steward:
     def _send_message_openAI(self, messages):
         try:
             logging.info("Sending messages to OpenAI")
-            response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages)
+            content = self.llm.complete(messages, model="gpt-4o-mini")
             logging.info("Received response from OpenAI")
-            return response.choices[0].message.content
+            return content
         except Exception as e:
             logging.error(f"Failed to communicate with OpenAI: {str(e)}")
             return f"Error getting response: {str(e)}"
@@ -162,7 +166,7 @@ class Steward:
         logging.info(f"Attempting to create chat for hotel: {hotel_name} at {chat_url}")
 
         # Start chat with system prompt for this hotel
-        response = requests.post(chat_url)
+        response = self.transport.post(chat_url)
 
         if response.status_code != 200:
             logging.error(f"Failed to create chat with {hotel_name}. HTTP Status: {response.status_code}")
@@ -235,7 +239,7 @@ class Steward:
             }
 
             logging.info(f"Sending request to chat API at {chat_url} with payload: {chat_payload}")
-            response = requests.post(chat_url, json=chat_payload)
+            response = self.transport.post(chat_url, json=chat_payload)
 
             if response.status_code != 200:
                 logging.error(f"Error during chat with {hotel_name}. HTTP Status: {response.status_code}. URL: {chat_url}")
@@ -279,7 +283,7 @@ class Steward:
         # Open the URL for the selected room and reserve it
         reserve_url = room_suggestion_url
         logging.info(f"Reserving room at URL: {reserve_url}")
-        reserve_response = requests.get(reserve_url)
+        reserve_response = self.transport.get(reserve_url)
 
         system_prompt = read_file_as_strings("reservation_system_prompt.txt")
         logging.info(f"System prompt loaded: {system_prompt}")
@@ -502,7 +506,7 @@ class Steward:
         }
 
         try:
-            response = requests.post(hub_url, params={'prompt': new_prompt, 'name_agent': self.name},
+            response = self.transport.post(hub_url, params={'prompt': new_prompt, 'name_agent': self.name},
                                     headers={'accept': 'application/json', 'Content-Type': 'application/json'},
                                     json=payload)
             logging.info(f"POST request sent to {hub_url}, status code: {response.status_code}")
@@ -516,7 +520,7 @@ class Steward:
             else:
                 logging.warning(f"No hotel found for reservation: {response_data.get('message')}")
                 return False, response_data.get("message", "Reservation failed because hub can't find a hotel for reservation.")
-        except requests.exceptions.HTTPError as http_err:
+        except httpx.HTTPError as http_err:
             logging.error(f"HTTP error occurred: {http_err}")
             return False, f"An HTTP error occurred: {http_err}"
         except Exception as err:
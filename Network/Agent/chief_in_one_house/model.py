@@ -1,9 +1,10 @@
 from typing import NewType, Tuple, List
-import requests
-import openai
+import httpx
 import os
 import json
 from utils import read_file_as_strings,markdown_home_food_table,add_to_home_food_table
+from transport import shared_transport
+from llm_gateway import shared_gateway
 import re
 import csv
 import pandas as pd
@@ -31,8 +32,11 @@ class CulinaryAssistant:
             config = json.load(config_file)
             self.api_key = config.get("api_key")
 
-        # Initialize OpenAI API
-        openai.api_key = self.api_key
+        # Shared keep-alive HTTP transport for every call to hubs and shops
+        self.transport = shared_transport(config.get("transport"))
+
+        # Shared LLM gateway: bounded, rate limited and coalescing OpenAI calls
+        self.llm = shared_gateway(self.api_key, config.get("llm"))
 
     def _search_agent(self, prompt: str):
         """
@@ -57,7 +61,7 @@ class CulinaryAssistant:
         system_prompt_to_cook = read_file_as_strings("system_prompt_to_cook.txt")
 
         # Generate cooking requirements
-        requirements = self._get_openai_response(system_prompt_requirements, prompt)
+        requirements = self._get_openai_response(system_prompt_requirements, prompt, cache=True)
         print(requirements)
         print(10*"*"+"requirements"+10*"*")
         self.chat.append([
@@ -138,16 +142,16 @@ class CulinaryAssistant:
 
         return {"status": "Cooked successfully", "chats": self.chat}
 
-    def _get_openai_response(self, system_prompt: str, user_prompt: str) -> str:
+    def _get_openai_response(self, system_prompt: str, user_prompt: str, cache: bool = False) -> str:
         """
         Helper method to interact with the OpenAI API and get a response.
+        With `cache`, identical prompts are answered from the on-disk completion cache.
         """
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
-        response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages)
-        return response.choices[0].message.content
+        return self.llm.complete(messages, model="gpt-4o-mini", cache=cache)
 
 
     def _find_usefull_agents(self, public_agents: str, jab_name: str , items_must_buy:list) -> list[Friend]:
@@ -212,8 +216,8 @@ class CulinaryAssistant:
         
         try:
             # Fetch API document from the agent's shop
-            api_document = requests.get(agent_url).text
-        except requests.RequestException as e:
+            api_document = self.transport.get(agent_url).text
+        except httpx.HTTPError as e:
             print(f"Error fetching API document from agent {agent_ip}:{agent_port} - {e}")
             return item_frequency
 
@@ -377,7 +381,7 @@ class CulinaryAssistant:
         print("=-=" * 30)
         try:
             # Send the POST request with params, headers, and data (JSON payload)
-            response = requests.post(hub_url, params=params, headers=headers, json=data)
+            response = self.transport.post(hub_url, params=params, headers=headers, json=data)
             response_data = response.json()
             print(response_data)
             print("&" * 30)
@@ -399,7 +403,7 @@ class CulinaryAssistant:
             hubs_seen.append(hub)
             return response_json_item_frequency, hubs_seen, public_agents_seen
 
-        except requests.exceptions.HTTPError as http_err:
+        except httpx.HTTPError as http_err:
             print(f"HTTP error occurred: {http_err}")  # Log the error
             return response_json_item_frequency, hubs_seen, public_agents_seen
         except Exception as err:
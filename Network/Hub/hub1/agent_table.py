@@ -0,0 +1,201 @@
+"""
+Columnar, array-backed view of the public agent table.
+
+One AgentTable is built per registry version, or extended from the previous one with
+the rows appended and flipped since (see updated). Agent selection is then answered
+with NumPy mask operations over a few compact arrays instead of DataFrame filters and
+merges:
+
+  type_codes  int32, dictionary-encoded 'Agent Type' (type_names holds the dictionary)
+  active      'Active' flags packed eight per byte
+  rate        float64, 0.0 when missing
+  key_hash    uint64 hash of (Name, IP Address, Port), matched against block lists
+"""
+from typing import Dict, Iterable, List, NewType, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+IP = NewType('IP address', str)
+Port = NewType('Port', str)
+Address = Tuple[IP, Port]
+Name = NewType('Name', str)
+Friend = Tuple[Name, Address]
+
+KEY_COLUMNS = ['Name', 'IP Address', 'Port']
+
+
+def _port_text(values: Iterable) -> List[str]:
+    # Ports are compared as text, "8020" and 8020 being the same port
+    texts = []
+    for value in values:
+        if value is None or value is pd.NA or value != value:
+            texts.append("")
+        else:
+            try:
+                texts.append(str(int(value)))
+            except (TypeError, ValueError):
+                texts.append(str(value))
+    return texts
+
+
+def _text_array(values: Iterable) -> np.ndarray:
+    return np.array([str(value) for value in values], dtype=object)
+
+
+def _hash_keys(names: np.ndarray, ips: np.ndarray, ports: np.ndarray) -> np.ndarray:
+    # Hash of the (Name, IP Address, Port) identity of an agent, the same in every process:
+    # one vectorized hash per column, mixed with odd multipliers (wrapping uint64 arithmetic)
+    with np.errstate(over="ignore"):
+        hashed = pd.util.hash_array(names, categorize=False) * np.uint64(0x9E3779B97F4A7C15)
+        hashed ^= pd.util.hash_array(ips, categorize=False) * np.uint64(0xC2B2AE3D27D4EB4F)
+        hashed ^= pd.util.hash_array(ports, categorize=False)
+    return hashed
+
+
+def _blocked(key_hash: np.ndarray, names: np.ndarray, ips: np.ndarray, ports: np.ndarray,
+             person_block: List[Friend], positions: Optional[np.ndarray] = None) -> np.ndarray:
+    # Block-list matches among the rows at `positions` (all rows when None)
+    block_names = _text_array(friend[0] for friend in person_block)
+    block_ips = _text_array(friend[1][0] for friend in person_block)
+    block_ports = np.array(_port_text(friend[1][1] for friend in person_block), dtype=object)
+    hashes = key_hash if positions is None else key_hash[positions]
+    mask = np.isin(hashes, _hash_keys(block_names, block_ips, block_ports))
+    hits = np.flatnonzero(mask)
+    if len(hits):
+        # A 64-bit hash match is confirmed on the actual values, never trusted blindly
+        exact = set(zip(block_names, block_ips, block_ports))
+        for hit in hits:
+            row = hit if positions is None else positions[hit]
+            if (names[row], ips[row], ports[row]) not in exact:
+                mask[hit] = False
+    return mask
+
+
+class AgentTable:
+    """
+    Compact columnar copy of the public agents, positions matching the registry table.
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        """
+        Args:
+            df (pd.DataFrame): The public agent table of the registry.
+        """
+        self.size = len(df)
+        if self.size and 'Agent Type' in df.columns:
+            codes, names = pd.factorize(df['Agent Type'].astype(str))
+            self.type_codes = codes.astype(np.int32)
+            self.type_names: List[str] = [str(name) for name in names]
+        else:
+            self.type_codes = np.zeros(self.size, dtype=np.int32)
+            self.type_names = []
+        self.type_ids: Dict[str, int] = {name: code for code, name in enumerate(self.type_names)}
+        active = df['Active'].to_numpy(dtype=bool) if 'Active' in df.columns else np.ones(self.size, dtype=bool)
+        self.active = np.packbits(active)
+        if 'Rate' in df.columns:
+            self.rate = np.nan_to_num(pd.to_numeric(df['Rate'], errors="coerce").to_numpy(dtype=np.float64), nan=0.0)
+        else:
+            self.rate = np.zeros(self.size, dtype=np.float64)
+        # The key columns as text, only read to confirm block-list hash matches
+        self._keyed = all(column in df.columns for column in KEY_COLUMNS)
+        if self._keyed:
+            self._names, self._ips = _text_array(df['Name']), _text_array(df['IP Address'])
+            self._ports = np.array(_port_text(df['Port']), dtype=object)
+            self.key_hash = _hash_keys(self._names, self._ips, self._ports)
+        else:
+            self.key_hash = np.zeros(self.size, dtype=np.uint64)
+
+    def updated(self, df: pd.DataFrame, flipped: Iterable[int] = ()) -> "AgentTable":
+        """
+        A copy for a later version of the same table: the rows after `size` are appended and
+        the 'Active' flag of the `flipped` positions is read again, the other rows are kept.
+
+        Args:
+            df (pd.DataFrame): The public agent table, this table being a prefix of it.
+            flipped (Iterable[int]): Positions below `size` whose 'Active' flag changed.
+        """
+        tail = AgentTable(df.iloc[self.size:])
+        table = AgentTable.__new__(AgentTable)
+        table.size = self.size + tail.size
+        table.type_names = list(self.type_names)
+        table.type_ids = dict(self.type_ids)
+        for name in tail.type_names:
+            if name not in table.type_ids:
+                table.type_ids[name] = len(table.type_names)
+                table.type_names.append(name)
+        remap = np.array([table.type_ids[name] for name in tail.type_names] or [0], dtype=np.int32)
+        table.type_codes = np.concatenate([self.type_codes, remap[tail.type_codes]]) if tail.size else self.type_codes
+        active = np.concatenate([self.active_mask(), tail.active_mask()])
+        flipped = [position for position in flipped if position < self.size]
+        if flipped and 'Active' in df.columns:
+            active[flipped] = df['Active'].iloc[flipped].to_numpy(dtype=bool)
+        table.active = np.packbits(active)
+        table.rate = np.concatenate([self.rate, tail.rate])
+        table.key_hash = np.concatenate([self.key_hash, tail.key_hash])
+        table._keyed = self._keyed and tail._keyed
+        if table._keyed:
+            table._names = np.concatenate([self._names, tail._names])
+            table._ips = np.concatenate([self._ips, tail._ips])
+            table._ports = np.concatenate([self._ports, tail._ports])
+        return table
+
+    def active_mask(self) -> np.ndarray:
+        return np.unpackbits(self.active, count=self.size).astype(bool)
+
+    def type_mask(self, list_type: Iterable[str]) -> np.ndarray:
+        """
+        Rows whose 'Agent Type' is one of list_type: one lookup in a per-type flag array.
+        """
+        wanted = np.zeros(len(self.type_names) + 1, dtype=bool)
+        for agent_type in list_type:
+            code = self.type_ids.get(str(agent_type))
+            if code is not None:
+                wanted[code] = True
+        return wanted[self.type_codes]
+
+    def blocked_mask(self, person_block: List[Friend], positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Block list matches among all rows, or among `positions` only.
+        """
+        if positions is None:
+            positions = np.arange(self.size)
+        if not person_block or not self._keyed or not len(positions):
+            return np.zeros(len(positions), dtype=bool)
+        return _blocked(self.key_hash, self._names, self._ips, self._ports, person_block, positions)
+
+    def select(self, list_type: Iterable[str], person_block: List[Friend] = None, by_rate: bool = False) -> np.ndarray:
+        """
+        Positions of the active agents of the given types, without the blocked ones.
+
+        Args:
+            list_type (Iterable[str]): Agent types to keep.
+            person_block (List[Friend], optional): Agents to exclude.
+            by_rate (bool): Best 'Rate' first (ties keep registry order) instead of registry order.
+
+        Returns:
+            np.ndarray: Row positions in the registry table.
+        """
+        positions = np.flatnonzero(self.type_mask(list_type) & self.active_mask())
+        if person_block:
+            positions = positions[~self.blocked_mask(person_block, positions)]
+        if by_rate:
+            positions = self.order_by_rate(positions)
+        return positions
+
+    def order_by_rate(self, positions: np.ndarray) -> np.ndarray:
+        """
+        The given row positions best 'Rate' first, ties keeping their order.
+        """
+        return positions[np.argsort(-self.rate[positions], kind="stable")]
+
+    def type_counts(self) -> Dict[str, int]:
+        """
+        Number of active agents per agent type.
+        """
+        counts = np.bincount(self.type_codes[self.active_mask()], minlength=len(self.type_names))
+        return {name: int(count) for name, count in zip(self.type_names, counts) if count}
+
+    def nbytes(self) -> int:
+        # The key text kept to confirm hash matches is not counted
+        return sum(array.nbytes for array in (self.type_codes, self.active, self.rate, self.key_hash))
@@ -0,0 +1,94 @@
+"""
+Agent selection: DataFrame filter + block-list merge vs the columnar AgentTable.
+
+Builds a synthetic public agent table and times, per request, the selection of the
+active agents of two types without the blocked ones:
+
+  dataframe   isin/Active filter then merge(..., indicator=True) on (Name, IP, Port),
+              as find_row_of_data_frame_by_type_agent and exclude_blocked_agents did
+  columnar    AgentTable.select: type code lookup, Active bitset and block-list hashes
+  + by rate   the same, sorted by 'Rate' (best first)
+
+It also reports the memory of the table as a DataFrame and as arrays.
+
+Run from the hub folder:
+    python benchmarks/agent_table.py --agents 20000 --blocked 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from agent_table import AgentTable
+
+AGENT_TYPES = ["Pharmacy", "Hotel", "Bakery", "Doctor", "Dentist", "Taxi", "Restaurant", "Plumber"]
+
+
+def synthetic_table(agents: int) -> pd.DataFrame:
+    rows = []
+    for i in range(agents):
+        agent_type = AGENT_TYPES[i % len(AGENT_TYPES)]
+        rows.append({"Agent Type": agent_type, "Name": f"{agent_type} {i}", "Rate": round(3 + (i * 7 % 20) / 10, 1),
+                     "IP Address": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", "Port": 8000 + i % 1000,
+                     "Active": i % 10 != 0, "Description": f"A {agent_type.lower()} serving district {i % 97}."})
+    df = pd.DataFrame(rows)
+    df["Port"] = df["Port"].astype("Int64")
+    return df
+
+
+def dataframe_select(df: pd.DataFrame, list_type: list, person_block: list) -> pd.DataFrame:
+    filtered_df = df[(df['Agent Type'].isin(list_type)) & (df['Active'])]
+    person_block_df = pd.DataFrame([(friend[0], friend[1][0], int(friend[1][1])) for friend in person_block],
+                                   columns=['Name', 'IP Address', 'Port'])
+    merged_df = filtered_df.merge(person_block_df, on=['Name', 'IP Address', 'Port'], how='left', indicator=True)
+    return merged_df[merged_df['_merge'] == 'left_only'].drop(columns=['_merge', 'Active'])
+
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=20000)
+    parser.add_argument("--blocked", type=int, default=50, help="agents in the block list of each request")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    df = synthetic_table(args.agents)
+    start = time.perf_counter()
+    table = AgentTable(df)
+    build = time.perf_counter() - start
+    list_type = ["Pharmacy", "Hotel"]
+    blocked_rows = df[df['Agent Type'].isin(list_type)].sample(min(args.blocked, len(df)), random_state=1)
+    person_block = [(name, (ip, str(port))) for name, ip, port in
+                    zip(blocked_rows['Name'], blocked_rows['IP Address'], blocked_rows['Port'])]
+    person_block += [(f"Stranger {i}", (f"172.16.0.{i % 256}", str(9000 + i))) for i in range(args.blocked)]
+    random.shuffle(person_block)
+
+    expected = list(dataframe_select(df, list_type, person_block)['Name'])
+    assert list(df['Name'].iloc[table.select(list_type, person_block)]) == expected
+
+    frame_time = timed(lambda: dataframe_select(df, list_type, person_block), args.repeat)
+    columnar_time = timed(lambda: table.select(list_type, person_block), args.repeat)
+    by_rate_time = timed(lambda: table.select(list_type, person_block, by_rate=True), args.repeat)
+    frame_bytes = df[['Agent Type', 'Name', 'Rate', 'IP Address', 'Port', 'Active']].memory_usage(deep=True).sum()
+
+    print(f"{args.agents} agents, {len(expected)} selected, {len(person_block)} block list entries")
+    print(f"dataframe filter + merge: {frame_time * 1e3:8.3f} ms/request")
+    print(f"columnar select:          {columnar_time * 1e3:8.3f} ms/request  ({frame_time / columnar_time:.1f}x)")
+    print(f"columnar select by rate:  {by_rate_time * 1e3:8.3f} ms/request")
+    print(f"columnar build:           {build * 1e3:8.1f} ms once per registry version")
+    print(f"memory: DataFrame columns {frame_bytes / 1024:.0f} KiB, arrays {table.nbytes() / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main_cli()
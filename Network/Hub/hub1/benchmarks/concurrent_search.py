@@ -0,0 +1,86 @@
+"""
+Load benchmark for /search_agent with a stub LLM.
+
+Fires N searches at once against the hub app (in-process, through httpx's ASGI
+transport) while every LLM call is replaced by a stub that waits `--latency`
+seconds. With the async request path the wall time stays close to one search
+(two LLM calls); with `--blocking` the stub sleeps synchronously, reproducing the
+old behaviour where searches ran one after another.
+
+The query planner is disabled so every search also runs the ranking LLM call
+(`--planner` keeps it). The serial estimate is computed from the stub calls actually
+made.
+
+Run from the hub folder:
+    python benchmarks/concurrent_search.py --requests 20 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import main
+from model import Hub
+
+
+def install_stub_llm(latency: float, blocking: bool) -> list:
+    calls = []
+
+    async def stub_chat_gpt_api(self, messages: list, batch: bool = False, cache: bool = False) -> str:
+        calls.append(latency)
+        if blocking:
+            time.sleep(latency)
+        else:
+            await asyncio.sleep(latency)
+        if "Agent Table" in messages[-1]["content"]:
+            return '{"agents": [{"name": "Pharmacy"}]}'
+        return ('{"status": "Find", "agents": [{"name": "Reza Pharmacy", "goodness_rate": 4.6, '
+                '"relevance_rate": 5, "location": {"ip": "127.0.0.1", "port": "8020"}}]}')
+
+    Hub._chat_gpt_api = stub_chat_gpt_api
+    return calls
+
+
+async def run(requests: int, name_agent: str) -> float:
+    transport = httpx.ASGITransport(app=main.app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://hub") as client:
+        async def one(i: int):
+            # Distinct prompts so the search cache does not answer
+            response = await client.post("/search_agent",
+                                         params={"prompt": f"Can you find pharmacies #{i}?", "name_agent": name_agent},
+                                         json={})
+            response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--blocking", action="store_true", help="simulate the old blocking LLM client")
+    parser.add_argument("--name-agent", default="mehdi", help="a private agent registered for 127.0.0.1")
+    parser.add_argument("--planner", action="store_true", help="let the query planner skip ranking LLM calls")
+    args = parser.parse_args()
+
+    calls = install_stub_llm(args.latency, args.blocking)
+    main.hub1_agent.find_type_mode = "llm"
+    main.hub1_agent.planner.enabled = args.planner
+    wall = asyncio.run(run(args.requests, args.name_agent))
+    serial = sum(calls)
+    print(f"{args.requests} concurrent searches, {len(calls) / args.requests:.1f} LLM calls of "
+          f"{args.latency:.3f}s each per search")
+    print(f"wall time:        {wall:.3f}s")
+    print(f"serial estimate:  {serial:.3f}s")
+    print(f"overlap speed-up: {serial / wall:.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
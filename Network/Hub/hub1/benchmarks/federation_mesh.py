@@ -0,0 +1,173 @@
+"""
+Messages per query of a federated search in a simulated N-hub mesh.
+
+Builds N hubs in-process, each with its own registry folder and a random set of
+friend hubs, and routes every `_ask_friend` call straight to the handler of the
+target hub (the same steps as the /search_agent endpoint) instead of the network.
+The ranking LLM is a stub answering "Not Found", so each query floods the mesh as
+far as the protocol lets it, which is the worst case for the message count.
+
+With the default protocol a hub drops a request id it has already handled and
+stops forwarding when the hop budget is spent; `--baseline` disables both and only
+keeps the visited list, as before request ids existed.
+
+Run from the hub folder:
+    python benchmarks/federation_mesh.py --hubs 16 --degree 4
+    python benchmarks/federation_mesh.py --hubs 16 --degree 4 --baseline
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from llm_gateway import LLMGateway, StubBackend
+from model import Hub
+from registry import AgentRegistry
+
+NOT_FOUND = '{"status": "Not Found", "agents": []}'
+DUPLICATE_RESPONSE = {"status": "Not Found", "agents": [], "duplicate": True}
+
+
+def build_mesh(hubs: int, degree: int, seed: int) -> dict:
+    """
+    Symmetric random mesh: a ring (so it is connected) plus random chords up to `degree`.
+    """
+    rng = random.Random(seed)
+    edges = {i: set() for i in range(hubs)}
+    for i in range(hubs):
+        j = (i + 1) % hubs
+        if i != j:
+            edges[i].add(j)
+            edges[j].add(i)
+    for i in range(hubs):
+        candidates = [j for j in range(hubs) if j != i and j not in edges[i]]
+        rng.shuffle(candidates)
+        for j in candidates:
+            if len(edges[i]) >= degree:
+                break
+            if len(edges[j]) < degree:
+                edges[i].add(j)
+                edges[j].add(i)
+    return edges
+
+
+def write_hub_folder(root: str, index: int, friends: set) -> str:
+    folder = os.path.join(root, f"hub{index}")
+    os.makedirs(folder)
+    with open(os.path.join(folder, "Hub_properties.csv"), "w") as file:
+        file.write("Agent Name,IP Address,Port,Active\n")
+        for friend in sorted(friends):
+            file.write(f"Hub{friend},127.0.0.1,{9000 + friend},TRUE\n")
+    with open(os.path.join(folder, "Public_Agent_properties.csv"), "w") as file:
+        file.write("Agent Type,Name,Rate,IP Address,Port,Active,Description\n")
+        file.write(f"Bakery,Bakery {index},4.0,127.0.0.1,{10000 + index},TRUE,Fresh bread and pastries.\n")
+    with open(os.path.join(folder, "Private_Agent_properties.csv"), "w") as file:
+        file.write("IP Address,Agent Name\n")
+    return folder
+
+
+class MeshTransport:
+    """
+    Stands in for the shared transport: a POST to a hub's /search_agent runs that hub's
+    handler directly and counts one message.
+    """
+
+    def __init__(self) -> None:
+        self.hubs = {}
+        self.messages = 0
+
+    async def apost(self, url: str, params: dict = None, json: dict = None, **kwargs) -> httpx.Response:
+        self.messages += 1
+        hub = self.hubs[urlsplit(url).port]
+        result = await handle_search(hub, params["prompt"], json or {})
+        return httpx.Response(200, json=result, request=httpx.Request("POST", url))
+
+
+async def handle_search(hub: Hub, prompt: str, payload: dict) -> dict:
+    # Same steps as main.search_agent, without find_type (every hub ranks its whole table)
+    admitted = hub.admit_request(payload.get("request_id"), payload.get("hops_left"))
+    if admitted is None:
+        return DUPLICATE_RESPONSE
+    visited = [(name, (ip, port)) for name, (ip, port) in payload.get("hub_user_search") or []]
+    chat = [{"role": "system", "content": "Rank the agents."}, {"role": "user", "content": prompt}]
+    return await hub.hub_search_agent(chat, prompt, visited, None, request_id=admitted[0], hops_left=admitted[1])
+
+
+def make_hubs(root: str, edges: dict, max_hops: int, baseline: bool, transport: MeshTransport) -> list:
+    with open(os.path.join(root, "config.json"), "w") as file:
+        json.dump({"api_key": "benchmark", "llm": {"backend": "stub", "cache_path": ""},
+                   "gossip_interval": 0, "federation_mode": "first", "federation_max_hops": max_hops}, file)
+    gateway = LLMGateway(StubBackend(responder=lambda messages: NOT_FOUND))
+    hubs = []
+    for index in sorted(edges):
+        registry = AgentRegistry(directory=write_hub_folder(root, index, edges[index]), flush_interval=3600)
+        hub = Hub(f"Hub{index}", "127.0.0.1", str(9000 + index), registry)
+        hub.llm = gateway
+        hub.transport = transport
+        if baseline:
+            hub.federation_max_hops = 10 ** 6
+            hub.admit_request = lambda request_id, hops_left: (request_id or uuid.uuid4().hex, 10 ** 6)
+        transport.hubs[9000 + index] = hub
+        hubs.append(hub)
+    return hubs
+
+
+async def run(hubs: list, transport: MeshTransport, queries: int) -> list:
+    counts = []
+    for query in range(queries):
+        before = transport.messages
+        origin = hubs[query % len(hubs)]
+        await origin.hub_search_agent([{"role": "user", "content": f"q{query}"}], f"Find a locksmith #{query}")
+        counts.append(transport.messages - before)
+    return counts
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hubs", type=int, default=16)
+    parser.add_argument("--degree", type=int, default=4, help="friends per hub")
+    parser.add_argument("--queries", type=int, default=8)
+    parser.add_argument("--max-hops", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", action="store_true", help="visited list only, no request ids or hop limit")
+    args = parser.parse_args()
+
+    edges = build_mesh(args.hubs, args.degree, args.seed)
+    links = sum(len(friends) for friends in edges.values())
+    root = tempfile.mkdtemp(prefix="federation_mesh_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(root)
+        transport = MeshTransport()
+        with contextlib.redirect_stdout(io.StringIO()):
+            hubs = make_hubs(root, edges, args.max_hops, args.baseline, transport)
+            start = time.perf_counter()
+            counts = asyncio.run(run(hubs, transport, args.queries))
+            wall = time.perf_counter() - start
+        for hub in hubs:
+            hub.registry.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    protocol = "baseline (visited list only)" if args.baseline else f"request ids + dedup, max hops {args.max_hops}"
+    print(f"{args.hubs} hubs, {links} directed friend links, {protocol}")
+    print(f"messages per query: mean {sum(counts) / len(counts):.1f}, max {max(counts)}, min {min(counts)}")
+    print(f"wall time for {args.queries} queries: {wall:.3f}s")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,70 @@
+"""
+Benchmark of the LLM gateway with the offline stub backend.
+
+Three workloads are sent at once through `LLMGateway.complete` from a thread pool,
+like the blocking agents do, and compared with one backend call per prompt:
+
+  duplicates      N callers sending the same prompt (coalesced into one call)
+  distinct        N different prompts (bounded by --max-concurrency)
+  classification  N different prompts sharing a system prompt, with batch=True
+
+Run from the hub folder:
+    python benchmarks/llm_gateway.py --requests 64 --latency 0.2
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_gateway import LLMGateway, StubBackend
+
+SYSTEM_PROMPT = "Classify the request into one of the agent types: Pharmacy, Hotel, Doctor, Bakery."
+
+
+def workload(name: str, requests: int):
+    if name == "duplicates":
+        return [([{"role": "user", "content": "Can you find pharmacies ?"}], False)] * requests
+    if name == "distinct":
+        return [([{"role": "user", "content": f"Question #{i}"}], False) for i in range(requests)]
+    return [([{"role": "system", "content": SYSTEM_PROMPT},
+              {"role": "user", "content": f"I need help with request #{i}"}], True) for i in range(requests)]
+
+
+def run(name: str, requests: int, latency: float, max_concurrency: int, max_batch_size: int) -> dict:
+    backend = StubBackend(latency=latency)
+    gateway = LLMGateway(backend, max_concurrency=max_concurrency, max_batch_size=max_batch_size)
+    calls = workload(name, requests)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        answers = list(pool.map(lambda call: gateway.complete(call[0], batch=call[1]), calls))
+    wall = time.perf_counter() - start
+    stats = gateway.metrics()
+    gateway.close()
+    assert len(answers) == requests
+    return {"workload": name, "wall": wall, "backend_calls": backend.calls,
+            "coalesced": stats["coalesced"], "batches": stats["batches"]}
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stub completion")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.requests} concurrent prompts, stub latency {args.latency:.3f}s, "
+          f"max concurrency {args.max_concurrency}, batch size {args.max_batch_size}")
+    print(f"{'workload':<15} {'wall (s)':>9} {'calls':>6} {'coalesced':>10} {'batches':>8} {'calls saved':>12}")
+    for name in ("duplicates", "distinct", "classification"):
+        result = run(name, args.requests, args.latency, args.max_concurrency, args.max_batch_size)
+        saved = 1 - result["backend_calls"] / args.requests
+        print(f"{name:<15} {result['wall']:>9.3f} {result['backend_calls']:>6} "
+              f"{result['coalesced']:>10} {result['batches']:>8} {saved:>11.0%}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,174 @@
+"""
+Search throughput of a hub served by several worker processes sharing one registry.
+
+Copies the hub into a temporary folder with `--agents` synthetic public agents, a
+SQLite registry store and a shared registry file in /dev/shm, then starts W worker
+processes (what `uvicorn main:app --workers W` would fork). Every worker imports
+main.py, replaces the LLM with an instant stub and fires /search_agent requests
+through httpx's ASGI transport for `--seconds`, `--concurrency` at a time. With
+`--writes` each worker also registers that many new agents per second during the run.
+
+At the end every worker reports its requests and the registry generation and row
+count it sees: all workers must agree with each other and with the SQLite store. It
+also reports how many store changes it replayed and how many times it had to load
+whole tables instead (0 when the change log kept up).
+Throughput only grows with W up to the number of CPU cores of the machine.
+
+Run from the hub folder:
+    python benchmarks/multi_worker.py --workers 1 2 4
+    python benchmarks/multi_worker.py --workers 1 2 4 --writes 20
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+HUB_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AGENT_TYPES = ["Pharmacy", "Hotel", "Bakery", "Doctor", "Dentist", "Taxi", "Restaurant", "Plumber"]
+
+WORKER = """
+import asyncio, json, sys, time
+import httpx
+import main
+from model import Hub
+from registry import ROLE_PUBLIC
+
+worker, start_at, seconds, concurrency, writes = int(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3]), int(sys.argv[4]), float(sys.argv[5])
+
+async def stub_chat_gpt_api(self, messages, batch=False, cache=False):
+    if "Agent Table" in messages[-1]["content"]:
+        return '{"agents": [{"name": "Pharmacy"}]}'
+    return ('{"status": "Find", "agents": [{"name": "Pharmacy 0", "goodness_rate": 4, '
+            '"relevance_rate": 5, "location": {"ip": "10.0.0.0", "port": "8000"}}]}')
+
+Hub._chat_gpt_api = stub_chat_gpt_api
+main.hub1_agent.find_type_mode = "llm"
+
+async def run():
+    transport = httpx.ASGITransport(app=main.app, client=("127.0.0.1", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://hub") as client:
+        end = start_at + seconds
+        done = [0]
+
+        async def searcher(lane):
+            i = 0
+            while time.time() < end:
+                # Distinct prompts so the search cache does not answer
+                response = await client.post("/search_agent", json={},
+                                             params={"prompt": f"Can you find a pharmacy {worker}-{lane}-{i}?", "name_agent": "mehdi"})
+                response.raise_for_status()
+                done[0] += 1
+                i += 1
+                # The stub never suspends: yield so the other lanes and the writer get their turn
+                await asyncio.sleep(0)
+
+        async def writer():
+            added = 0
+            while writes > 0 and time.time() < end:
+                response = await client.post("/add_agent", params={"name_agent": f"Worker {worker} agent {added}", "type_agent": "Public"},
+                                             json={"Agent Type": "Taxi", "Rate": "4", "Port": "9000", "Active": "TRUE", "Description": "d"})
+                response.raise_for_status()
+                added += 1
+                await asyncio.sleep(1 / writes)
+            return added
+
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        added, *_ = await asyncio.gather(writer(), *(searcher(lane) for lane in range(concurrency)))
+        return done[0], added
+
+searches, added = asyncio.run(run())
+# Let the last writer publish, then read the registry as a request would
+time.sleep(1.0)
+rows = len(main.registry.table(ROLE_PUBLIC))
+print(json.dumps({"searches": searches, "added": added, "generation": main.registry.generation, "rows": rows,
+                  "replayed": main.registry.replayed, "reloads": main.registry.reloads}))
+main.registry.close()
+"""
+
+
+def prepare(folder: str, agents: int) -> str:
+    for name in os.listdir(HUB_DIRECTORY):
+        path = os.path.join(HUB_DIRECTORY, name)
+        if os.path.isfile(path) and not name.endswith((".db", ".bin", ".db-wal", ".db-shm")):
+            shutil.copy(path, folder)
+    with open(os.path.join(folder, "Public_Agent_properties.csv"), "w") as file:
+        file.write("Agent Type,Name,Rate,IP Address,Port,Active,Description\n")
+        for i in range(agents):
+            agent_type = AGENT_TYPES[i % len(AGENT_TYPES)]
+            file.write(f"{agent_type},{agent_type} {i},4.0,10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256},"
+                       f"{8000 + i % 1000},TRUE,A {agent_type.lower()} serving district {i % 97}.\n")
+    shm = "/dev/shm" if os.path.isdir("/dev/shm") else folder
+    shared_path = os.path.join(shm, f"{os.path.basename(folder)}_registry.bin")
+    with open(os.path.join(folder, "config.json")) as file:
+        config = json.load(file)
+    config.update({"api_key": "benchmark", "gossip_interval": 0, "health_probe_interval": 0, "lease_sweep_interval": 0,
+                   "log_level": "WARNING",
+                   "registry_store": {"backend": "sqlite", "path": "registry.db"},
+                   "shared_registry": {"path": shared_path, "refresh_interval": 0.05},
+                   "snapshot": {"path": "", "interval": 0}})
+    config["llm"] = dict(config.get("llm") or {}, backend="stub", cache_path="")
+    with open(os.path.join(folder, "config.json"), "w") as file:
+        json.dump(config, file)
+    return shared_path
+
+
+def run_workers(folder: str, workers: int, seconds: float, concurrency: int, writes: float) -> list:
+    # Workers start together once all of them have imported main
+    start_at = time.time() + 3.0 + workers
+    processes = [subprocess.Popen([sys.executable, "-c", WORKER, str(worker), str(start_at), str(seconds),
+                                   str(concurrency), str(writes)], cwd=folder, stdout=subprocess.PIPE, text=True)
+                 for worker in range(workers)]
+    results = []
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode:
+            raise RuntimeError(f"worker exited with {process.returncode}")
+        results.append(json.loads(next(line for line in output.splitlines() if line.startswith("{"))))
+    return results
+
+
+def store_state(folder: str) -> tuple:
+    with sqlite3.connect(os.path.join(folder, "registry.db")) as conn:
+        generation = conn.execute("SELECT value FROM registry_meta WHERE key = 'generation'").fetchone()[0]
+        rows = conn.execute("SELECT COUNT(*) FROM public_agents").fetchone()[0]
+    return generation, rows
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="searches in flight per worker")
+    parser.add_argument("--writes", type=float, default=0.0, help="registrations per second per worker")
+    args = parser.parse_args()
+
+    print(f"{args.agents} public agents, {os.cpu_count()} CPU cores, {args.seconds:.0f}s per run, "
+          f"{args.concurrency} searches in flight per worker, {args.writes:g} writes/s per worker")
+    for workers in args.workers:
+        folder = tempfile.mkdtemp(prefix="hub_workers_")
+        shared_path = prepare(folder, args.agents)
+        try:
+            results = run_workers(folder, workers, args.seconds, args.concurrency, args.writes)
+            generation, rows = store_state(folder)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+            for path in (shared_path, f"{shared_path}.lock"):
+                if os.path.exists(path):
+                    os.remove(path)
+        searches = sum(result["searches"] for result in results)
+        consistent = all(result["generation"] == generation and result["rows"] == rows for result in results)
+        print(f"workers={workers}  {searches / args.seconds:8.1f} searches/s  "
+              f"added={sum(result['added'] for result in results):<5} store generation={generation} rows={rows}  "
+              f"workers agree={consistent}  replayed={[result['replayed'] for result in results]}  "
+              f"reloads={[result['reloads'] for result in results]}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,145 @@
+"""
+Registry mutation benchmark: CSV rewrite per mutation vs the SQLite registry store.
+
+  csv rewrite   the original path: read the whole CSV, change one row, write it back
+                (utils.add_agent_to_csv, and the same read/modify/write for toggles);
+                run on `--baseline` mutations only, it is quadratic
+  csv memory    AgentRegistry with the write-behind CSV flush
+  sqlite        AgentRegistry backed by SQLiteRegistryStore (WAL, indexed, one
+                transaction per mutation)
+  sqlite batch  the same store through add_agents / set_active_many, one transaction
+                per `--batch` items (the /add_agents and /activation_status/batch path)
+
+Every run starts from a copy of the hub CSV files in a temporary folder.
+
+Run from the hub folder:
+    python benchmarks/registry_store.py --registrations 10000 --toggles 100000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+HUB_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HUB_DIRECTORY)
+
+import pandas as pd
+
+from registry import AgentRegistry, ROLE_PUBLIC, TABLES
+from registry_store import SQLiteRegistryStore
+from utils import add_agent_to_csv
+
+
+def copy_registry(target: str) -> None:
+    for file_name, _ in TABLES.values():
+        shutil.copy(os.path.join(HUB_DIRECTORY, file_name), target)
+
+
+def agent(i: int) -> tuple:
+    ip = f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+    columns = {"Agent Type": random.choice(["Pharmacy", "Hotel", "Bakery", "Doctor"]), "Rate": "4.0",
+               "Port": str(8000 + i % 1000), "Active": "TRUE", "Description": f"Benchmark agent {i}"}
+    return ip, f"Agent {i}", columns
+
+
+def csv_rewrite(folder: str, registrations: int, toggles: int) -> tuple:
+    path = os.path.join(folder, TABLES[ROLE_PUBLIC][0])
+    start = time.perf_counter()
+    for i in range(registrations):
+        ip, name, columns = agent(i)
+        # add_agent_to_csv writes the name under "Agent Name"; public rows use "Name"
+        add_agent_to_csv(ip, name, path, dict(columns, Name=name))
+    register_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(toggles):
+        ip, name, _ = agent(random.randrange(registrations))
+        df = pd.read_csv(path)
+        df.loc[(df["IP Address"] == ip) & (df["Name"] == name), "Active"] = bool(i % 2)
+        df.to_csv(path, index=False)
+    return register_time, time.perf_counter() - start
+
+
+def registry_run(registry: AgentRegistry, registrations: int, toggles: int) -> tuple:
+    start = time.perf_counter()
+    for i in range(registrations):
+        ip, name, columns = agent(i)
+        registry.add_agent(ip, name, ROLE_PUBLIC, columns)
+    len(registry.public)  # materialize the buffered rows, as the next search would
+    register_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(toggles):
+        ip, name, _ = agent(random.randrange(registrations))
+        registry.set_active(ip, name, bool(i % 2))
+    toggle_time = time.perf_counter() - start
+    registry.close()
+    return register_time, toggle_time
+
+
+def registry_batch_run(registry: AgentRegistry, registrations: int, toggles: int, batch: int) -> tuple:
+    start = time.perf_counter()
+    for first in range(0, registrations, batch):
+        registry.add_agents([(ip, name, ROLE_PUBLIC, columns)
+                             for ip, name, columns in map(agent, range(first, min(first + batch, registrations)))])
+    len(registry.public)
+    register_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for first in range(0, toggles, batch):
+        updates = []
+        for i in range(first, min(first + batch, toggles)):
+            ip, name, _ = agent(random.randrange(registrations))
+            updates.append((ip, name, bool(i % 2)))
+        registry.set_active_many(updates)
+    toggle_time = time.perf_counter() - start
+    registry.close()
+    return register_time, toggle_time
+
+
+def report(label: str, registrations: int, toggles: int, register_time: float, toggle_time: float) -> None:
+    print(f"{label:<12} {registrations:>8} reg {register_time:>8.2f}s ({registrations / register_time:>9.0f}/s)  "
+          f"{toggles:>8} toggles {toggle_time:>8.2f}s ({toggles / toggle_time:>9.0f}/s)")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registrations", type=int, default=10000)
+    parser.add_argument("--toggles", type=int, default=100000)
+    parser.add_argument("--baseline", type=int, default=500, help="mutations of the csv rewrite run")
+    parser.add_argument("--batch", type=int, default=1000, help="items per transaction of the batch run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    runs = [
+        ("csv rewrite", args.baseline, args.baseline, lambda folder: csv_rewrite(folder, args.baseline, args.baseline)),
+        ("csv memory", args.registrations, args.toggles,
+         lambda folder: registry_run(AgentRegistry(folder, flush_interval=3600), args.registrations, args.toggles)),
+        ("sqlite", args.registrations, args.toggles,
+         lambda folder: registry_run(AgentRegistry(folder, store=_imported_store(folder)), args.registrations, args.toggles)),
+        ("sqlite batch", args.registrations, args.toggles,
+         lambda folder: registry_batch_run(AgentRegistry(folder, store=_imported_store(folder)),
+                                           args.registrations, args.toggles, args.batch)),
+    ]
+    for label, registrations, toggles, run in runs:
+        random.seed(args.seed)
+        folder = tempfile.mkdtemp(prefix="registry_bench_")
+        try:
+            copy_registry(folder)
+            with contextlib.redirect_stdout(io.StringIO()):
+                register_time, toggle_time = run(folder)
+            report(label, registrations, toggles, register_time, toggle_time)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def _imported_store(folder: str) -> SQLiteRegistryStore:
+    store = SQLiteRegistryStore(os.path.join(folder, "registry.db"))
+    store.import_csv(folder)
+    return store
+
+
+if __name__ == "__main__":
+    main_cli()
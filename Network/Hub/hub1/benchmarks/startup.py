@@ -0,0 +1,109 @@
+"""
+Startup time of a hub worker, cold vs warm-started from a snapshot.
+
+Copies the hub into a temporary folder with `--agents` synthetic public agents, then
+starts fresh Python processes that import main.py (which builds the registry and the
+Hub) and prepare a first search (agent type table, type index, context table):
+
+  cold   no snapshot: CSV files or SQLite store loaded, access index and prompt
+         tables built, type index encoded on the first request
+  warm   the snapshot written by the cold process on shutdown is loaded instead
+
+It also reports the import time of the two heavy dependencies:
+
+  openai  no longer imported by main.py; the LLM gateway imports it on its first real call
+  pandas  imported by registry.py, and included in "import main" in both runs. It is not
+          deferred: the registry tables are DataFrames, built from the CSV files or the
+          store (cold) or unpickled from the snapshot (warm) before main.py finishes
+          importing, so a lazy import would only move its cost, not remove it. utils.py
+          imports it only inside its CSV helpers.
+
+Run from the hub folder:
+    python benchmarks/startup.py --agents 20000
+    python benchmarks/startup.py --agents 20000 --store sqlite
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HUB_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AGENT_TYPES = ["Pharmacy", "Hotel", "Bakery", "Doctor", "Dentist", "Taxi", "Restaurant", "Plumber"]
+
+WORKER = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+hub = main.hub1_agent
+hub.prompt_tables.agent_type_table()
+hub.build_search_context("Can you find a pharmacy near me?", ["Pharmacy"])
+ready = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_search": ready - imported, "warm": main.registry.warm}))
+asyncio.run(main.flush_registry())
+"""
+
+
+def prepare(folder: str, agents: int, store: str) -> None:
+    for name in os.listdir(HUB_DIRECTORY):
+        path = os.path.join(HUB_DIRECTORY, name)
+        if os.path.isfile(path) and not name.endswith((".db", ".bin", ".db-wal", ".db-shm")):
+            shutil.copy(path, folder)
+    with open(os.path.join(folder, "Public_Agent_properties.csv"), "w") as file:
+        file.write("Agent Type,Name,Rate,IP Address,Port,Active,Description\n")
+        for i in range(agents):
+            agent_type = AGENT_TYPES[i % len(AGENT_TYPES)]
+            file.write(f"{agent_type},{agent_type} {i},4.0,10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256},"
+                       f"{8000 + i % 1000},TRUE,A {agent_type.lower()} serving district {i % 97}.\n")
+    with open(os.path.join(folder, "config.json")) as file:
+        config = json.load(file)
+    config.update({"api_key": "benchmark", "gossip_interval": 0, "health_probe_interval": 0, "lease_sweep_interval": 0,
+                   "registry_store": {"backend": store, "path": "registry.db"},
+                   "snapshot": {"path": "hub_snapshot.bin", "interval": 0}})
+    config["llm"] = dict(config.get("llm") or {}, backend="stub", cache_path="")
+    with open(os.path.join(folder, "config.json"), "w") as file:
+        json.dump(config, file)
+
+
+def run_worker(folder: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", WORKER], cwd=folder, capture_output=True, text=True, check=True).stdout
+    return json.loads(next(line for line in output.splitlines() if line.startswith("{")))
+
+
+def import_time(module: str) -> float:
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    return float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=20000)
+    parser.add_argument("--store", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--repeat", type=int, default=3, help="warm starts measured (best is reported)")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="hub_startup_")
+    try:
+        prepare(folder, args.agents, args.store)
+        run_worker(folder)  # imports the CSV into SQLite if needed and writes the first snapshot
+        os.remove(os.path.join(folder, "hub_snapshot.bin"))
+        cold = run_worker(folder)
+        warm = min((run_worker(folder) for _ in range(args.repeat)), key=lambda run: run["import"] + run["first_search"])
+        snapshot_size = os.path.getsize(os.path.join(folder, "hub_snapshot.bin"))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{args.agents} public agents, {args.store} registry, snapshot {snapshot_size / 1024:.0f} KiB")
+    for label, run in (("cold", cold), ("warm", warm)):
+        print(f"{label:<5} warm={str(run['warm']):<5} import main {run['import']:.3f}s  "
+              f"first search ready {run['first_search']:.3f}s  total {run['import'] + run['first_search']:.3f}s")
+    print(f"import openai (now deferred to the first LLM call): {import_time('openai'):.3f}s")
+    print(f"import pandas (part of import main, needed to build the registry): {import_time('pandas'):.3f}s")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,151 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NewType, Optional, Tuple
+
+IP = NewType('IP address', str)
+Port = NewType('Port', str)
+Address = Tuple[IP, Port]
+Name = NewType('Name', str)
+Friend = Tuple[Name, Address]
+
+_MISSING = object()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so trivially different spellings share one cache entry.
+
+    "Can you find pharmacies ?" and "can you  find pharmacies?" both become
+    "can you find pharmacies".
+    """
+    text = re.sub(r"\s+", " ", str(prompt).strip().lower())
+    text = re.sub(r"\s+([?.!,;:])", r"\1", text)
+    return text.rstrip("?.!,;: ")
+
+
+def normalize_block_list(person_block: Optional[List[Friend]]) -> frozenset:
+    """
+    Turn a block list into an order-independent hashable key.
+    """
+    if not person_block:
+        return frozenset()
+    return frozenset((str(name), str(ip), str(port)) for name, (ip, port) in person_block)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def export_state(self) -> List[Tuple[Hashable, float, Any]]:
+        """
+        Live entries as (key, seconds left, value), oldest first, for a warm-start snapshot.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [(key, expires_at - now, value) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def restore_state(self, entries: List[Tuple[Hashable, float, Any]]) -> None:
+        """
+        Reload entries saved by export_state, keeping what was left of their lifetime.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key, remaining, value in entries[-self.maxsize:]:
+                self._data[key] = (now + min(remaining, self.ttl), value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SearchCache:
+    """
+    Two-level cache for hub searches.
+
+    Level one maps a normalized prompt to the agent types found by find_type_agent.
+    Level two maps (normalized prompt, block list) to the local _find_agent result.
+    Both levels are emptied as soon as the registry version changes.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0) -> None:
+        self.types = TTLCache(maxsize, ttl)
+        self.results = TTLCache(maxsize, ttl)
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def sync_version(self, version: int) -> None:
+        """
+        Drop every entry if the registry changed since the last call.
+        """
+        with self._lock:
+            if version != self._version:
+                self.types.clear()
+                self.results.clear()
+                self._version = version
+
+    def type_key(self, prompt: str, version: int) -> Tuple:
+        return (normalize_prompt(prompt), version)
+
+    def result_key(self, prompt: str, person_block: Optional[List[Friend]], version: int) -> Tuple:
+        return (normalize_prompt(prompt), normalize_block_list(person_block), version)
+
+    def export_state(self) -> dict:
+        return {"version": self._version, "types": self.types.export_state(), "results": self.results.export_state()}
+
+    def restore_state(self, state: dict) -> None:
+        with self._lock:
+            self._version = state["version"]
+        self.types.restore_state(state["types"])
+        self.results.restore_state(state["results"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "registry_version": self._version,
+            "types": self.types.stats(),
+            "results": self.results.stats(),
+        }
@@ -0,0 +1,177 @@
+import re
+from typing import Dict, List, Optional, Protocol, Tuple, Union
+
+import numpy as np
+
+from prompt_tables import AgentRow, PromptTables
+
+# Relevance of the candidates to the prompt, by registry position
+Relevance = Union[Dict[int, float], np.ndarray]
+
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class Tokenizer(Protocol):
+    """
+    Interface of the token counters used by ContextBuilder.
+    """
+
+    def count(self, text: str) -> int:
+        ...
+
+
+class ApproxTokenizer:
+    """
+    Dependency-free estimate: words and punctuation marks, long words counted per 4 characters.
+    """
+
+    def count(self, text: str) -> int:
+        return sum(max(1, (len(token) + 3) // 4) for token in _WORD_PATTERN.findall(text))
+
+
+class TiktokenTokenizer:
+    """
+    Exact OpenAI token counts through the optional `tiktoken` package.
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini") -> None:
+        try:
+            import tiktoken
+        except ImportError as e:
+            raise ImportError("TiktokenTokenizer requires the 'tiktoken' package (pip install tiktoken).") from e
+        try:
+            self._encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self._encoding = tiktoken.get_encoding("o200k_base")
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text))
+
+
+def make_tokenizer(name: str = "approx") -> Tokenizer:
+    """
+    Build a tokenizer from its configuration name ("approx" or "tiktoken").
+    """
+    if name == "tiktoken":
+        return TiktokenTokenizer()
+    return ApproxTokenizer()
+
+
+class ContextBuilder:
+    """
+    Packs the most useful agents (or agent types) into a token budget for the hub prompts.
+
+    Candidates are ranked by a weighted sum of their local relevance to the prompt and
+    their normalized 'Rate', then added best first until the budget is spent.
+    """
+
+    def __init__(self, tables: PromptTables, tokenizer: Optional[Tokenizer] = None,
+                 token_budget: int = 1500, compact: bool = False,
+                 relevance_weight: float = 0.7, rate_weight: float = 0.3, max_rate: float = 5.0) -> None:
+        """
+        Args:
+            tables (PromptTables): The pre-rendered agent and type tables.
+            tokenizer (Tokenizer, optional): Token counter, ApproxTokenizer by default.
+            token_budget (int): Maximum tokens of a context table.
+            compact (bool): Use the compact row encoding for agent tables.
+            relevance_weight (float): Weight of the local relevance score.
+            rate_weight (float): Weight of the agent 'Rate'.
+            max_rate (float): Rate value mapped to 1.0.
+        """
+        self.tables = tables
+        self.tokenizer = tokenizer or ApproxTokenizer()
+        self.token_budget = token_budget
+        self.compact = compact
+        self.relevance_weight = relevance_weight
+        self.rate_weight = rate_weight
+        self.max_rate = max_rate
+        self._line_tokens: Dict[str, int] = {}
+
+    def _tokens(self, line: str) -> int:
+        # Row lines only change with the registry, so their token counts are memoized
+        count = self._line_tokens.get(line)
+        if count is None:
+            if len(self._line_tokens) > 100_000:
+                self._line_tokens.clear()
+            count = self.tokenizer.count(line) + 1  # +1 for the newline
+            self._line_tokens[line] = count
+        return count
+
+    def rank_agents(self, rows: List[AgentRow], relevance: Optional[Relevance] = None) -> List[AgentRow]:
+        """
+        Order agents best first by relevance and rate.
+
+        Args:
+            rows (List[AgentRow]): The candidate agents.
+            relevance (Relevance, optional): Local relevance per row position, as a dict or an array.
+
+        Returns:
+            List[AgentRow]: The agents, best first.
+        """
+        if not rows:
+            return []
+        positions = np.fromiter((row.position for row in rows), dtype=np.int64, count=len(rows))
+        if isinstance(relevance, np.ndarray):
+            inside = positions < len(relevance)
+            local = np.where(inside, relevance[np.where(inside, positions, 0)] if len(relevance) else 0.0, 0.0)
+        else:
+            relevance = relevance or {}
+            local = np.fromiter((relevance.get(row.position, 0.0) for row in rows), dtype=np.float64, count=len(rows))
+        score = self.relevance_weight * local + self.rate_weight * self.tables.rates(positions) / self.max_rate
+        # Stable on the negated score: ties keep their registry order, as sorted(reverse=True) did
+        return [rows[i] for i in np.argsort(-score, kind="stable")]
+
+    def build_agents(self, rows: List[AgentRow], relevance: Optional[Relevance] = None) -> str:
+        """
+        Render the best agents that fit in the token budget.
+
+        Args:
+            rows (List[AgentRow]): The candidate agents.
+            relevance (Relevance, optional): Local relevance per row position, as a dict or an array.
+
+        Returns:
+            str: The context table with its metadata line.
+        """
+        header, _ = self.tables.header(self.compact)
+        used = self.tokenizer.count(header) + 8  # header plus the "Rows: n, Columns: m" line
+        packed = []
+        ranked = self.rank_agents(rows, relevance)
+        for row in ranked:
+            cost = self._tokens(row.compact if self.compact else row.line)
+            if used + cost > self.token_budget:
+                continue  # a shorter row further down may still fit
+            packed.append(row)
+            used += cost
+        if not packed and ranked:
+            packed = ranked[:1]  # never send an empty table when there are candidates
+        return self.tables.format_rows(packed, max_rows=None, compact=self.compact)
+
+    def build_types(self, type_scores: Optional[Dict[str, float]] = None) -> str:
+        """
+        Render the agent type table, trimmed to the budget by local relevance if it is too long.
+
+        Args:
+            type_scores (Dict[str, float], optional): Local relevance per agent type.
+
+        Returns:
+            str: The '| Agent Name | Description |' table.
+        """
+        type_lines = self.tables.type_lines()
+        total = sum(self._tokens(line) for _, line in type_lines)
+        header_tokens = self.tokenizer.count(self.tables.render_types([]))
+        if header_tokens + total <= self.token_budget:
+            return self.tables.render_types(type_lines)
+
+        type_scores = type_scores or {}
+        ranked: List[Tuple[str, str]] = sorted(type_lines, key=lambda item: type_scores.get(item[0], 0.0), reverse=True)
+        used = header_tokens
+        packed = []
+        for agent_type, line in ranked:
+            cost = self._tokens(line)
+            if used + cost > self.token_budget:
+                continue
+            packed.append((agent_type, line))
+            used += cost
+        if not packed and ranked:
+            packed = ranked[:1]
+        return self.tables.render_types(packed)
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, NewType, Optional, Tuple
+
+IP = NewType('IP address', str)
+Port = NewType('Port', str)
+Address = Tuple[IP, Port]
+Name = NewType('Name', str)
+Friend = Tuple[Name, Address]
+
+# How the answers of the friend hubs are combined
+FEDERATION_FIRST = "first"  # return the first "Find" and cancel the other requests
+FEDERATION_MERGE = "merge"  # wait for every friend (up to the deadline) and merge their agents
+FEDERATION_BEST_K = "best_k"  # search locally and on every friend, return the global top-k agents
+FEDERATION_MODES = (FEDERATION_FIRST, FEDERATION_MERGE, FEDERATION_BEST_K)
+
+
+async def fan_out(friends: List[Friend],
+                  ask: Callable[[Friend], Awaitable[dict]],
+                  mode: str = FEDERATION_FIRST,
+                  deadline: Optional[float] = None) -> List[Tuple[Friend, dict]]:
+    """
+    Ask every friend hub at once and collect their answers as they arrive.
+
+    Args:
+        friends (List[Friend]): The friend hubs to query.
+        ask (Callable): Coroutine function sending the search to one friend.
+        mode (str): FEDERATION_FIRST or FEDERATION_MERGE.
+        deadline (float, optional): Seconds after which the remaining requests are cancelled.
+
+    Returns:
+        List[Tuple[Friend, dict]]: (friend, response) pairs in arrival order.
+    """
+    answers: List[Tuple[Friend, dict]] = []
+    async for friend, response in iter_fan_out(friends, ask, deadline):
+        answers.append((friend, response))
+        if mode == FEDERATION_FIRST and response.get("status") == "Find":
+            break
+    return answers
+
+
+async def iter_fan_out(friends: List[Friend],
+                       ask: Callable[[Friend], Awaitable[dict]],
+                       deadline: Optional[float] = None) -> AsyncIterator[Tuple[Friend, dict]]:
+    """
+    Ask every friend hub at once and yield each answer as soon as it arrives.
+
+    Requests still running when the deadline passes, or when the caller stops iterating,
+    are cancelled.
+
+    Args:
+        friends (List[Friend]): The friend hubs to query.
+        ask (Callable): Coroutine function sending the search to one friend.
+        deadline (float, optional): Seconds after which the remaining requests are cancelled.
+
+    Yields:
+        Tuple[Friend, dict]: (friend, response) pairs in arrival order.
+    """
+    if not friends:
+        return
+    tasks = {asyncio.ensure_future(ask(friend)): friend for friend in friends}
+    pending = set(tasks)
+    end = None if deadline is None else time.monotonic() + deadline
+    try:
+        while pending:
+            timeout = None if end is None else max(0.0, end - time.monotonic())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break  # global deadline reached
+            for task in done:
+                try:
+                    response = task.result()
+                except Exception as e:
+                    response = {"status": "error", "message": str(e)}
+                yield tasks[task], response
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def merge_responses(answers: List[Tuple[Friend, dict]]) -> dict:
+    """
+    Combine the answers of several hubs into one search result.
+
+    Args:
+        answers (List[Tuple[Friend, dict]]): (friend, response) pairs.
+
+    Returns:
+        dict: A "Find" result listing every agent found, or a "Not Found" result.
+    """
+    agents = []
+    for _, response in answers:
+        if response.get("status") == "Find":
+            agents.extend(response.get("agents") or [])
+    if agents:
+        return {"status": "Find", "agents": agents}
+    return {"status": "Not Found", "agents": []}
+
+
+def merge_top_k(answers: List[Tuple[Friend, dict]], k: int = 5,
+                relevance_weight: float = 0.7, goodness_weight: float = 0.3,
+                max_rate: float = 5.0) -> dict:
+    """
+    Rank the agents found by several hubs on one scale and keep the best k.
+
+    'relevance_rate' (1 to 5 in the ranking prompt) is mapped to [0, 1]; 'goodness_rate'
+    has no fixed range, so it is divided by the largest of `max_rate` and the best rate
+    of the same hub. An agent returned by several hubs, identified by (name, ip, port),
+    keeps its best score.
+
+    Args:
+        answers (List[Tuple[Friend, dict]]): (hub, response) pairs, the local hub included.
+        k (int): Number of agents to return.
+        relevance_weight (float): Weight of the normalized relevance.
+        goodness_weight (float): Weight of the normalized goodness.
+        max_rate (float): Default upper bound of 'goodness_rate'.
+
+    Returns:
+        dict: A "Find" result with the top-k agents, best first, each with its 'score'
+        and the 'hub' that returned it, or a "Not Found" result.
+    """
+    best = {}
+    for (hub_name, _), response in answers:
+        if response.get("status") != "Find":
+            continue
+        agents = [agent for agent in response.get("agents") or [] if isinstance(agent, dict)]
+        goodness_scale = max([max_rate] + [_rate(agent.get("goodness_rate")) for agent in agents])
+        for agent in agents:
+            location = agent.get("location") or {}
+            key = (str(agent.get("name")), str(location.get("ip")), str(location.get("port")))
+            relevance = min(max((_rate(agent.get("relevance_rate")) - 1.0) / 4.0, 0.0), 1.0)
+            goodness = min(max(_rate(agent.get("goodness_rate")) / goodness_scale, 0.0), 1.0)
+            score = relevance_weight * relevance + goodness_weight * goodness
+            if key not in best or score > best[key][0]:
+                best[key] = (score, agent, hub_name)
+    ranked = sorted(best.values(), key=lambda item: item[0], reverse=True)[:k]
+    if not ranked:
+        return {"status": "Not Found", "agents": []}
+    return {
+        "status": "Find",
+        "agents": [dict(agent, score=round(score, 4), hub=agent.get("hub") or hub_name) for score, agent, hub_name in ranked],
+    }
+
+
+def _rate(value) -> float:
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if rate != rate else rate  # NaN
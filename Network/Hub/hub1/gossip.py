@@ -0,0 +1,151 @@
+import threading
+import time
+from typing import Dict, Iterable, List, NewType, Optional, Set, Tuple
+
+from retrieval import tokenize
+
+IP = NewType('IP address', str)
+Port = NewType('Port', str)
+Address = Tuple[IP, Port]
+Name = NewType('Name', str)
+Friend = Tuple[Name, Address]
+
+FriendKey = Tuple[str, str, str]  # (Name, IP Address, Port)
+
+
+def friend_key(friend: Friend) -> FriendKey:
+    name, (ip, port) = friend
+    return (str(name), str(ip), str(port))
+
+
+def build_digest(name: str, ip: str, port: str, version: int,
+                 type_counts: Dict[str, int], reachable_types: Iterable[str]) -> dict:
+    """
+    Compact description of what a hub can serve, exchanged with its friends.
+
+    Args:
+        name (str): Name of the hub.
+        ip (str): IP address of the hub.
+        port (str): Port of the hub.
+        version (int): Registry version the counts were taken from.
+        type_counts (Dict[str, int]): Active public agents per agent type.
+        reachable_types (Iterable[str]): Types advertised by the hub's own friends.
+
+    Returns:
+        dict: The catalog digest.
+    """
+    return {
+        "hub": name,
+        "location": {"ip": ip, "port": str(port)},
+        "version": version,
+        "types": type_counts,
+        "reachable_types": sorted(set(reachable_types) - set(type_counts)),
+        "sent_at": time.time(),
+    }
+
+
+def _type_terms(agent_type: str) -> Set[str]:
+    return set(tokenize(agent_type)) or {agent_type.lower()}
+
+
+class PeerCatalogs:
+    """
+    Catalog digests received from the friend hubs, each valid for `ttl` seconds.
+
+    A friend is worth asking for a query when its fresh digest advertises, directly or
+    through its own friends, an agent type sharing a term with the requested types.
+    Friends without a fresh digest are always asked, so routing never hides a hub that
+    has not gossiped yet.
+    """
+
+    def __init__(self, ttl: float = 90.0) -> None:
+        """
+        Args:
+            ttl (float): Seconds a received digest is trusted.
+        """
+        self.ttl = ttl
+        self._digests: Dict[FriendKey, Tuple[float, dict, Set[str]]] = {}
+        self._lock = threading.Lock()
+        self.routed = 0
+        self.skipped = 0
+
+    def update(self, friend: Friend, digest: dict) -> None:
+        """
+        Store the latest digest of a friend, ignoring ones older than what is known.
+        """
+        key = friend_key(friend)
+        terms: Set[str] = set()
+        for agent_type in list(digest.get("types") or {}) + list(digest.get("reachable_types") or []):
+            terms |= _type_terms(str(agent_type))
+        with self._lock:
+            known = self._digests.get(key)
+            if known is not None and known[1].get("sent_at", 0) > digest.get("sent_at", 0):
+                return
+            self._digests[key] = (time.monotonic(), digest, terms)
+
+    def fresh(self, friend: Friend) -> Optional[dict]:
+        """
+        The digest of a friend if it was received less than `ttl` seconds ago.
+        """
+        entry = self._digests.get(friend_key(friend))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def route(self, friends: List[Friend], list_type: Optional[List[str]]) -> List[Friend]:
+        """
+        Keep the friends that may serve one of the requested agent types.
+
+        Args:
+            friends (List[Friend]): Candidate friend hubs.
+            list_type (List[str], optional): Agent types of the query; all friends are kept if empty.
+
+        Returns:
+            List[Friend]: The friends to ask, in their original order.
+        """
+        if not list_type:
+            return list(friends)
+        wanted: Set[str] = set()
+        for agent_type in list_type:
+            wanted |= _type_terms(str(agent_type))
+        now = time.monotonic()
+        selected = []
+        for friend in friends:
+            entry = self._digests.get(friend_key(friend))
+            if entry is None or now - entry[0] > self.ttl or entry[2] & wanted:
+                selected.append(friend)
+        self.routed += len(selected)
+        self.skipped += len(friends) - len(selected)
+        return selected
+
+    def reachable_types(self) -> Set[str]:
+        """
+        Agent types advertised by the fresh digests, to forward in this hub's own digest.
+        """
+        now = time.monotonic()
+        types: Set[str] = set()
+        with self._lock:
+            entries = list(self._digests.values())
+        for received, digest, _ in entries:
+            if now - received <= self.ttl:
+                types.update(str(agent_type) for agent_type in digest.get("types") or {})
+                types.update(str(agent_type) for agent_type in digest.get("reachable_types") or [])
+        return types
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            entries = dict(self._digests)
+        return {
+            "routed": self.routed,
+            "skipped": self.skipped,
+            "peers": {
+                key[0]: {
+                    "fresh": now - received <= self.ttl,
+                    "age": now - received,
+                    "version": digest.get("version"),
+                    "types": digest.get("types"),
+                }
+                for key, (received, digest, _) in entries.items()
+            },
+        }
@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NewType, Optional, Tuple
+
+IP = NewType('IP address', str)
+Port = NewType('Port', str)
+Address = Tuple[IP, Port]
+Name = NewType('Name', str)
+Friend = Tuple[Name, Address]
+
+PeerKey = Tuple[str, str, str]  # (Name, IP Address, Port)
+
+# Circuit breaker states
+CLOSED = "closed"        # healthy, every request goes through
+OPEN = "open"            # failing, requests are skipped until the cool-down is over
+HALF_OPEN = "half_open"  # cool-down over, a single trial request decides
+
+
+def _key(friend: Friend) -> PeerKey:
+    name, (ip, port) = friend
+    return (str(name), str(ip), str(port))
+
+
+class PeerHealth:
+    """
+    Rolling latency and error statistics of one friend hub, with its breaker state.
+    """
+
+    def __init__(self, window: int) -> None:
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.latency: Optional[float] = None  # exponentially weighted moving average
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.trial_started = 0.0
+        self.opened = 0
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def as_dict(self) -> dict:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        return {
+            "state": self.state,
+            "latency_ewma": self.latency,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "error_rate": self.error_rate(),
+            "samples": len(self.samples),
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.opened,
+        }
+
+
+class HealthTracker:
+    """
+    Per-peer health of the friend hubs with a circuit breaker.
+
+    A friend's breaker opens after `failure_threshold` consecutive failures, or when the
+    error rate of its last `window` calls reaches `max_error_rate`. Open friends are
+    skipped; once `open_seconds` have passed a single trial request (a background probe
+    or a search) is let through, closing the breaker on success and reopening it on failure.
+    A trial that ends without an outcome (its request was cancelled) is released, and one
+    still unanswered after `trial_seconds` is handed out again.
+    """
+
+    def __init__(self, window: int = 20, failure_threshold: int = 3, max_error_rate: float = 0.5,
+                 min_samples: int = 5, open_seconds: float = 30.0, latency_alpha: float = 0.3,
+                 trial_seconds: float = 60.0) -> None:
+        """
+        Args:
+            window (int): Number of recent calls kept per friend.
+            failure_threshold (int): Consecutive failures that open the breaker.
+            max_error_rate (float): Error rate over the window that opens the breaker.
+            min_samples (int): Calls needed before the error rate is considered.
+            open_seconds (float): Cool-down before a trial request is allowed.
+            latency_alpha (float): Smoothing factor of the latency moving average.
+            trial_seconds (float): Time after which an unanswered trial request is given up.
+        """
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.open_seconds = open_seconds
+        self.latency_alpha = latency_alpha
+        self.trial_seconds = trial_seconds
+        self._peers: Dict[PeerKey, PeerHealth] = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+
+    def _peer(self, friend: Friend) -> PeerHealth:
+        key = _key(friend)
+        peer = self._peers.get(key)
+        if peer is None:
+            peer = self._peers[key] = PeerHealth(self.window)
+        return peer
+
+    def record(self, friend: Friend, latency: float, ok: bool) -> None:
+        """
+        Record the outcome of a call to a friend.
+
+        Args:
+            friend (Friend): The friend hub.
+            latency (float): Duration of the call in seconds.
+            ok (bool): False if the call failed (connection error, timeout, 5xx).
+        """
+        with self._lock:
+            peer = self._peer(friend)
+            peer.samples.append((latency, ok))
+            peer.trial_running = False
+            if ok:
+                peer.latency = latency if peer.latency is None else (
+                    self.latency_alpha * latency + (1 - self.latency_alpha) * peer.latency)
+                peer.consecutive_failures = 0
+                peer.state = CLOSED
+                return
+            peer.consecutive_failures += 1
+            too_many_errors = len(peer.samples) >= self.min_samples and peer.error_rate() >= self.max_error_rate
+            if peer.state == HALF_OPEN or (peer.state == CLOSED and (
+                    peer.consecutive_failures >= self.failure_threshold or too_many_errors)):
+                peer.state = OPEN
+                peer.opened_at = time.monotonic()
+                peer.opened += 1
+
+    def release(self, friend: Friend) -> None:
+        """
+        End a call to a friend that produced no outcome (cancelled): a trial it held is
+        handed back so the next search or probe can take it.
+        """
+        with self._lock:
+            peer = self._peers.get(_key(friend))
+            if peer is not None:
+                peer.trial_running = False
+
+    def _take_trial(self, peer: PeerHealth) -> bool:
+        # Called with the lock held: move OPEN to HALF_OPEN after the cool-down and hand out one trial
+        now = time.monotonic()
+        if peer.state == OPEN and now - peer.opened_at >= self.open_seconds:
+            peer.state = HALF_OPEN
+            peer.trial_running = False
+        if peer.state == HALF_OPEN and (not peer.trial_running or now - peer.trial_started >= self.trial_seconds):
+            peer.trial_running = True
+            peer.trial_started = now
+            return True
+        return False
+
+    def allow(self, friend: Friend) -> bool:
+        """
+        Whether a request may be sent to a friend now.
+        """
+        with self._lock:
+            peer = self._peers.get(_key(friend))
+            if peer is None or peer.state == CLOSED:
+                return True
+            if self._take_trial(peer):
+                return True
+            self.skipped += 1
+            return False
+
+    def order(self, friends: Iterable[Friend]) -> List[Friend]:
+        """
+        Drop the friends whose breaker is open and sort the others by observed latency,
+        friends never measured first so they get a latency.
+        """
+        allowed = [friend for friend in friends if self.allow(friend)]
+
+        def latency(friend: Friend) -> float:
+            peer = self._peers.get(_key(friend))
+            return peer.latency if peer is not None and peer.latency is not None else 0.0
+
+        return sorted(allowed, key=latency)
+
+    def due_probes(self, friends: Iterable[Friend]) -> List[Friend]:
+        """
+        Friends whose cool-down is over and that should get a half-open probe now.
+        """
+        due = []
+        with self._lock:
+            for friend in friends:
+                peer = self._peers.get(_key(friend))
+                if peer is not None and peer.state != CLOSED and self._take_trial(peer):
+                    due.append(friend)
+        return due
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "skipped": self.skipped,
+                "peers": {key[0]: peer.as_dict() for key, peer in self._peers.items()},
+            }
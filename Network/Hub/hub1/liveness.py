@@ -0,0 +1,158 @@
+import heapq
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+AgentKey = Tuple[str, str]  # (IP Address, Agent Name)
+
+
+class LeaseTable:
+    """
+    Heartbeat leases of the registered agents.
+
+    An agent renewing its lease is considered alive until the lease runs out. Expiry
+    times are kept in a min-heap, so a renewal costs O(log n) and a sweep only pops the
+    leases that are actually due instead of scanning every agent. A renewal does not
+    remove the old heap entry: entries whose time no longer matches the lease of their
+    agent are skipped when popped, and the heap is rebuilt once they outnumber the
+    live leases.
+
+    Agents that never sent a heartbeat have no lease and are left alone.
+    """
+
+    def __init__(self, default_ttl: float = 60.0, max_ttl: float = 600.0) -> None:
+        """
+        Args:
+            default_ttl (float): Lease length when the agent does not ask for one.
+            max_ttl (float): Longest lease an agent may ask for.
+        """
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self._expiry: Dict[AgentKey, float] = {}
+        self._heap: List[Tuple[float, AgentKey]] = []
+        self._lock = threading.Lock()
+        self.renewals = 0
+        self.expirations = 0
+
+    def renew(self, key: AgentKey, ttl: Optional[float] = None) -> float:
+        """
+        Start or extend the lease of an agent.
+
+        Args:
+            key (AgentKey): (IP Address, Agent Name) of the agent.
+            ttl (float, optional): Requested lease length, capped at `max_ttl`.
+
+        Returns:
+            float: The granted lease length in seconds.
+        """
+        ttl = self.default_ttl if ttl is None else min(max(float(ttl), 0.0), self.max_ttl)
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._expiry[key] = expires_at
+            heapq.heappush(self._heap, (expires_at, key))
+            self.renewals += 1
+            if len(self._heap) > 2 * len(self._expiry) + 64:
+                self._heap = [(expiry, agent) for agent, expiry in self._expiry.items()]
+                heapq.heapify(self._heap)
+        return ttl
+
+    def release(self, key: AgentKey) -> None:
+        """
+        Drop the lease of an agent, e.g. when it deactivates itself.
+        """
+        with self._lock:
+            self._expiry.pop(key, None)
+
+    def has_lease(self, key: AgentKey) -> bool:
+        return key in self._expiry
+
+    def expired(self, now: Optional[float] = None) -> List[AgentKey]:
+        """
+        Remove and return the agents whose lease ran out.
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, key = heapq.heappop(self._heap)
+                if self._expiry.get(key) == expires_at:
+                    del self._expiry[key]
+                    expired.append(key)
+            self.expirations += len(expired)
+        return expired
+
+    def stats(self) -> dict:
+        with self._lock:
+            next_expiry = self._heap[0][0] - time.monotonic() if self._heap else None
+            return {
+                "leases": len(self._expiry),
+                "heap_entries": len(self._heap),
+                "renewals": self.renewals,
+                "expirations": self.expirations,
+                "next_expiry_in": next_expiry,
+            }
+
+
+class SQLiteLeaseTable:
+    """
+    Heartbeat leases kept in the registry database, shared by the worker processes of
+    a hub: a heartbeat may reach any worker, and each worker's sweeper may expire it.
+
+    An index on the expiry time plays the role of the heap: a sweep reads only the due
+    leases, and deletes them in the same statement so two workers never expire the same
+    lease twice. Lease writes do not go through the registry transactions, so a heartbeat
+    does not change the registry generation. Expiry times are wall-clock times, the
+    only clock the processes share.
+    """
+
+    def __init__(self, path: str, default_ttl: float = 60.0, max_ttl: float = 600.0) -> None:
+        """
+        Args:
+            path (str): SQLite database of the registry store.
+            default_ttl (float): Lease length when the agent does not ask for one.
+            max_ttl (float): Longest lease an agent may ask for.
+        """
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS leases (ip TEXT, name TEXT, expires_at REAL, PRIMARY KEY (ip, name))")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS leases_expiry ON leases (expires_at)")
+        self.renewals = 0
+        self.expirations = 0
+
+    def renew(self, key: AgentKey, ttl: Optional[float] = None) -> float:
+        ttl = self.default_ttl if ttl is None else min(max(float(ttl), 0.0), self.max_ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT (ip, name) DO UPDATE SET expires_at = excluded.expires_at",
+                (key[0], key[1], time.time() + ttl))
+            self.renewals += 1
+        return ttl
+
+    def release(self, key: AgentKey) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE ip = ? AND name = ?", key)
+
+    def has_lease(self, key: AgentKey) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM leases WHERE ip = ? AND name = ?", key).fetchone() is not None
+
+    def expired(self, now: Optional[float] = None) -> List[AgentKey]:
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [(ip, name) for ip, name in self._conn.execute(
+                "DELETE FROM leases WHERE expires_at <= ? RETURNING ip, name", (now,)).fetchall()]
+            self.expirations += len(expired)
+        return expired
+
+    def stats(self) -> dict:
+        with self._lock:
+            leases, next_expiry = self._conn.execute("SELECT COUNT(*), MIN(expires_at) FROM leases").fetchone()
+        return {
+            "leases": leases,
+            "renewals": self.renewals,
+            "expirations": self.expirations,
+            "next_expiry_in": next_expiry - time.time() if next_expiry is not None else None,
+        }
@@ -1,18 +1,69 @@
 
 import os
-import openai
-from fastapi import FastAPI, HTTPException,Request,status
-from typing import Any,List,Dict, NewType,Tuple
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import Body, FastAPI, HTTPException,Request,status
+from typing import Any,List,Dict, NewType,Optional,Tuple
 from fastapi.middleware.cors import CORSMiddleware
-from utils import is_agent_exist, read_file_as_strings, find_row_of_data_frame_by_type_agent, make_chat_history, agent_activision, make_data_frame_to_text_table,add_agent_to_csv
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from utils import make_chat_history
 from model import Hub 
+from registry import AgentRegistry, ITEM_NOT_FOUND, ROLE_FRIEND, ROLE_PRIVATE, ROLE_PUBLIC
+from registry_store import make_registry_store
+from snapshot import load_snapshot, save_snapshot
+from federation import FEDERATION_MODES
+from metrics import STAGE_AUTH, STAGE_FIND_TYPE, STAGE_TOTAL, render_gauges
+from planner import PLAN_LLM
 import json
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The background loops run while the server is up; the registry and the snapshot are flushed when it stops
+    await start_background_tasks()
+    try:
+        yield
+    finally:
+        await flush_registry()
+
+
+app = FastAPI(lifespan=lifespan)
 api = "localhost"
 port = "8001"
 api_number = '127.0.0.1'
-hub1_agent = Hub("Hub1",api_number,port)
+with open('config.json') as config_file:
+    config = json.load(config_file)
+# "log_level": "DEBUG" logs the search contexts and the payloads exchanged with friend hubs
+logging.basicConfig(level=str(config.get("log_level", "INFO")).upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("hub")
+# httpx logs every friend hub call at INFO, keep it for debugging only
+logging.getLogger("httpx").setLevel(max(logging.WARNING, logger.getEffectiveLevel()))
+# Warm start: registry, indexes, prompt tables and caches saved by the previous process
+snapshot_config = config.get("snapshot") or {}
+snapshot_path = snapshot_config.get("path", "hub_snapshot.bin")
+snapshot = load_snapshot(snapshot_path) if snapshot_path else None
+# "shared_registry": {"path": "/dev/shm/hub1_registry.bin"} lets several workers (uvicorn --workers N)
+# serve one registry: writes are serialized through the SQLite store, whose change log the workers replay
+store_config = config.get("registry_store") or {}
+shared_config = config.get("shared_registry") or {}
+shared_registry = None
+if shared_config.get("path") and store_config.get("backend", "csv") == "sqlite":
+    from shared_registry import SharedRegistryFile
+    shared_registry = SharedRegistryFile(shared_config["path"], float(shared_config.get("refresh_interval", 0.05)),
+                                         int(shared_config.get("publish_every", 256)))
+elif shared_config.get("path"):
+    logger.warning("shared_registry needs the sqlite registry_store backend; running as a single worker.")
+# "registry_store": {"backend": "sqlite"} opts into keeping the registry in SQLite instead of the CSV files,
+# imported once when the database is created (later CSV edits need `python registry_store.py import`)
+registry_store = make_registry_store(store_config, lock=shared_registry.writer if shared_registry else None)
+registry = AgentRegistry(store=registry_store, snapshot=snapshot["registry"] if snapshot else None,
+                         shared=shared_registry)
+hub1_agent = Hub("Hub1",api_number,port,registry)
+if snapshot:
+    hub1_agent.restore_state(snapshot["hub"])
+    logger.info("Warm start from %s: %s", snapshot_path, "used" if registry.warm else "registry changed, tables reloaded")
 IP = NewType('IP address',str)
 Port = NewType('Port',str)
 Address = Tuple [IP,Port]
@@ -24,8 +75,14 @@ origins = [
     f"http://{api}:{port}",
     f"http://{api}:{port}",
     f"https://{api}:{port}/activation_status",
+    f"https://{api}:{port}/activation_status/batch",
     f"https://{api}:{port}/search_agent",
+    f"https://{api}:{port}/search_agent/stream",
+    f"https://{api}:{port}/gossip",
     f"https://{api}:{port}/add_agent",
+    f"https://{api}:{port}/heartbeat",
+    f"https://{api}:{port}/heartbeat/batch",
+    f"https://{api}:{port}/add_agents",
 ]
 
 app.add_middleware(
@@ -37,57 +94,370 @@ app.add_middleware(
 )
 
 
+background_tasks = []
+
+
+def write_snapshot(state: Optional[dict] = None) -> None:
+    """
+    Pickle, compress and write a snapshot of the hub, of `state` when it was already exported.
+    """
+    try:
+        size = save_snapshot(snapshot_path, hub1_agent.export_state() if state is None else state)
+        logger.info("Snapshot of %d bytes written to %s", size, snapshot_path)
+    except Exception as e:
+        logger.warning("Error while writing the snapshot %s: %s", snapshot_path, e)
+
+
+async def snapshot_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        # The state is exported on the event loop, which is the only mutator of the registry,
+        # indexes and prompt tables, so it is consistent; only pickling and writing it are moved
+        # to a thread, the exported structures being copies or never changed in place
+        try:
+            state = hub1_agent.export_state()
+        except Exception as e:
+            logger.warning("Error while writing the snapshot %s: %s", snapshot_path, e)
+            continue
+        await asyncio.to_thread(write_snapshot, state)
+
+
+async def start_background_tasks():
+    if snapshot_path and float(snapshot_config.get("interval", 300)) > 0:
+        background_tasks.append(asyncio.create_task(snapshot_loop(float(snapshot_config.get("interval", 300)))))
+    # Agents that stop renewing their heartbeat lease are deactivated by the sweeper
+    if hub1_agent.lease_sweep_interval > 0:
+        background_tasks.append(asyncio.create_task(hub1_agent.lease_sweep_loop()))
+    # Periodic exchange of catalog digests and half-open probes of the failing friend hubs
+    if hub1_agent.hub_friends:
+        if hub1_agent.gossip_interval > 0:
+            background_tasks.append(asyncio.create_task(hub1_agent.gossip_loop()))
+        if hub1_agent.health_probe_interval > 0:
+            background_tasks.append(asyncio.create_task(hub1_agent.health_probe_loop()))
+
+
+async def flush_registry():
+    for task in background_tasks:
+        task.cancel()
+    # The snapshot flushes the registry first, so it matches what is persisted
+    if snapshot_path:
+        write_snapshot()
+    # Persist the registry changes that are still waiting for the write-behind thread
+    registry.close()
+    await hub1_agent.transport.aclose()
+    hub1_agent.transport.close()
+    hub1_agent.llm.close()
+
 
 @app.put("/activation_status",status_code=status.HTTP_200_OK)
 async def post_active(boolean: bool,name_agent: str,request: Request):
     
     ip = request.client.host
-    print(ip)
-    flage = agent_activision(ip,name_agent,boolean)
+    logger.debug("Activation status from %s", ip)
+    flage = registry.set_active(ip,name_agent,boolean)
     if flage is False:
         raise HTTPException(status_code=400, detail="Your request have problems.")
+    if not boolean:
+        # A manual deactivation ends the heartbeat lease too
+        hub1_agent.leases.release((ip, name_agent))
 
     return {"message":"Success to update your activision."}
 
 
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+
+async def read_batch(request: Request) -> List[Dict[str, Any]]:
+    # A JSON array, or one JSON object per line when the body is sent as NDJSON
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if content_type in NDJSON_TYPES:
+            items, buffer = [], b""
+            async for chunk in request.stream():
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                items.extend(json.loads(line) for line in lines if line.strip())
+            if buffer.strip():
+                items.append(json.loads(buffer))
+        else:
+            items = await request.json()
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid batch body: {e}")
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The batch must be a list of objects.")
+    return items
+
+
+def batch_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {"results": results, "counts": counts}
+
+
+@app.put("/activation_status/batch",status_code=status.HTTP_200_OK)
+async def post_active_batch(request: Request):
+    # [{"name_agent": ..., "boolean": ...}, ...] applied in one transaction, with a status per item
+    ip = request.client.host
+    items = await read_batch(request)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    updates, indexes = [], []
+    for index, item in enumerate(items):
+        name_agent, boolean = item.get("name_agent"), item.get("boolean")
+        if not isinstance(name_agent, str) or not isinstance(boolean, bool):
+            results[index] = {"name_agent": name_agent, "status": "invalid", "detail": "name_agent (str) and boolean (bool) are required."}
+            continue
+        updates.append((ip, name_agent, boolean))
+        indexes.append(index)
+    for index, outcome in zip(indexes, registry.set_active_many(updates)):
+        results[index] = {"name_agent": items[index]["name_agent"], "status": outcome}
+    for ip, name_agent, boolean in updates:
+        if not boolean:
+            hub1_agent.leases.release((ip, name_agent))
+    return batch_response(results)
+
+
+@app.put("/heartbeat",status_code=status.HTTP_200_OK)
+async def heartbeat(name_agent: str, request: Request, lease_seconds: Optional[float] = None):
+    # Renew the lease of a public agent; it is marked inactive if no heartbeat comes before it ends
+    granted = hub1_agent.heartbeat([(request.client.host, name_agent, lease_seconds)])[0]
+    if granted is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Public agent {name_agent} is not registered.")
+    return {"lease_seconds": granted}
+
+
+@app.put("/heartbeat/batch",status_code=status.HTTP_200_OK)
+async def heartbeat_batch(request: Request):
+    # [{"name_agent": ..., "lease_seconds": ...}, ...], reactivations applied in one transaction
+    ip = request.client.host
+    items = await read_batch(request)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    agents, indexes = [], []
+    for index, item in enumerate(items):
+        name_agent, lease_seconds = item.get("name_agent"), item.get("lease_seconds")
+        if not isinstance(name_agent, str) or (lease_seconds is not None and not isinstance(lease_seconds, (int, float))):
+            results[index] = {"name_agent": name_agent, "status": "invalid", "detail": "name_agent (str) is required, lease_seconds must be a number."}
+            continue
+        agents.append((ip, name_agent, lease_seconds))
+        indexes.append(index)
+    for index, granted in zip(indexes, hub1_agent.heartbeat(agents)):
+        name_agent = items[index]["name_agent"]
+        results[index] = ({"name_agent": name_agent, "status": ITEM_NOT_FOUND} if granted is None
+                          else {"name_agent": name_agent, "status": "renewed", "lease_seconds": granted})
+    return batch_response(results)
+
+
+@app.get("/lease_stats",status_code=status.HTTP_200_OK)
+async def lease_stats():
+    return hub1_agent.leases.stats()
+
+
+DUPLICATE_RESPONSE = {"status": "Not Found", "agents": [], "duplicate": True}
+
+
+def check_federation_params(federation_mode: Optional[str], top_k: Optional[int]) -> None:
+    # "first" returns the first hit, "merge" every hit, "best_k" the global top_k agents
+    if federation_mode is not None and federation_mode not in FEDERATION_MODES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"federation_mode must be one of {list(FEDERATION_MODES)}.")
+    if top_k is not None and top_k < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="top_k must be at least 1.")
+
+
 @app.post("/search_agent",status_code=status.HTTP_200_OK)
-async def search_agent(prompt:str, name_agent: str, request: Request, hub_user_search:List[Friend] = None, agent_block:List[Friend] = None):
+async def search_agent(prompt:str, name_agent: str, request: Request, hub_user_search:List[Friend] = None, agent_block:List[Friend] = None,
+                       request_id: Optional[str] = Body(None), hops_left: Optional[int] = Body(None),
+                       federation_mode: Optional[str] = None, top_k: Optional[int] = None):
+    with hub1_agent.metrics.time(STAGE_TOTAL):
+        ip = request.client.host
+        with hub1_agent.metrics.time(STAGE_AUTH):
+            # One hash lookup resolves whether the caller is a friend hub, a private or a public agent
+            if registry.access_role(ip,name_agent) is None:
+                raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Your are not allowed to access this hub.")
+            check_federation_params(federation_mode, top_k)
+            # A federated search reaching this hub a second time is answered before any LLM call
+            admitted = hub1_agent.admit_request(request_id, hops_left)
+        if admitted is None:
+            return DUPLICATE_RESPONSE
+        request_id, hops_left = admitted
+
+        system_prompt = hub1_agent.prompt_templates.get("system_prompt.txt")
+        with hub1_agent.metrics.time(STAGE_FIND_TYPE):
+            list_type_agent = await hub1_agent.find_type_agent(prompt)
+        # No candidate, or a small unambiguous set, is answered without the ranking LLM
+        plan = hub1_agent.plan_search(list_type_agent, agent_block)
+        chat_dictionary = None
+        if plan.decision == PLAN_LLM:
+            # Best matching agents packed into the context token budget
+            markdown_data_retrival = hub1_agent.build_search_context(prompt, list_type_agent, agent_block, rows=plan.rows)
+            logger.debug("Search context:\n%s", markdown_data_retrival)
+            chat_dictionary = make_chat_history(system_prompt,prompt, markdown_data_retrival)
+        return await hub1_agent.hub_search_agent(chat_dictionary,prompt, hub_user_search, agent_block, federation_mode=federation_mode,
+                                                 list_type=list_type_agent, request_id=request_id, hops_left=hops_left, top_k=top_k,
+                                                 plan=plan)
+
+@app.post("/search_agent/stream",status_code=status.HTTP_200_OK)
+async def search_agent_stream(prompt:str, name_agent: str, request: Request, hub_user_search:List[Friend] = None, agent_block:List[Friend] = None,
+                              request_id: Optional[str] = Body(None), hops_left: Optional[int] = Body(None),
+                              federation_mode: Optional[str] = None, top_k: Optional[int] = None):
+    """
+    Same search as /search_agent, streamed as NDJSON: a "candidates" event with the locally
+    retrieved agents and the planner decision, a "local" event with the ranked result (by
+    the LLM or by the planner), one "friend" event per friend hub answer as it arrives, and
+    a final "done" event.
+    """
+    start = time.perf_counter()
     ip = request.client.host
-    flag_access_freind = is_agent_exist(ip,name_agent, "Hub_properties.csv")
-    flag_access_private_user = is_agent_exist(ip,name_agent, "Private_Agent_properties.csv")
-    flag_access_pulic_user = is_agent_exist(ip,name_agent, "Public_Agent_properties.csv")
-    if not (flag_access_private_user or flag_access_pulic_user or flag_access_freind):
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Your are not allowed to access this hub.")
-
-    system_prompt = read_file_as_strings("system_prompt.txt")
-    list_type_agent = hub1_agent.find_type_agent(prompt)
-    data_frame_retrival = find_row_of_data_frame_by_type_agent(list_type_agent, agent_block)
-    # print(data_frame_retrival)
-    markdown_data_retrival = make_data_frame_to_text_table(data_frame_retrival)
-    print(markdown_data_retrival)
-    chat_dictionary = make_chat_history(system_prompt,prompt, markdown_data_retrival)
-    return hub1_agent.hub_search_agent(chat_dictionary,prompt, hub_user_search, agent_block)
+    with hub1_agent.metrics.time(STAGE_AUTH):
+        if registry.access_role(ip,name_agent) is None:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Your are not allowed to access this hub.")
+        check_federation_params(federation_mode, top_k)
+        admitted = hub1_agent.admit_request(request_id, hops_left)
+
+    async def events():
+        if admitted is None:
+            yield json.dumps({"event": "done", "status": "Not Found", "duplicate": True}) + "\n"
+            return
+        system_prompt = hub1_agent.prompt_templates.get("system_prompt.txt")
+        with hub1_agent.metrics.time(STAGE_FIND_TYPE):
+            list_type_agent = await hub1_agent.find_type_agent(prompt)
+        plan = hub1_agent.plan_search(list_type_agent, agent_block)
+        yield json.dumps({"event": "candidates", "hub": hub1_agent.name, "planner": plan.decision,
+                          "agents": [row.as_agent() for row in plan.rows]}) + "\n"
+
+        chat_dictionary = None
+        if plan.decision == PLAN_LLM:
+            markdown_data_retrival = hub1_agent.build_search_context(prompt, list_type_agent, agent_block, rows=plan.rows)
+            chat_dictionary = make_chat_history(system_prompt,prompt, markdown_data_retrival)
+        async for event in hub1_agent.hub_search_agent_stream(chat_dictionary,prompt, hub_user_search, agent_block, federation_mode=federation_mode,
+                                                             list_type=list_type_agent, request_id=admitted[0], hops_left=admitted[1],
+                                                             top_k=top_k, plan=plan):
+            yield json.dumps(event) + "\n"
+        hub1_agent.metrics.observe(STAGE_TOTAL, time.perf_counter() - start, stream="true")
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/gossip",status_code=status.HTTP_200_OK)
+async def gossip(digest: Dict[str, Any], request: Request):
+    # Push-pull exchange: store the friend's catalog digest and answer with ours
+    ip = request.client.host
+    if registry.access_role(ip, str(digest.get("hub"))) != ROLE_FRIEND or not hub1_agent.receive_digest(digest):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only friend hubs can gossip with this hub.")
+    return hub1_agent.catalog_digest()
+
+@app.get("/ping",status_code=status.HTTP_200_OK)
+async def ping():
+    # Liveness check used by the friend hubs' circuit breaker probes
+    return {"status": "ok", "hub": hub1_agent.name}
+
+@app.get("/peer_health",status_code=status.HTTP_200_OK)
+async def peer_health():
+    # Rolling latency, error rate and breaker state of every friend hub
+    return hub1_agent.peer_health.stats()
+
+@app.get("/gossip_stats",status_code=status.HTTP_200_OK)
+async def gossip_stats():
+    # Freshness of the friend catalogs and how many friend calls routing skipped
+    return hub1_agent.peer_catalogs.stats()
+
+@app.get("/federation_stats",status_code=status.HTTP_200_OK)
+async def federation_stats():
+    # Federated searches remembered for dedup, how many duplicates were dropped, and the
+    # friend requests started speculatively while the local LLM was ranking
+    return {"duplicate_requests": hub1_agent.duplicate_requests, "seen_requests": hub1_agent.seen_requests.stats(),
+            "speculation": hub1_agent.speculation}
+
+@app.get("/cache_stats",status_code=status.HTTP_200_OK)
+async def cache_stats():
+    # Hit/miss counters of the search cache, used to size it
+    return hub1_agent.search_cache.stats()
+
+@app.get("/transport_stats",status_code=status.HTTP_200_OK)
+async def transport_stats():
+    # Connection pool metrics per peer host: open connections, reuse ratio, wait time
+    return hub1_agent.transport.metrics()
+
+@app.get("/llm_stats",status_code=status.HTTP_200_OK)
+async def llm_stats():
+    # LLM gateway counters: backend calls, coalesced prompts, batches, rate limit waits
+    return hub1_agent.llm.metrics()
+
+@app.get("/stage_stats",status_code=status.HTTP_200_OK)
+async def stage_stats():
+    # Count, mean and p50/p95/p99 of every search stage
+    return hub1_agent.metrics.snapshot()
+
+@app.get("/planner_stats",status_code=status.HTTP_200_OK)
+async def planner_stats():
+    # Searches answered straight to federation, by 'Rate' or by the ranking LLM
+    return hub1_agent.planner.stats()
+
+@app.get("/metrics",status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus scrape endpoint: stage latency histograms plus the counters of the *_stats endpoints
+    lines = hub1_agent.metrics.render()
+    lines += render_gauges("hub_llm", hub1_agent.llm.metrics())
+    lines += render_gauges("hub_search_cache", hub1_agent.search_cache.stats())
+    for host, values in hub1_agent.transport.metrics().items():
+        lines += render_gauges("hub_transport", values, (("host", host),))
+    lines += render_gauges("hub_leases", hub1_agent.leases.stats())
+    lines += render_gauges("hub_federation", {"duplicate_requests": hub1_agent.duplicate_requests,
+                                              "seen_requests": hub1_agent.seen_requests.stats(),
+                                              "speculation": hub1_agent.speculation})
+    gossip_stats = hub1_agent.peer_catalogs.stats()
+    lines += render_gauges("hub_gossip", {"routed": gossip_stats["routed"], "skipped": gossip_stats["skipped"]})
+    health = hub1_agent.peer_health.stats()
+    lines += render_gauges("hub_peer", {"skipped": health["skipped"]})
+    for peer, values in health["peers"].items():
+        lines += render_gauges("hub_peer", dict(values, breaker_open=values["state"] != "closed"), (("peer", peer),))
+    lines += render_gauges("hub_registry", {"version": registry.version})
+    lines += render_gauges("hub_planner", hub1_agent.planner.stats())
+    if shared_registry is not None:
+        lines += render_gauges("hub_shared_registry", dict(shared_registry.stats(), replayed=registry.replayed,
+                                                            registry_reloads=registry.reloads))
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# type_agent of /add_agent -> registry table
+AGENT_ROLES = {"Public": ROLE_PUBLIC, "Private": ROLE_PRIVATE, "Friend": ROLE_FRIEND}
+
 
 @app.post("/add_agent", status_code=status.HTTP_201_CREATED)
 async def add_agent(name_agent: str, type_agent: str, request: Request, extra_columns: Dict[str, str]):
     ip = request.client.host
-    print(ip)
+    logger.debug("Agent registration from %s", ip)
     
-    # Determine the file path based on agent type
-    if type_agent == "Public":
-        file_path = "Public_Agent_properties.csv"
-    elif type_agent == "Private":
-        file_path = "Private_Agent_properties.csv"
-    elif type_agent == "Friend":
-        file_path = "Hub_properties.csv"
-    else:
+    # Determine the registry table based on agent type
+    role = AGENT_ROLES.get(type_agent)
+    if role is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid agent type specified.")
     
-    # Check if the agent already exists in the relevant CSV file
-    if is_agent_exist(ip, name_agent, file_path):
+    # Check if the agent already exists in the relevant table
+    if registry.is_agent_exist(ip, name_agent, role):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"{type_agent} agent witt name {name_agent} already exists.")
     
-    # Add the agent to the CSV file
-    add_agent_to_csv(ip, name_agent, file_path, extra_columns)
+    # Add the agent to the registry, it is persisted to the CSV file in the background
+    registry.add_agent(ip, name_agent, role, extra_columns)
     
     return {"message": "Agent added successfully."}
+
+
+@app.post("/add_agents", status_code=status.HTTP_200_OK)
+async def add_agents(request: Request):
+    # [{"name_agent": ..., "type_agent": ..., "extra_columns": {...}}, ...] registered in one transaction
+    ip = request.client.host
+    items = await read_batch(request)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    agents, indexes = [], []
+    for index, item in enumerate(items):
+        name_agent, type_agent = item.get("name_agent"), item.get("type_agent")
+        # A list or object type_agent is invalid like any other, not an unhashable lookup key
+        role = AGENT_ROLES.get(type_agent) if isinstance(type_agent, str) else None
+        extra_columns = item.get("extra_columns") or {}
+        if not isinstance(name_agent, str) or role is None or not isinstance(extra_columns, dict):
+            results[index] = {"name_agent": name_agent, "status": "invalid",
+                              "detail": f"name_agent (str), type_agent (one of {list(AGENT_ROLES)}) and extra_columns (object) are required."}
+            continue
+        agents.append((ip, name_agent, role, {str(key): str(value) for key, value in extra_columns.items()}))
+        indexes.append(index)
+    for index, outcome in zip(indexes, registry.add_agents(agents)):
+        results[index] = {"name_agent": items[index]["name_agent"], "status": outcome}
+    return batch_response(results)
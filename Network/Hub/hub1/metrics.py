@@ -0,0 +1,170 @@
+import bisect
+import contextlib
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from in-memory steps (auth, retrieval) to LLM and friend hub calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                                      0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stages of a /search_agent request
+STAGE_AUTH = "auth"                  # access check and federated request admission
+STAGE_FIND_TYPE = "find_type"        # agent types of the prompt (LLM, local index or cache)
+STAGE_RETRIEVAL = "retrieval"        # candidate agents of those types and their relevance
+STAGE_FORMATTING = "formatting"      # context table packed into the token budget
+STAGE_RANK_LLM = "rank_llm"          # ranking LLM call, on a search cache miss
+STAGE_FEDERATION = "federation_call" # one call to a friend hub, labelled by friend and outcome
+STAGE_TOTAL = "total"                # whole request
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram: an observation is one bisect and two additions.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is the +Inf bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-quantile (None when empty or past the last bucket).
+        """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class StageMetrics:
+    """
+    Latency histograms of the search stages, keyed by stage and optional labels.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """
+        Args:
+            buckets (Sequence[float]): Increasing bucket upper bounds in seconds.
+        """
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, **labels: str) -> None:
+        """
+        Record the duration of one stage.
+
+        Args:
+            stage (str): One of the STAGE_* names.
+            seconds (float): Duration of the stage.
+            **labels (str): Extra labels, e.g. friend="Hub2".
+        """
+        key = (stage, tuple(sorted((name, str(value)) for name, value in labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage: str, **labels: str) -> Iterator[None]:
+        """
+        Record the wall time of the enclosed block, awaits included.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, List[dict]]:
+        """
+        Count, mean and approximate p50/p95/p99 of every histogram, grouped by stage.
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+        stages: Dict[str, List[dict]] = {}
+        for (stage, labels), histogram in items:
+            stages.setdefault(stage, []).append({
+                "labels": dict(labels),
+                "count": histogram.count,
+                "mean": histogram.sum / histogram.count if histogram.count else None,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+            })
+        return stages
+
+    def render(self, name: str = "hub_stage_duration_seconds") -> List[str]:
+        """
+        The histograms in the Prometheus text exposition format.
+        """
+        with self._lock:
+            items = [(key, list(histogram.counts), histogram.sum, histogram.count)
+                     for key, histogram in sorted(self._histograms.items())]
+        lines = [f"# HELP {name} Duration of the search stages.", f"# TYPE {name} histogram"]
+        for (stage, labels), counts, total, count in items:
+            base = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(base + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(base)} {total}")
+            lines.append(f"{name}_count{_labels(base)} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+
+def metric_name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(part for part in parts if part))
+
+
+def render_gauges(prefix: str, values: Dict[str, Any], labels: Sequence[Tuple[str, str]] = ()) -> List[str]:
+    """
+    Prometheus lines for the numeric leaves of a stats dictionary, nested keys joined with "_".
+
+    Args:
+        prefix (str): Metric name prefix, e.g. "hub_llm".
+        values (Dict[str, Any]): Stats as returned by the *_stats endpoints.
+        labels (Sequence[Tuple[str, str]]): Labels added to every sample.
+
+    Returns:
+        List[str]: One sample line per number; strings and None are skipped.
+    """
+    lines = []
+    for key, value in values.items():
+        name = metric_name(prefix, str(key))
+        if isinstance(value, dict):
+            lines.extend(render_gauges(name, value, labels))
+        elif isinstance(value, bool):
+            lines.append(f"{name}{_labels(labels)} {int(value)}")
+        elif isinstance(value, (int, float)):
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return lines
@@ -1,10 +1,25 @@
-from typing import NewType, Tuple, List
-import pandas as pd
-import requests
-import openai
+from typing import AsyncIterator, NewType, Optional, Tuple, List
+import asyncio
+import logging
+import time
+import uuid
+import httpx
 import json
 import re
-from utils import read_file_as_strings, generate_markdown_table
+from utils import PromptTemplates
+from registry import AgentRegistry, ROLE_PUBLIC
+from retrieval import AgentTypeIndex, Encoder
+from cache import SearchCache, TTLCache
+from federation import fan_out, iter_fan_out, merge_responses, merge_top_k, FEDERATION_FIRST, FEDERATION_MERGE, FEDERATION_BEST_K
+from gossip import PeerCatalogs, build_digest, friend_key
+from health import HealthTracker
+from liveness import LeaseTable, SQLiteLeaseTable
+from metrics import StageMetrics, STAGE_FEDERATION, STAGE_FORMATTING, STAGE_RANK_LLM, STAGE_RETRIEVAL
+from transport import shared_transport
+from llm_gateway import shared_gateway
+from prompt_tables import AgentRow, PromptTables
+from context_builder import ContextBuilder, make_tokenizer
+from planner import QueryPlanner, SearchPlan
 
 # Type aliases for clarity
 IP = NewType('IP address', str)
@@ -13,51 +28,241 @@ Address = Tuple[IP, Port]
 Name = NewType('Name', str)
 Friend = Tuple[Name, Address]
 
+logger = logging.getLogger("hub")
+
+# How find_type_agent picks the agent types for a prompt
+FIND_TYPE_LLM = "llm"        # always ask the LLM (original behaviour)
+FIND_TYPE_LOCAL = "local"    # only use the local vector index, no LLM call
+FIND_TYPE_HYBRID = "hybrid"  # use the local index, ask the LLM only when its confidence is low
+
 class Hub:
-    def __init__(self, name: str,address:str,port:str) -> None:
+    def __init__(self, name: str,address:str,port:str, registry: AgentRegistry, encoder: Encoder = None) -> None:
         """
         Initialize the Hub with a name and load the API key from the configuration file.
         
         Args:
             name (str): The name of the hub.
+            registry (AgentRegistry): The in-memory registry of agents and friend hubs.
+            encoder (Encoder, optional): Text encoder of the local agent type index.
         """
         self.name = name
         self.address = address  # Placeholder, could be updated with actual address logic
         self.port = port
+        self.registry = registry
+        self.prompt_tables = PromptTables(registry)
+        self.prompt_templates = PromptTemplates()
         self.hub_friends: List[Address] = self._load_friends_address()
-        self.api_key = self._load_api_key()
+        self.config = self._load_config()
+        self.api_key = self.config.get("api_key")
+        self.llm = shared_gateway(self.api_key, self.config.get("llm"))
+        self.llm_batch_find_type = bool((self.config.get("llm") or {}).get("batch_find_type", False))
+        self._load_find_type_settings()
+        self._load_federation_settings()
+        self.peer_catalogs = PeerCatalogs(self.gossip_ttl)
+        self.peer_health = self._create_health_tracker()
+        self.leases = self._create_lease_table()
+        # Ids of the federated searches already handled, so a request reaching this hub
+        # again through another path is answered at once instead of being flooded further
+        self.seen_requests = TTLCache(self.federation_seen_size, self.federation_seen_ttl)
+        self.duplicate_requests = 0
+        # Friends asked while the local LLM ranks a weak candidate set (see _speculative_friends)
+        # started: searches that speculated, sent: those whose delay ran out before the local answer,
+        # used: local "Not Found" (the speculative answers count), discarded: the local search
+        # answered (cancelled: while friend requests were still running)
+        self.speculation = {"started": 0, "sent": 0, "used": 0, "discarded": 0, "cancelled": 0, "skipped_busy": 0}
+        self._speculating = 0
+        self.transport = shared_transport(self.config.get("transport"))
+        self.context_builder = ContextBuilder(
+            self.prompt_tables,
+            make_tokenizer(self.config.get("context_tokenizer", "approx")),
+            token_budget=int(self.config.get("context_token_budget", 1500)),
+            compact=bool(self.config.get("context_compact_rows", False)),
+        )
+        self.type_index = AgentTypeIndex(encoder)
+        self.search_cache = self._create_search_cache()
+        self.planner = self._create_query_planner()
+        # Latency histograms of the search stages, exported at /metrics
+        self.metrics = StageMetrics()
 
-    def _load_friends_address(self):
-        # Load the CSV file
-        file_path = "Hub_properties.csv"
+    def plan_search(self, list_type: List[str], person_block: List[Friend] = None) -> SearchPlan:
+        """
+        Retrieve the candidate agents of a search and decide whether ranking them needs the LLM.
         
-        # Read the CSV file into a DataFrame
-        df = pd.read_csv(file_path)
+        Args:
+            list_type (List[str]): Agent types found for the prompt.
+            person_block (List[Friend], optional): Agents to exclude.
         
-        # Filter rows where the active column is True
-        active_friends = df[df['Active'] == True]
+        Returns:
+            SearchPlan: The planner decision with the candidates, passed on to build_search_context
+            and hub_search_agent.
+        """
+        with self.metrics.time(STAGE_RETRIEVAL):
+            rows = self.prompt_tables.agents_for_types(list_type, person_block)
+        return self.planner.plan(rows)
+
+    def build_search_context(self, prompt: str, list_type: List[str], person_block: List[Friend] = None,
+                             rows: List[AgentRow] = None) -> str:
+        """
+        Build the agent context table of a search within the configured token budget.
         
-        # Convert the filtered DataFrame to a list of tuples (Name, Address)
-        friends = [
-            (Name(row['Agent Name']), (IP(row['IP Address']), Port(row['Port'])))
-            for _, row in active_friends.iterrows()
-        ]
+        Args:
+            prompt (str): The search prompt.
+            list_type (List[str]): Agent types found for the prompt.
+            person_block (List[Friend], optional): Agents to exclude.
+            rows (List[AgentRow], optional): Candidates already retrieved by plan_search.
         
-        return friends
-    def _load_api_key(self) -> str:
+        Returns:
+            str: The context table for the ranking prompt.
+        """
+        with self.metrics.time(STAGE_RETRIEVAL):
+            if rows is None:
+                rows = self.prompt_tables.agents_for_types(list_type, person_block)
+            self.type_index.ensure(self.registry.public)
+            # Indexed by registry position, read by rank_agents without a per-row dict
+            scores = self.type_index.agent_scores(prompt)
+        with self.metrics.time(STAGE_FORMATTING):
+            return self.context_builder.build_agents(rows, scores)
+
+    def export_state(self) -> dict:
+        """
+        Registry, indexes, rendered prompt tables, prompt templates and search cache, for
+        a warm-start snapshot (see snapshot.py).
+        """
+        registry_state = self.registry.export_state()
+        version = registry_state["version"]
+        public = self.registry.public
+        type_index = self.type_index.export_state(public) if self.registry.version == version else None
+        return {
+            "registry": registry_state,
+            "hub": {
+                "type_index": type_index,
+                "prompt_tables": self.prompt_tables.export_state(),
+                "prompt_templates": self.prompt_templates.export_state(),
+                "search_cache": self.search_cache.export_state(),
+            },
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """
+        Reload the derived structures of a snapshot whose registry part was accepted by
+        the registry (registry.warm); the parts built for another registry version are skipped.
+        """
+        self.prompt_templates = PromptTemplates(state.get("prompt_templates"))
+        if not self.registry.warm:
+            return
+        version = self.registry.version
+        if state.get("type_index") is not None:
+            self.type_index.restore_state(state["type_index"], self.registry.public)
+        if state["prompt_tables"]["_version"] == version:
+            self.prompt_tables.restore_state(state["prompt_tables"])
+        self.search_cache.restore_state(state["search_cache"])
+
+    def _load_friends_address(self):
+        # Active friend hubs as a list of tuples (Name, Address), served from the registry
+        return self.registry.friends()
+
+    def _load_config(self) -> dict:
         """
-        Load API key from the configuration file.
+        Load the configuration file (API key and hub settings).
         
         Returns:
-            str: The API key for OpenAI.
+            dict: The configuration values.
         """
         with open('config.json') as config_file:
-            config = json.load(config_file)
-            return config.get("api_key")
+            return json.load(config_file)
 
-    def hub_search_agent(self, chat_dictionary: str, prompt: str, 
+    def _load_find_type_settings(self) -> None:
+        """
+        Load the agent type retrieval settings from the configuration file.
+        """
+        config = self.config
+        self.find_type_mode = config.get("find_type_mode", FIND_TYPE_LLM)
+        self.find_type_top_k = int(config.get("find_type_top_k", 3))
+        self.find_type_min_confidence = float(config.get("find_type_min_confidence", 0.3))
+
+    def _create_search_cache(self) -> SearchCache:
+        """
+        Build the search result cache sized from the configuration file.
+        """
+        config = self.config
+        return SearchCache(int(config.get("search_cache_size", 256)), float(config.get("search_cache_ttl", 300)))
+
+    def _create_query_planner(self) -> QueryPlanner:
+        """
+        Build the query planner deciding when the ranking LLM can be skipped.
+        """
+        config = self.config
+        return QueryPlanner(
+            self.prompt_tables,
+            enabled=bool(config.get("planner_enabled", True)),
+            direct_max_candidates=int(config.get("planner_direct_max_candidates", 1)),
+            direct_relevance_rate=float(config.get("planner_direct_relevance_rate", 4)),
+        )
+
+    def _create_health_tracker(self) -> HealthTracker:
+        """
+        Build the friend hub health tracker and circuit breaker from the configuration file.
+        """
+        config = self.config
+        self.health_probe_interval = float(config.get("health_probe_interval", 10))
+        return HealthTracker(
+            window=int(config.get("health_window", 20)),
+            failure_threshold=int(config.get("breaker_failure_threshold", 3)),
+            max_error_rate=float(config.get("breaker_max_error_rate", 0.5)),
+            open_seconds=float(config.get("breaker_open_seconds", 30)),
+            trial_seconds=float(config.get("breaker_trial_seconds", 60)),
+        )
+
+    def _create_lease_table(self):
+        """
+        Build the heartbeat lease table of the public agents from the configuration file;
+        with a shared multi-worker registry the leases are kept in its database.
+        """
+        config = self.config
+        self.lease_sweep_interval = float(config.get("lease_sweep_interval", 1))
+        default_ttl = float(config.get("lease_seconds", 60))
+        max_ttl = float(config.get("lease_max_seconds", 600))
+        if self.registry.shared is not None:
+            return SQLiteLeaseTable(self.registry.store.path, default_ttl, max_ttl)
+        return LeaseTable(default_ttl=default_ttl, max_ttl=max_ttl)
+
+    def _load_federation_settings(self) -> None:
+        """
+        Load the friend hub fan-out settings from the configuration file.
+        """
+        config = self.config
+        self.federation_mode = config.get("federation_mode", FEDERATION_FIRST)
+        self.friend_timeout = float(config.get("friend_timeout", 30))
+        self.federation_deadline = float(config.get("federation_deadline", 60))
+        self.federation_max_hops = int(config.get("federation_max_hops", 4))
+        # Global ranking of the "best_k" mode
+        self.federation_top_k = int(config.get("federation_top_k", 5))
+        self.federation_relevance_weight = float(config.get("federation_relevance_weight", 0.7))
+        self.federation_goodness_weight = float(config.get("federation_goodness_weight", 0.3))
+        self.federation_seen_size = int(config.get("federation_seen_size", 10000))
+        self.federation_seen_ttl = float(config.get("federation_seen_ttl", 600))
+        # Speculative federation: with at most speculative_max_candidates local candidates, the
+        # first speculative_max_friends friends are asked while the LLM ranks them, after
+        # speculative_delay seconds, with at most speculative_max_inflight such searches at once
+        self.speculative_federation = bool(config.get("speculative_federation", False))
+        self.speculative_max_candidates = int(config.get("speculative_max_candidates", 3))
+        self.speculative_max_friends = int(config.get("speculative_max_friends", 2))
+        self.speculative_delay = float(config.get("speculative_delay", 0.0))
+        self.speculative_max_inflight = int(config.get("speculative_max_inflight", 8))
+        # Catalog gossip with the friend hubs (0 disables the background exchange)
+        self.gossip_interval = float(config.get("gossip_interval", 30))
+        self.gossip_ttl = float(config.get("gossip_ttl", 90))
+        self.gossip_timeout = float(config.get("gossip_timeout", 5))
+
+    async def hub_search_agent(self, chat_dictionary: str, prompt: str, 
                          hub_user_search: List[Friend] = None, 
-                         person_block: List[Friend] = None) -> dict:
+                         person_block: List[Friend] = None,
+                         federation_mode: str = None,
+                         list_type: List[str] = None,
+                         request_id: str = None,
+                         hops_left: int = None,
+                         top_k: int = None,
+                         plan: SearchPlan = None) -> dict:
         """
         Search for an agent within the hub and its friends.
         
@@ -66,33 +271,287 @@ class Hub:
             prompt (str): The search prompt to find the agent.
             hub_user_search (List[Friend], optional): List of friends already searched.
             person_block (List[Friend], optional): List of blocked persons.
+            federation_mode (str, optional): "first", "merge" or "best_k", defaults to the configured mode.
+            list_type (List[str], optional): Agent types of the query, used to skip the friends
+                whose catalog digest advertises none of them.
+            request_id (str, optional): Id of the federated search, created here if missing.
+            hops_left (int, optional): Remaining forwarding hops, federation_max_hops if missing.
+            top_k (int, optional): Number of agents returned by the "best_k" mode.
+            plan (SearchPlan, optional): Decision of plan_search; when it answered locally
+                without the LLM, chat_dictionary may be None.
         
         Returns:
             dict: The search result including agent details or status.
         """
         hub_user_search = hub_user_search or []
+        request_id, hops_left = self._federation_context(request_id, hops_left)
+        mode = federation_mode or self.federation_mode
+        if mode == FEDERATION_BEST_K:
+            return await self._search_best_k(chat_dictionary, prompt, hub_user_search, person_block, list_type,
+                                             request_id, hops_left, top_k or self.federation_top_k, plan)
+
+        friends, visited = self._friends_to_ask(hub_user_search, list_type, hops_left, plan)
+        ask = lambda friend: self._ask_friend(prompt, friend, visited, person_block, request_id, hops_left - 1, mode)
+        # With a weak retrieval the first friends are asked while the local LLM ranks
+        speculative = self._speculative_friends(plan, friends)
+        remote = self._start_speculation(speculative, ask, mode) if speculative else None
 
         # Search within the current hub
-        response = self._find_agent(chat_dictionary)
-        print(response)
-        print(10*"*"+" Response Agents"+10*"*")
-        if response.get("status") == "Find":
+        try:
+            response = await self._search_local(chat_dictionary, prompt, person_block, plan)
+        except BaseException:
+            self._cancel_speculation(remote)
+            raise
+        if response.get("status") != "Not Found":
+            self._cancel_speculation(remote)
             return response
 
-        # If not found, ask friends
-        if response.get("status") == "Not Found":
-            hub_user_search.append((Name(self.name),(IP(self.address),Port(self.port))))
-            for friend in self.hub_friends:
-                if not self._friend_exist(friend,hub_user_search):
-                    
-                    response_hub = self._ask_friend(prompt, friend, hub_user_search, person_block)
-                    if response_hub.get("status") == "Find":
-                        return response_hub
+        # If not found, ask every other unvisited friend that may serve the query at once,
+        # while the speculative requests (if any) finish
+        rest = [friend for friend in friends if friend not in speculative]
+        later = asyncio.ensure_future(fan_out(rest, ask, mode=mode, deadline=self.federation_deadline))
+        answers = []
+        if remote is not None:
+            self.speculation["used"] += 1
+            try:
+                answers = await remote
+            except BaseException:
+                later.cancel()
+                raise
+        if mode == FEDERATION_FIRST and any(answer.get("status") == "Find" for _, answer in answers):
+            later.cancel()  # a speculative friend already found an agent
+        else:
+            answers += await later
+        if mode == FEDERATION_FIRST:
+            for _, response_hub in answers:
+                if response_hub.get("status") == "Find":
+                    return response_hub
+        else:
+            merged = merge_responses(answers)
+            if merged.get("status") == "Find":
+                return merged
+
+        return response
+
+    def _speculative_friends(self, plan: Optional[SearchPlan], friends: List[Friend]) -> List[Friend]:
+        """
+        The friends to ask before the local ranking returns, empty unless retrieval looks weak.
+
+        Only searches ranked by the LLM speculate (the planner already sends an empty
+        retrieval straight to federation), and only with at most speculative_max_candidates
+        local candidates. The bounds on the wasted remote work are the number of friends
+        asked, the delay before asking them and the number of speculative searches at once.
+        """
+        if not self.speculative_federation or not friends or self.speculative_max_friends <= 0:
+            return []
+        if plan is None or plan.response is not None or len(plan.rows) > self.speculative_max_candidates:
+            return []
+        if self._speculating >= self.speculative_max_inflight:
+            self.speculation["skipped_busy"] += 1
+            return []
+        return friends[:self.speculative_max_friends]
+
+    def _start_speculation(self, friends: List[Friend], ask, mode: str) -> asyncio.Future:
+        """
+        Ask friends in the background, after speculative_delay seconds.
+        """
+        async def speculate() -> List[Tuple[Friend, dict]]:
+            if self.speculative_delay > 0:
+                await asyncio.sleep(self.speculative_delay)
+            self.speculation["sent"] += 1
+            return await fan_out(friends, ask, mode=mode, deadline=self.federation_deadline)
+
+        def finished(_) -> None:
+            self._speculating -= 1
+
+        self.speculation["started"] += 1
+        self._speculating += 1
+        task = asyncio.ensure_future(speculate())
+        task.add_done_callback(finished)
+        return task
+
+    def _cancel_speculation(self, remote: Optional[asyncio.Future]) -> None:
+        # The local search answered: the friend requests still running are cancelled
+        if remote is None:
+            return
+        self.speculation["discarded"] += 1
+        if not remote.done():
+            remote.cancel()
+            self.speculation["cancelled"] += 1
+
+    async def _search_best_k(self, chat_dictionary: list, prompt: str, hub_user_search: List[Friend],
+                             person_block: List[Friend], list_type: List[str],
+                             request_id: str, hops_left: int, top_k: int, plan: SearchPlan = None) -> dict:
+        """
+        Rank the local agents and ask every friend at the same time, then merge all the
+        agents found into one global top-k list.
+        """
+        friends, visited = self._friends_to_ask(hub_user_search, list_type, hops_left, plan)
+        local = asyncio.ensure_future(self._search_local(chat_dictionary, prompt, person_block, plan))
+        try:
+            answers = await fan_out(
+                friends,
+                lambda friend: self._ask_friend(prompt, friend, visited, person_block, request_id, hops_left - 1,
+                                                FEDERATION_BEST_K, top_k),
+                mode=FEDERATION_MERGE,
+                deadline=self.federation_deadline,
+            )
+        except BaseException:
+            local.cancel()
+            raise
+        try:
+            local_response = await local
+        except Exception as e:
+            logger.warning("Error in the local search: %s", e)
+            local_response = {"status": "error", "message": str(e)}
+        me = (Name(self.name), (IP(self.address), Port(self.port)))
+        return merge_top_k([(me, local_response)] + answers, top_k,
+                           self.federation_relevance_weight, self.federation_goodness_weight)
+
+    async def hub_search_agent_stream(self, chat_dictionary: str, prompt: str,
+                                      hub_user_search: List[Friend] = None,
+                                      person_block: List[Friend] = None,
+                                      federation_mode: str = None,
+                                      list_type: List[str] = None,
+                                      request_id: str = None,
+                                      hops_left: int = None,
+                                      top_k: int = None,
+                                      plan: SearchPlan = None) -> AsyncIterator[dict]:
+        """
+        Streaming variant of hub_search_agent yielding results as soon as they are known.
+        
+        Yields a "local" event with the ranked result of this hub, then, if nothing was
+        found (or always in "best_k" mode), one "friend" event per friend hub answer in
+        arrival order, and a final "done" event with the overall status. In "best_k" mode
+        the "done" event also carries the merged global top-k result.
+        
+        Args:
+            chat_dictionary (str): The dictionary for the chat context.
+            prompt (str): The search prompt to find the agent.
+            hub_user_search (List[Friend], optional): List of friends already searched.
+            person_block (List[Friend], optional): List of blocked persons.
+            federation_mode (str, optional): "first", "merge" or "best_k", defaults to the configured mode.
+            list_type (List[str], optional): Agent types of the query, used to route to friends.
+            request_id (str, optional): Id of the federated search, created here if missing.
+            hops_left (int, optional): Remaining forwarding hops, federation_max_hops if missing.
+            top_k (int, optional): Number of agents returned by the "best_k" mode.
+            plan (SearchPlan, optional): Decision of plan_search, see hub_search_agent.
+        
+        Yields:
+            dict: The search events.
+        """
+        hub_user_search = hub_user_search or []
+        request_id, hops_left = self._federation_context(request_id, hops_left)
+        mode = federation_mode or self.federation_mode
+        top_k = top_k or self.federation_top_k
+        response = await self._search_local(chat_dictionary, prompt, person_block, plan)
+        yield {"event": "local", "hub": self.name, "result": response}
+        status = response.get("status")
+        answers = [((Name(self.name), (IP(self.address), Port(self.port))), response)]
 
+        if status == "Not Found" or mode == FEDERATION_BEST_K:
+            friends, visited = self._friends_to_ask(hub_user_search, list_type, hops_left, plan)
+            async for friend, response_hub in iter_fan_out(
+                friends,
+                lambda friend: self._ask_friend(prompt, friend, visited, person_block, request_id, hops_left - 1,
+                                                mode, top_k if mode == FEDERATION_BEST_K else None),
+                deadline=self.federation_deadline,
+            ):
+                yield {"event": "friend", "hub": friend[0], "result": response_hub}
+                answers.append((friend, response_hub))
+                if response_hub.get("status") == "Find":
+                    status = "Find"
+                    if mode == FEDERATION_FIRST:
+                        break
+
+        if mode == FEDERATION_BEST_K:
+            merged = merge_top_k(answers, top_k, self.federation_relevance_weight, self.federation_goodness_weight)
+            yield {"event": "done", "status": merged["status"], "result": merged}
+        else:
+            yield {"event": "done", "status": status}
+
+    async def _search_local(self, chat_dictionary: list, prompt: str, person_block: List[Friend] = None,
+                            plan: SearchPlan = None) -> dict:
+        """
+        Rank the local agents with the LLM, reusing the answer of an identical recent search,
+        unless the query planner already answered without it.
+        """
+        if plan is not None and plan.response is not None:
+            logger.debug("Planner decision %s: %s", plan.decision, plan.response)
+            return dict(plan.response)
+        self.search_cache.sync_version(self.registry.version)
+        cache_key = self.search_cache.result_key(prompt, person_block, self.registry.version)
+        response = self.search_cache.results.get(cache_key)
+        if response is None:
+            with self.metrics.time(STAGE_RANK_LLM):
+                response = await self._find_agent(chat_dictionary)
+            if response:
+                self.search_cache.results.put(cache_key, response)
+        logger.debug("Response agents: %s", response)
         return response
 
+    def _friends_to_ask(self, hub_user_search: List[Friend],
+                        list_type: List[str] = None,
+                        hops_left: int = None,
+                        plan: SearchPlan = None) -> Tuple[List[Friend], List[Friend]]:
+        """
+        Pick the unvisited friends that may serve the query and build the visited set forwarded to them.
+        
+        Args:
+            hub_user_search (List[Friend]): Hubs already searched.
+            list_type (List[str], optional): Agent types of the query, matched against the catalog digests.
+            hops_left (int, optional): Remaining forwarding hops; no friend is asked at 0.
+            plan (SearchPlan, optional): Decision of plan_search; without active local candidates
+                the types are not trusted for routing and every friend is asked.
+        
+        Returns:
+            Tuple[List[Friend], List[Friend]]: The friends to ask and the visited hubs to send, without duplicates.
+        """
+        visited = {}
+        for hub in hub_user_search + [(Name(self.name),(IP(self.address),Port(self.port)))]:
+            visited.setdefault(friend_key(hub), hub)
+        if hops_left is not None and hops_left <= 0:
+            return [], list(visited.values())
+        friends = [friend for friend in self.hub_friends if friend_key(friend) not in visited]
+        # The types are picked against this hub's own catalog: when they match no active local
+        # agent they may not name what the friends call the service, so no friend is skipped
+        if plan is None or plan.rows:
+            friends = self.peer_catalogs.route(friends, list_type)
+        # Friends with an open circuit breaker are skipped, the others are asked fastest first
+        friends = self.peer_health.order(friends)
+        # The friends asked in parallel are marked visited so they do not ask each other again
+        for friend in friends:
+            visited.setdefault(friend_key(friend), friend)
+        return friends, list(visited.values())
 
-    def _find_agent(self, prompt_agent: list) -> dict:
+    def admit_request(self, request_id: Optional[str], hops_left: Optional[int]) -> Optional[Tuple[str, int]]:
+        """
+        Register a federated search before handling it.
+        
+        Args:
+            request_id (str, optional): Id sent by the calling hub, None for a new search.
+            hops_left (int, optional): Remaining forwarding hops sent by the calling hub.
+        
+        Returns:
+            Optional[Tuple[str, int]]: The (request id, hops left) to use, or None if this hub
+            already handled the request.
+        """
+        if request_id is not None and self.seen_requests.get(request_id) is not None:
+            self.duplicate_requests += 1
+            return None
+        request_id = request_id or uuid.uuid4().hex
+        hops_left = self.federation_max_hops if hops_left is None else min(int(hops_left), self.federation_max_hops)
+        self.seen_requests.put(request_id, True)
+        return request_id, hops_left
+
+    def _federation_context(self, request_id: Optional[str], hops_left: Optional[int]) -> Tuple[str, int]:
+        # Searches started without admit_request (direct calls) get a fresh id here
+        if request_id is None:
+            return self.admit_request(None, hops_left)
+        return request_id, self.federation_max_hops if hops_left is None else hops_left
+
+
+    async def _find_agent(self, prompt_agent: list) -> dict:
         """
         Find an agent using the OpenAI API.
         
@@ -106,45 +565,31 @@ class Hub:
             Exception: If an error occurs during the API call.
         """
         try:
-            response_json = self._chat_gpt_api(prompt_agent)
+            response_json = await self._chat_gpt_api(prompt_agent)
             return self._extract_json_from_text(response_json)
         except Exception as e:
-            print(f"Error finding agent: {e}")
+            logger.warning("Error finding agent: %s", e)
             raise
     
-    def _friend_exist(self, friend: Friend, hub_user_search: list) -> bool:
-        """
-        Check if a given friend exists in the hub_user_search list.
-
-        Args:
-        - friend (Friend): A tuple containing the friend's name and address (IP and port).
-        - hub_user_search (list): A list of hubs with their names and addresses.
-
-        Returns:
-        - bool: True if the friend exists in the hub_user_search, False otherwise.
-        """
-        friend_name, (friend_ip, friend_port) = friend
-
-        for hub in hub_user_search:
-            print(hub)
-            print(friend_name, friend_ip, friend_port)
-            hub_name, (hub_ip, hub_port) = hub
-            if friend_name == hub_name and friend_ip == hub_ip and str(friend_port) == str(hub_port):                
-                return True  # Friend exists in the hub_user_search list
-        
-        return False  # Friend not fo
-        
-    def _ask_friend(self, prompt_agent: str, friend: Friend, 
+    async def _ask_friend(self, prompt_agent: str, friend: Friend, 
                     hub_user_search: List[Friend], 
-                    agent_block: List[Friend]) -> dict:
+                    agent_block: List[Friend],
+                    request_id: str = None,
+                    hops_left: int = None,
+                    federation_mode: str = None,
+                    top_k: int = None) -> dict:
         """
-        Ask a friend (external service) for an agent.
+        Ask a friend (external service) for an agent through the shared keep-alive transport.
 
         Args:
             prompt_agent (str): The prompt for the agent search.
             friend (Friend): The friend's details (name and address).
             hub_user_search (List[Friend]): List of friends already searched.
             agent_block (List[Friend]): List of blocked agents.
+            request_id (str, optional): Id of the federated search, for the friend's dedup.
+            hops_left (int, optional): Forwarding hops the friend may still use.
+            federation_mode (str, optional): Federation mode the friend should use.
+            top_k (int, optional): Number of agents the friend should return in "best_k" mode.
 
         Returns:
             dict: The response from the friend's service or an error message.
@@ -158,6 +603,10 @@ class Hub:
             'prompt': prompt_agent,
             'name_agent': self.name
         }
+        if federation_mode:
+            params['federation_mode'] = federation_mode
+        if top_k:
+            params['top_k'] = top_k
 
         headers = {
             'accept': 'application/json',
@@ -176,30 +625,220 @@ class Hub:
         # Construct the data payload
         data = {
             "hub_user_search": format_friends(hub_user_search),
-            "agent_block": format_friends(agent_block)
+            "agent_block": format_friends(agent_block),
+            "request_id": request_id,
+            "hops_left": hops_left
         }
 
-        print("Payload:", json.dumps(data, indent=4))  # Print the payload for debugging
-        print("params:", json.dumps(params, indent=4)) # Print  the params for  debugging
-        print("headers:", json.dumps(headers, indent=4)) # Print the headers for debugging
-        print("http_address:", http_address) ## Print the http_address for debugging
-        print("|"*30)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Payload dumps only cost anything when debug logging is on
+            logger.debug("Asking %s at %s\nparams: %s\nheaders: %s\npayload: %s", name, http_address,
+                         json.dumps(params, indent=4), json.dumps(headers, indent=4), json.dumps(data, indent=4))
+        start = time.monotonic()
         try:
             # Send the POST request with params, headers, and data (JSON payload)
-            response = requests.post(http_address, params=params, headers=headers, json=data)
-            print(response.json())
-            print("&"*30)
-
+            response = await self.transport.apost(http_address, params=params, headers=headers, json=data, timeout=self.friend_timeout)
+        except asyncio.CancelledError:
+            # Cancelled by fan_out, a deadline or the local answer: no outcome, but the
+            # half-open trial this request may hold must not stay taken
+            self.peer_health.release(friend)
+            raise
+        except httpx.HTTPError as e:
+            self.peer_health.record(friend, time.monotonic() - start, ok=False)
+            self.metrics.observe(STAGE_FEDERATION, time.monotonic() - start, friend=name, outcome="error")
+            logger.warning("Error while asking friend %s: %s", name, e)
+            return {"status": "error", "message": str(e)}
+        # Any answer below 500 shows the friend is up, even if it refused the search
+        self.peer_health.record(friend, time.monotonic() - start, ok=response.status_code < 500)
+        self.metrics.observe(STAGE_FEDERATION, time.monotonic() - start, friend=name,
+                             outcome="ok" if response.status_code < 400 else "error")
+        try:
             response.raise_for_status()  # Raises HTTPError for bad responses
 
             # Assuming the response is in JSON format
-            return response.json()
+            response_json = response.json()
+            logger.debug("Answer of %s: %s", name, response_json)
+            return response_json
         
-        except requests.exceptions.RequestException as e:
-            print(f"Error while asking friend {name}: {e}")
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("Error while asking friend %s: %s", name, e)
             return {"status": "error", "message": str(e)}
         
-    def find_type_agent(self, prompt: str) -> List[dict]:
+    def catalog_digest(self) -> dict:
+        """
+        The catalog digest of this hub: agent type counts, registry version and the types
+        reachable through its friends.
+        """
+        return build_digest(self.name, self.address, self.port, self.registry.version,
+                            self.prompt_tables.type_counts(), self.peer_catalogs.reachable_types())
+
+    def receive_digest(self, digest: dict) -> bool:
+        """
+        Record the catalog digest sent by a friend hub.
+        
+        Args:
+            digest (dict): The digest, as built by gossip.build_digest.
+        
+        Returns:
+            bool: False if the sender is not one of the friend hubs.
+        """
+        location = digest.get("location") or {}
+        sender = (Name(str(digest.get("hub"))), (IP(str(location.get("ip"))), Port(str(location.get("port")))))
+        if friend_key(sender) not in {friend_key(friend) for friend in self.hub_friends}:
+            return False
+        self.peer_catalogs.update(sender, digest)
+        return True
+
+    async def gossip_once(self) -> None:
+        """
+        Exchange catalog digests with every friend hub: push ours, store theirs from the reply.
+        """
+        digest = self.catalog_digest()
+
+        async def exchange(friend: Friend) -> None:
+            name, (ip, port) = friend
+            start = time.monotonic()
+            try:
+                response = await self.transport.apost(f"http://{ip}:{port}/gossip", json=digest, timeout=self.gossip_timeout)
+                self.peer_health.record(friend, time.monotonic() - start, ok=response.status_code < 500)
+                response.raise_for_status()
+                self.peer_catalogs.update(friend, response.json())
+            except httpx.TransportError as e:
+                self.peer_health.record(friend, time.monotonic() - start, ok=False)
+                logger.warning("Gossip with %s failed: %s", name, e)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("Gossip with %s failed: %s", name, e)
+
+        await asyncio.gather(*(exchange(friend) for friend in self.hub_friends))
+
+    async def probe_friend(self, friend: Friend) -> bool:
+        """
+        Half-open probe: a cheap request telling whether a friend hub answers again.
+        """
+        name, (ip, port) = friend
+        start = time.monotonic()
+        try:
+            response = await self.transport.aget(f"http://{ip}:{port}/ping", timeout=self.gossip_timeout)
+            ok = response.status_code < 500
+        except asyncio.CancelledError:
+            self.peer_health.release(friend)
+            raise
+        except httpx.HTTPError as e:
+            logger.warning("Probe of %s failed: %s", name, e)
+            ok = False
+        self.peer_health.record(friend, time.monotonic() - start, ok=ok)
+        return ok
+
+    async def health_probe_loop(self) -> None:
+        """
+        Every `health_probe_interval` seconds, probe the friends whose breaker cool-down is over.
+        """
+        while True:
+            await asyncio.sleep(self.health_probe_interval)
+            due = self.peer_health.due_probes(self.hub_friends)
+            if due:
+                await asyncio.gather(*(self.probe_friend(friend) for friend in due))
+
+    def heartbeat(self, agents: List[Tuple[str, str, Optional[float]]]) -> List[Optional[float]]:
+        """
+        Renew the leases of public agents, reactivating the ones that had expired.
+
+        Args:
+            agents (List[Tuple[str, str, Optional[float]]]): (IP, name, requested lease seconds).
+
+        Returns:
+            List[Optional[float]]: The granted lease per agent, None if it is not a registered public agent.
+        """
+        granted, reactivate = [], []
+        for ip, agent_name, lease_seconds in agents:
+            if not self.registry.is_agent_exist(ip, agent_name, ROLE_PUBLIC):
+                granted.append(None)
+                continue
+            granted.append(self.leases.renew((ip, agent_name), lease_seconds))
+            if not self.registry.is_active(ip, agent_name):
+                reactivate.append((ip, agent_name, True))
+        if reactivate:
+            self.registry.set_active_many(reactivate)
+        return granted
+
+    def sweep_leases(self) -> int:
+        """
+        Mark the agents whose lease ran out as inactive, in one registry transaction.
+
+        Returns:
+            int: The number of agents deactivated.
+        """
+        expired = self.leases.expired()
+        if not expired:
+            return 0
+        self.registry.set_active_many([(ip, agent_name, False) for ip, agent_name in expired])
+        logger.info("Deactivated %d agents with an expired lease", len(expired))
+        return len(expired)
+
+    async def lease_sweep_loop(self) -> None:
+        """
+        Every `lease_sweep_interval` seconds, deactivate the agents that stopped sending heartbeats.
+        """
+        while True:
+            await asyncio.sleep(self.lease_sweep_interval)
+            self.sweep_leases()
+
+    async def gossip_loop(self) -> None:
+        """
+        Exchange catalog digests every `gossip_interval` seconds until cancelled.
+        """
+        while True:
+            await self.gossip_once()
+            await asyncio.sleep(self.gossip_interval)
+
+    async def find_type_agent(self, prompt: str) -> List[str]:
+        """
+        Find the type of agent, locally and/or with the OpenAI API depending on find_type_mode.
+        
+        Args:
+            prompt (str): The prompt to determine the type of agent.
+        
+        Returns:
+            List[str]: Agent types matching the prompt.
+        
+        Raises:
+            Exception: If an error occurs during the API call.
+        """
+        self.search_cache.sync_version(self.registry.version)
+        cache_key = self.search_cache.type_key(prompt, self.registry.version)
+        list_type = self.search_cache.types.get(cache_key)
+        if list_type is None:
+            list_type = await self._find_type_agent_uncached(prompt)
+            self.search_cache.types.put(cache_key, list_type)
+        return list(list_type)
+
+    async def _find_type_agent_uncached(self, prompt: str) -> List[str]:
+        """
+        Pick the agent types for a prompt according to find_type_mode.
+        """
+        if self.find_type_mode in (FIND_TYPE_LOCAL, FIND_TYPE_HYBRID):
+            candidates = self.find_type_agent_local(prompt)
+            confident = bool(candidates) and candidates[0][1] >= self.find_type_min_confidence
+            if self.find_type_mode == FIND_TYPE_LOCAL or confident:
+                best_score = candidates[0][1] if candidates else 0.0
+                # Keep the types that score close to the best one
+                return [agent_type for agent_type, score in candidates if score > 0 and score >= best_score / 2]
+        return await self._find_type_agent_llm(prompt)
+
+    def find_type_agent_local(self, prompt: str) -> List[Tuple[str, float]]:
+        """
+        Rank the agent types for a prompt with the local vector index.
+        
+        Args:
+            prompt (str): The prompt to determine the type of agent.
+        
+        Returns:
+            List[Tuple[str, float]]: The top-k (agent type, score) pairs, best first.
+        """
+        self.type_index.ensure(self.registry.public)
+        return self.type_index.search(prompt, top_k=self.find_type_top_k)
+
+    async def _find_type_agent_llm(self, prompt: str) -> List[str]:
         """
         Find the type of agent using the OpenAI API.
         
@@ -207,23 +846,23 @@ class Hub:
             prompt (str): The prompt to determine the type of agent.
         
         Returns:
-            List[dict]: List of agents matching the prompt.
+            List[str]: Agent types matching the prompt.
         
         Raises:
             Exception: If an error occurs during the API call.
         """
-        message = self._create_find_type_message(prompt)
+        message = await self._create_find_type_message(prompt)
         try:
-            response_json = self._chat_gpt_api(message)
-            print(response_json)
-            print(10*"*"+" Response find type message"+10*"*")
+            # The message only depends on the prompt file, the type table and the prompt
+            response_json = await self._chat_gpt_api(message, batch=self.llm_batch_find_type, cache=True)
+            logger.debug("Response find type message: %s", response_json)
             list_agents = self._extract_json_from_text(response_json).get("agents", [])
             return [item['name'] for item in list_agents]
         except Exception as e:
-            print(f"Error finding type of agent: {e}")
+            logger.warning("Error finding type of agent: %s", e)
             raise
 
-    def _create_find_type_message(self, prompt: str) -> List[dict]:
+    async def _create_find_type_message(self, prompt: str) -> List[dict]:
         """
         Create the message to find the type of agent using OpenAI API.
         
@@ -233,8 +872,9 @@ class Hub:
         Returns:
             List[dict]: List of messages for the OpenAI API.
         """
-        system_prompt = read_file_as_strings("find_type_system_prompt.txt")
-        agent_markdown_table = generate_markdown_table()
+        system_prompt = self.prompt_templates.get("find_type_system_prompt.txt")
+        self.type_index.ensure(self.registry.public)
+        agent_markdown_table = self.context_builder.build_types(self.type_index.type_scores(prompt))
         user_prompt = (
             "Based on the following Markdown table of agents, please identify which agents can satisfy the request.\n\n"
             "### Agent Table\n"
@@ -244,6 +884,16 @@ class Hub:
         )
         return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
 
+    @staticmethod
+    def _holds_json(text: str) -> bool:
+        # Whether _extract_json_from_text can decode the answer
+        match = re.search(r"```json\s*(.*?)\s*```", text, re.DOTALL)
+        try:
+            json.loads(match.group(1) if match else text)
+        except json.JSONDecodeError:
+            return False
+        return True
+
     def _extract_json_from_text(self, text: str) -> dict:
         """
         Extract JSON data from a text string.
@@ -259,15 +909,18 @@ class Hub:
         try:
             return json.loads(json_string)
         except json.JSONDecodeError as e:
-            print(f"Failed to decode JSON: {e}")
+            logger.warning("Failed to decode JSON: %s", e)
             return {}
 
-    def _chat_gpt_api(self, messages: list) -> str:
+    async def _chat_gpt_api(self, messages: list, batch: bool = False, cache: bool = False) -> str:
         """
-        Interact with ChatGPT API for general chat or queries.
+        Interact with ChatGPT API for general chat or queries through the shared LLM gateway.
         
         Args:
-            prompt (str): The query or message to send to ChatGPT.
+            messages (list): The conversation to send to ChatGPT.
+            batch (bool): Let the gateway answer this classification prompt in a micro-batch.
+            cache (bool): Answer from the on-disk completion cache when the same message was seen;
+                only answers holding valid JSON are stored.
         
         Returns:
             str: The response from ChatGPT.
@@ -275,13 +928,9 @@ class Hub:
         Raises:
             Exception: If an error occurs during the API call.
         """
-        openai.api_key = self.api_key
         try:
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages= messages
-            )
-            return response.choices[0].message.content
+            return await self.llm.acomplete(messages, model="gpt-4o-mini", batch=batch, cache=cache,
+                                            cache_check=self._holds_json)
         except Exception as e:
-            print(f"Error interacting with ChatGPT API: {e}")
+            logger.warning("Error interacting with ChatGPT API: %s", e)
             raise
@@ -0,0 +1,98 @@
+import threading
+from typing import Dict, List, Optional
+
+from prompt_tables import AgentRow, PromptTables
+
+# Decisions of the query planner for the local part of a search
+PLAN_FEDERATE = "federate"  # nothing retrieved locally: straight to the friend hubs, no ranking LLM call
+PLAN_RATE = "rate"          # small unambiguous candidate set: ranked by 'Rate', no ranking LLM call
+PLAN_LLM = "llm"            # the ranking needs the judgment of the LLM
+PLAN_DECISIONS = (PLAN_FEDERATE, PLAN_RATE, PLAN_LLM)
+
+NOT_FOUND_RESPONSE = {"status": "Not Found", "agents": []}
+
+
+class SearchPlan:
+    """
+    How the local part of one search is answered.
+
+    `rows` are the retrieved candidates, reused to build the LLM context. `response` is
+    the local result when the planner answered without the LLM, None otherwise.
+    """
+
+    __slots__ = ("decision", "rows", "response")
+
+    def __init__(self, decision: str, rows: List[AgentRow], response: Optional[dict] = None) -> None:
+        self.decision = decision
+        self.rows = rows
+        self.response = response
+
+
+class QueryPlanner:
+    """
+    Decides, from the retrieved candidates, whether a search needs the ranking LLM.
+
+    An empty retrieval can only be ranked "Not Found", so it goes straight to
+    federation. A set of at most `direct_max_candidates` agents, all of one agent type,
+    leaves nothing to judge: it is returned best 'Rate' first (ties in registry order),
+    sorted on the columnar AgentTable of the prompt tables.
+    Anything else is ranked by the LLM. Every decision is counted.
+    """
+
+    def __init__(self, tables: PromptTables, enabled: bool = True, direct_max_candidates: int = 1,
+                 direct_relevance_rate: float = 4.0) -> None:
+        """
+        Args:
+            tables (PromptTables): The tables the candidates were retrieved from.
+            enabled (bool): When False every search is ranked by the LLM (original behaviour).
+            direct_max_candidates (int): Largest candidate set ranked by 'Rate' (0 disables it).
+            direct_relevance_rate (float): 'relevance_rate' (1 to 5) given to those agents: they
+                match the agent type of the prompt but were not judged against its details.
+        """
+        self.tables = tables
+        self.enabled = enabled
+        self.direct_max_candidates = direct_max_candidates
+        self.direct_relevance_rate = direct_relevance_rate
+        self._counts: Dict[str, int] = {decision: 0 for decision in PLAN_DECISIONS}
+        self._lock = threading.Lock()
+
+    def plan(self, rows: List[AgentRow]) -> SearchPlan:
+        """
+        Choose how to answer a search from its retrieved candidates.
+
+        Args:
+            rows (List[AgentRow]): Active, unblocked agents of the prompt's types, in registry order.
+
+        Returns:
+            SearchPlan: The decision, the candidates and the local response when no LLM is needed.
+        """
+        if not self.enabled:
+            plan = SearchPlan(PLAN_LLM, rows)
+        elif not rows:
+            plan = SearchPlan(PLAN_FEDERATE, rows, dict(NOT_FOUND_RESPONSE))
+        elif len(rows) <= self.direct_max_candidates and len({str(row.record.get('Agent Type')) for row in rows}) == 1:
+            plan = SearchPlan(PLAN_RATE, rows, self.rank_by_rate(rows))
+        else:
+            plan = SearchPlan(PLAN_LLM, rows)
+        with self._lock:
+            self._counts[plan.decision] += 1
+        return plan
+
+    def rank_by_rate(self, rows: List[AgentRow]) -> dict:
+        """
+        A "Find" result with the agents best 'Rate' first, shaped like the LLM ranking.
+        """
+        agents = [dict(row.as_agent(), relevance_rate=self.direct_relevance_rate) for row in self.tables.by_rate(rows)]
+        return {"status": "Find", "agents": agents, "planner": PLAN_RATE}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        planned = sum(counts.values())
+        saved = counts[PLAN_FEDERATE] + counts[PLAN_RATE]
+        return {
+            "enabled": self.enabled,
+            "decisions": counts,
+            "llm_calls_saved": saved,
+            "saved_ratio": saved / planned if planned else 0.0,
+        }
@@ -0,0 +1,276 @@
+import threading
+from typing import Dict, List, NewType, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from agent_table import AgentTable
+from registry import CHANGE_INSERT, ROLE_PUBLIC, AgentRegistry
+
+IP = NewType('IP address', str)
+Port = NewType('Port', str)
+Address = Tuple[IP, Port]
+Name = NewType('Name', str)
+Friend = Tuple[Name, Address]
+
+AgentKey = Tuple[str, str, str]  # (Name, IP Address, Port)
+
+
+# Columns kept by the compact row encoding, joined with ';'
+COMPACT_COLUMNS = ['Name', 'Rate', 'IP Address', 'Port', 'Description']
+COMPACT_DESCRIPTION_WORDS = 20
+
+
+class AgentRow:
+    """
+    One active public agent with its pre-rendered markdown and compact table lines.
+    """
+
+    __slots__ = ("position", "key", "record", "line", "compact")
+
+    def __init__(self, position: int, key: AgentKey, record: dict, line: str, compact: str) -> None:
+        self.position = position
+        self.key = key
+        self.record = record
+        self.line = line
+        self.compact = compact
+
+    def as_agent(self) -> dict:
+        """
+        JSON-friendly description of the agent, shaped like the agents of a search result.
+        """
+        rate = self.record.get('Rate')
+        return {
+            "name": self.key[0],
+            "agent_type": str(self.record.get('Agent Type', "")),
+            "description": str(self.record.get('Description', "")),
+            "goodness_rate": None if rate is None or rate != rate else float(rate),
+            "location": {"ip": self.key[1], "port": self.key[2]},
+        }
+
+
+class PromptTables:
+    """
+    Prompt context tables materialized once per registry version.
+
+    The agent type table sent to find_type_agent is rendered once, and every active
+    public agent is pre-rendered as a markdown line. Agents are selected by type, activity
+    and block list with mask operations on a columnar AgentTable, so building the context
+    of a search is a few array operations plus a string join.
+
+    When the registry journal knows the rows changed since the last build, only those
+    rows are rendered again and the AgentTable is extended instead of rebuilt.
+    """
+
+    def __init__(self, registry: AgentRegistry) -> None:
+        self.registry = registry
+        self._version: Optional[int] = None
+        self._type_header = ""
+        self._type_lines: List[Tuple[str, str]] = []
+        self._columns: List[str] = []
+        self._header = ""
+        self._compact_header = ""
+        self._table = AgentTable(pd.DataFrame())
+        self._rows: List[Optional[AgentRow]] = []  # by registry position, None for inactive agents
+        self._subsets: Dict[Tuple[str, ...], np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        """
+        Bring the tables up to date if the registry changed since the last build.
+        """
+        with self._lock:
+            # Also catches up with the changes of the other workers of a shared registry
+            version, df, changes = self.registry.table_since(ROLE_PUBLIC, self._version)
+            if version == self._version:
+                return
+            if changes is None or not self._apply(df, changes):
+                self._build(df)
+            self._subsets = {}
+            self._version = version
+
+    def _build(self, df: pd.DataFrame) -> None:
+        """
+        Render every table from the public agents.
+        """
+        agent_types = self.registry.agent_types()
+        # Same layout as utils.generate_markdown_table, kept per type so it can be trimmed
+        self._type_header = (
+            "| Agent Name          | Description                              |\n"
+            "|---------------------|------------------------------------------|"
+        )
+        self._type_lines = [
+            (str(agent_type), f"| {agent_type:<19} | {description:<40} |")
+            for agent_type, description in zip(agent_types['Agent Type'], agent_types['Description'])
+        ]
+        self._columns = [column for column in df.columns if column != 'Active']
+        self._header = (
+            "| " + " | ".join(self._columns) + " |\n"
+            + "|" + "|".join("---" for _ in self._columns) + "|"
+        )
+        self._compact_header = ";".join(COMPACT_COLUMNS)
+        rows: List[Optional[AgentRow]] = [None] * len(df)
+        active = df[df['Active']] if 'Active' in df.columns else df
+        for position, record in zip(active.index, active[self._columns].to_dict("records")):
+            rows[position] = self._render(position, record)
+        self._table = AgentTable(df)
+        self._rows = rows
+
+    def _apply(self, df: pd.DataFrame, changes: List[Tuple[str, int]]) -> bool:
+        """
+        Render again only the rows inserted or flipped since the last build.
+
+        Returns:
+            bool: False if the changes cannot be applied (new columns), so every table must be rebuilt.
+        """
+        columns = [column for column in df.columns if column != 'Active']
+        if columns != self._columns or len(df) < len(self._rows) or 'Agent Type' not in df.columns:
+            return False
+        rows = self._rows + [None] * (len(df) - len(self._rows))
+        changed = sorted({position for _, position in changes})
+        flipped = [position for kind, position in changes if kind != CHANGE_INSERT and position < self._table.size]
+        if changed:
+            subset = df.iloc[changed]
+            active = subset['Active'].to_numpy(dtype=bool) if 'Active' in df.columns else np.ones(len(changed), dtype=bool)
+            for position, is_active, record in zip(changed, active, subset[columns].to_dict("records")):
+                rows[position] = self._render(position, record) if is_active else None
+        # Agent types are listed in order of first registration, so new ones come last
+        known = {agent_type for agent_type, _ in self._type_lines}
+        for agent_type, description in zip(df['Agent Type'].iloc[self._table.size:], df['Description'].iloc[self._table.size:]):
+            if str(agent_type) not in known:
+                known.add(str(agent_type))
+                self._type_lines = self._type_lines + [(str(agent_type), f"| {agent_type:<19} | {description:<40} |")]
+        self._table = self._table.updated(df, flipped)
+        self._rows = rows
+        return True
+
+    def _render(self, position: int, record: dict) -> AgentRow:
+        key = (str(record['Name']), str(record['IP Address']), str(record['Port']))
+        line = "| " + " | ".join(_cell(record[column]) for column in self._columns) + " |"
+        compact = ";".join(_compact_cell(column, record.get(column, "")) for column in COMPACT_COLUMNS)
+        return AgentRow(position, key, record, line, compact)
+
+    _STATE_FIELDS = ("_version", "_type_header", "_type_lines", "_columns", "_header", "_compact_header", "_rows", "_table")
+
+    def export_state(self) -> dict:
+        """
+        The rendered tables and the registry version they belong to, for a warm-start snapshot.
+        """
+        with self._lock:
+            return {field: getattr(self, field) for field in self._STATE_FIELDS}
+
+    def restore_state(self, state: dict) -> None:
+        if any(field not in state for field in self._STATE_FIELDS):
+            return  # written by an older layout, rebuilt on the first request
+        with self._lock:
+            for field in self._STATE_FIELDS:
+                setattr(self, field, state[field])
+            self._subsets = {}
+
+    def agent_type_table(self) -> str:
+        """
+        The '| Agent Name | Description |' table of distinct agent types.
+        """
+        self._refresh()
+        return self.render_types(self._type_lines)
+
+    def type_lines(self) -> List[Tuple[str, str]]:
+        """
+        (agent type, markdown line) pairs of the agent type table.
+        """
+        self._refresh()
+        return self._type_lines
+
+    def render_types(self, type_lines: List[Tuple[str, str]]) -> str:
+        """
+        Render a selection of agent type lines under the type table header.
+        """
+        return "\n".join([self._type_header] + [line for _, line in type_lines]) + "\n"
+
+    def type_counts(self) -> Dict[str, int]:
+        """
+        Number of active public agents per agent type.
+        """
+        self._refresh()
+        return self._table.type_counts()
+
+    def agents_for_types(self, list_type: List[str], person_block: List[Friend] = None) -> List[AgentRow]:
+        """
+        Active agents of the given types in registry order, without the blocked ones.
+
+        Args:
+            list_type (List[str]): Agent types to keep.
+            person_block (List[Friend], optional): Agents to exclude.
+
+        Returns:
+            List[AgentRow]: The matching agents.
+        """
+        self._refresh()
+        table = self._table
+        subset_key = tuple(sorted(set(list_type)))
+        positions = self._subsets.get(subset_key)
+        if positions is None:
+            positions = table.select(subset_key)
+            self._subsets[subset_key] = positions
+        if person_block:
+            positions = positions[~table.blocked_mask(person_block, positions)]
+        return [self._rows[position] for position in positions]
+
+    def by_rate(self, rows: List[AgentRow]) -> List[AgentRow]:
+        """
+        The given agents best 'Rate' first (ties keep their order), sorted on the AgentTable.
+        """
+        table = self._table
+        positions = np.fromiter((row.position for row in rows), dtype=np.int64, count=len(rows))
+        if len(positions) and positions.max() >= table.size:
+            return list(rows)  # rows of an older registry version, left as they are
+        by_position = {row.position: row for row in rows}
+        return [by_position[position] for position in table.order_by_rate(positions)]
+
+    def rates(self, positions: np.ndarray) -> np.ndarray:
+        """
+        'Rate' of the agents at the given registry positions, 0.0 when missing or unknown.
+        """
+        table = self._table
+        inside = positions < table.size
+        return np.where(inside, table.rate[np.where(inside, positions, 0)] if table.size else 0.0, 0.0)
+
+    def format_rows(self, rows: List[AgentRow], max_rows: int = 25, compact: bool = False) -> str:
+        """
+        Render agents as the context table sent to the ranking LLM.
+
+        Args:
+            rows (List[AgentRow]): The agents to render.
+            max_rows (int): Maximum number of rows to include in the output.
+            compact (bool): Use the ';'-separated compact encoding instead of markdown.
+
+        Returns:
+            str: The formatted text table with its metadata line.
+        """
+        rows = rows[:max_rows] if max_rows else rows
+        header, columns = self.header(compact)
+        metadata = f"Rows: {len(rows)}, Columns: {columns}"
+        lines = [row.compact if compact else row.line for row in rows]
+        return f"{metadata}\n\n" + "\n".join([header] + lines)
+
+    def header(self, compact: bool = False) -> Tuple[str, int]:
+        """
+        The table header and its number of columns for the given encoding.
+        """
+        self._refresh()
+        if compact:
+            return self._compact_header, len(COMPACT_COLUMNS)
+        return self._header, len(self._columns)
+
+
+def _cell(value) -> str:
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def _compact_cell(column: str, value) -> str:
+    text = str(value).replace(";", ",").replace("\n", " ")
+    if column == 'Description':
+        words = text.split()
+        if len(words) > COMPACT_DESCRIPTION_WORDS:
+            text = " ".join(words[:COMPACT_DESCRIPTION_WORDS]) + "..."
+    return text
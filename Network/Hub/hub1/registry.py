@@ -0,0 +1,628 @@
+import contextlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NewType, Optional, Tuple
+
+# Not deferred like openai: the tables are DataFrames, built (or unpickled from the
+# warm-start snapshot) while main.py is imported, so a worker is never ready without it
+import pandas as pd
+
+logger = logging.getLogger("hub")
+
+IP = NewType('IP address', str)
+Port = NewType('Port', str)
+Address = Tuple[IP, Port]
+Name = NewType('Name', str)
+Friend = Tuple[Name, Address]
+
+ROLE_FRIEND = "friend"
+ROLE_PRIVATE = "private"
+ROLE_PUBLIC = "public"
+
+# Roles ordered by precedence when one (IP, name) pair is registered in several tables
+ROLES: Tuple[str, ...] = (ROLE_FRIEND, ROLE_PRIVATE, ROLE_PUBLIC)
+
+# Per-item outcomes of the batch mutations
+ITEM_CREATED = "created"
+ITEM_EXISTS = "exists"
+ITEM_UPDATED = "updated"
+ITEM_NOT_FOUND = "not_found"
+
+# Kinds of row changes, in the registry journal and the store change log
+CHANGE_INSERT = "insert"  # a new row, with its values
+CHANGE_ACTIVE = "active"  # the 'Active' flag of a row, with its new value
+
+# Row changes remembered for the derived tables catching up (see table_since)
+JOURNAL_SIZE = 4096
+
+# role -> (csv file, column holding the agent name)
+TABLES: Dict[str, Tuple[str, str]] = {
+    ROLE_FRIEND: ("Hub_properties.csv", "Agent Name"),
+    ROLE_PRIVATE: ("Private_Agent_properties.csv", "Agent Name"),
+    ROLE_PUBLIC: ("Public_Agent_properties.csv", "Name"),
+}
+
+
+class AgentRegistry:
+    """
+    In-memory registry of the hub's friend hubs, private agents and public agents.
+
+    The CSV files are read once at startup. Every read (access checks, type lookups,
+    the agent type table) is answered from memory, and mutations mark their table
+    dirty so a background thread persists it later (write-behind).
+
+    Access checks go through a hash index mapping (IP Address, Agent Name) to the row
+    positions of that pair in every table it belongs to, kept in sync on each mutation.
+
+    `version` increases by one on every mutation so derived data (caches, indexes)
+    can tell when it is stale. The last row changes are kept in a journal, so derived
+    tables can apply them instead of being rebuilt (see table_since).
+
+    With a `store` (registry_store.SQLiteRegistryStore) the tables are loaded from the
+    database instead, and every mutation is written through to it in a transaction;
+    the CSV files and the write-behind thread are not used. New rows are buffered and
+    appended to the in-memory tables on the next read, so a burst of registrations
+    does not copy the table once per row.
+
+    With `shared` (shared_registry.SharedRegistryFile, store required) several worker
+    processes serve the same registry: each mutation runs under a cross-process writer
+    lock. Reads check the store generation at most every `refresh_interval` seconds and
+    replay the changes the other workers committed from the store change log, as if they
+    were local mutations. A worker only loads whole tables at startup or when it is too
+    far behind the log: from the shared columnar file, which is republished every
+    `publish_every` generations, plus the changes since its generation.
+    """
+
+    def __init__(self, directory: str = ".", flush_interval: float = 2.0, store=None, snapshot: Optional[dict] = None,
+                 shared=None) -> None:
+        """
+        Load every registry table into memory and start the write-behind thread.
+
+        Args:
+            directory (str): Folder holding the hub CSV files.
+            flush_interval (float): Seconds between two write-behind flushes.
+            store (SQLiteRegistryStore, optional): Transactional storage replacing the CSV files.
+            snapshot (dict, optional): State saved by export_state; used instead of loading the
+                tables when its source fingerprint still matches the CSV files or the store.
+            shared (SharedRegistryFile, optional): Columnar file shared with the other worker processes.
+        """
+        if shared is not None and store is None:
+            raise ValueError("A shared registry needs the SQLite store to serialize the writes of the workers.")
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.store = store
+        self.shared = shared
+        self.version = 0
+        self._lock = threading.RLock()
+        self._dirty: set = set()
+        self._depth = 0
+        self._generation: Optional[int] = None
+        self._checked = 0.0
+        self._journal: Deque[Tuple[int, str, str, int]] = deque(maxlen=JOURNAL_SIZE)
+        self._journal_start = 0
+        self.replayed = 0
+        self.reloads = 0
+        # The shared file already is the warm start of a multi-worker hub
+        self.warm = shared is None and snapshot is not None and snapshot.get("fingerprint") == self.source_fingerprint()
+        if shared is not None:
+            self._load_shared()
+        elif self.warm:
+            self._tables: Dict[str, pd.DataFrame] = snapshot["tables"]
+            self._pending: Dict[str, List[dict]] = {role: [] for role in ROLES}
+            self._access: Dict[Tuple[str, str], Dict[str, List[int]]] = snapshot["access"]
+            self.version = snapshot["version"]
+            self._journal_start = self.version
+        else:
+            if store is not None:
+                self._tables = {role: self._coerce_types(store.load(role)) for role in ROLES}
+            else:
+                self._tables = {role: self._load_table(file_name) for role, (file_name, _) in TABLES.items()}
+            self._reset_index()
+        self._stop = threading.Event()
+        self._flusher = None
+        if store is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="registry-flusher", daemon=True)
+            self._flusher.start()
+
+    # ------------------------------------------------------------------ loading
+
+    def _load_table(self, file_name: str) -> pd.DataFrame:
+        """
+        Read one CSV file and coerce its columns to their proper types.
+
+        Args:
+            file_name (str): The CSV file name inside the registry directory.
+
+        Returns:
+            pd.DataFrame: The typed table, empty if the file does not exist.
+        """
+        try:
+            df = pd.read_csv(os.path.join(self.directory, file_name))
+        except FileNotFoundError:
+            logger.warning("The file %s was not found.", file_name)
+            df = pd.DataFrame()
+        return self._coerce_types(df)
+
+    def _load_shared(self) -> None:
+        """
+        Map the shared file and replay the store changes it misses; when the change log does
+        not reach back to it, load the store and publish it instead.
+        """
+        with self.shared.writer():
+            generation = self.store.generation()
+            mapped = self.shared.current(force=True)
+            if mapped is not None and mapped.generation <= generation:
+                self._tables = mapped.tables(ROLES)
+                self._reset_index()
+                changes = self.store.changes_since(mapped.generation)
+                if changes is not None and self._replay(changes):
+                    self._generation = generation
+                    return
+            self._tables = {role: self._coerce_types(self.store.load(role)) for role in ROLES}
+            self._reset_index()
+            self.shared.publish(self._tables, generation)
+            self._generation = generation
+
+    def _sync(self, force: bool = False) -> None:
+        """
+        Catch up with the changes other workers committed to the store.
+        """
+        if self.shared is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._checked < self.shared.refresh_interval:
+            return
+        self._checked = now
+        generation = self.store.generation()
+        if generation == self._generation:
+            return
+        with self._lock:
+            changes = self.store.changes_since(self._generation)
+            if changes is not None and self._replay(changes):
+                self._generation = max([generation] + [change[0] for change in changes])
+                return
+            # Too far behind the change log: load whole tables
+            self._load_shared()
+            self.version += 1
+            self._reset_journal()
+            self.reloads += 1
+
+    def _replay(self, changes: List[Tuple[int, str, str, int, Any]]) -> bool:
+        """
+        Apply row changes from the store change log like local mutations.
+
+        Returns:
+            bool: False if they do not line up with the tables held, which must then be reloaded.
+        """
+        for _, role, kind, position, value in changes:
+            if kind == CHANGE_INSERT:
+                if position != len(self._tables[role]) + len(self._pending[role]):
+                    return False
+                self._pending[role].append(value)
+                key = (value.get("IP Address"), value.get(TABLES[role][1]))
+                self._access.setdefault(key, {}).setdefault(role, []).append(position)
+            elif kind != CHANGE_ACTIVE or not self._set_flag(role, position, value):
+                return False
+            self.version += 1
+            self._record(role, kind, position)
+        self.replayed += len(changes)
+        return True
+
+    def _record(self, role: str, kind: str, position: int) -> None:
+        # Journal a row change of the current version; what falls out is no longer known
+        if len(self._journal) == self._journal.maxlen:
+            self._journal_start = max(self._journal_start, self._journal[0][0])
+        self._journal.append((self.version, role, kind, position))
+
+    def _reset_journal(self) -> None:
+        # After loading whole tables, the changes up to now are unknown
+        self._journal.clear()
+        self._journal_start = self.version
+
+    def _reset_index(self) -> None:
+        self._pending: Dict[str, List[dict]] = {role: [] for role in ROLES}
+        self._access: Dict[Tuple[str, str], Dict[str, List[int]]] = {}
+        for role in ROLES:
+            self._index_table(role)
+
+    def _index_table(self, role: str, start: int = 0) -> None:
+        """
+        Add the rows of a table from position `start` onwards to the access index.
+        """
+        df = self._tables[role]
+        name_column = TABLES[role][1]
+        if df.empty or name_column not in df.columns or "IP Address" not in df.columns:
+            return
+        ips = df["IP Address"].iloc[start:]
+        names = df[name_column].iloc[start:]
+        for position, key in enumerate(zip(ips, names), start=start):
+            self._access.setdefault(key, {}).setdefault(role, []).append(position)
+
+    @staticmethod
+    def _coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Normalize column dtypes so lookups and merges behave the same after every write.
+        """
+        for column in ("IP Address", "Agent Name", "Name", "Agent Type", "Description"):
+            if column in df.columns:
+                df[column] = df[column].astype(str)
+        if "Port" in df.columns:
+            df["Port"] = pd.to_numeric(df["Port"], errors="coerce").astype("Int64")
+        if "Rate" in df.columns:
+            df["Rate"] = pd.to_numeric(df["Rate"], errors="coerce")
+        if "Active" in df.columns:
+            df["Active"] = df["Active"].map(_to_bool).astype(bool)
+        return df.reset_index(drop=True)
+
+    def _materialize(self, role: str) -> pd.DataFrame:
+        """
+        Append the buffered new rows of a table, then return it.
+        """
+        self._sync()
+        with self._lock:
+            pending = self._pending[role]
+            if pending:
+                table, added = self._tables[role], pd.DataFrame(pending)
+                if not table.empty and set(added.columns) == set(table.columns):
+                    # Only the new rows need their types coerced
+                    df = pd.concat([table, self._coerce_types(added)[list(table.columns)]], ignore_index=True)
+                else:
+                    df = self._coerce_types(pd.concat([table, added], ignore_index=True))
+                self._tables[role] = df
+                pending.clear()
+            return self._tables[role]
+
+    def _flag(self, role: str, position: int) -> bool:
+        # The 'Active' flag of a loaded or buffered row
+        df = self._tables[role]
+        if position >= len(df):
+            return _to_bool(self._pending[role][position - len(df)].get('Active', False))
+        return 'Active' in df.columns and bool(df['Active'].iat[position])
+
+    def _set_flag(self, role: str, position: int, active: bool) -> bool:
+        # Set the 'Active' flag of a loaded or buffered row
+        df = self._tables[role]
+        loaded = len(df)
+        if position < loaded:
+            if 'Active' not in df.columns:
+                return False
+            df.iat[position, df.columns.get_loc('Active')] = bool(active)
+        elif position - loaded < len(self._pending[role]):
+            self._pending[role][position - loaded]['Active'] = bool(active)
+        else:
+            return False
+        return True
+
+    # -------------------------------------------------------------------- reads
+
+    def table(self, role: str) -> pd.DataFrame:
+        """
+        Return the in-memory table for a role. Callers must treat it as read-only.
+        """
+        return self._materialize(role)
+
+    @property
+    def public(self) -> pd.DataFrame:
+        return self._materialize(ROLE_PUBLIC)
+
+    @property
+    def generation(self) -> Optional[int]:
+        """
+        Store generation the tables correspond to (shared registries only).
+        """
+        return self._generation
+
+    def table_since(self, role: str, version: Optional[int]) -> Tuple[int, pd.DataFrame, Optional[List[Tuple[str, int]]]]:
+        """
+        The table of a role, the version it corresponds to, and the row changes made to it
+        after `version`, for derived tables that apply them instead of rebuilding.
+
+        Args:
+            role (str): One of ROLE_FRIEND, ROLE_PRIVATE or ROLE_PUBLIC.
+            version (int, optional): Version the caller last saw.
+
+        Returns:
+            Tuple: (version, table, changes). Changes are (kind, row position) pairs, oldest
+            first; None when they are not known (no version, whole tables loaded since, or
+            fallen out of the journal).
+        """
+        self._sync()
+        with self._lock:
+            df = self._materialize(role)
+            if version == self.version:
+                return self.version, df, []
+            if version is None or version < self._journal_start:
+                return self.version, df, None
+            changes = [(kind, position) for changed, changed_role, kind, position in self._journal
+                       if changed > version and changed_role == role]
+            return self.version, df, changes
+
+    def is_agent_exist(self, ip: str, agent_name: str, role: str) -> bool:
+        """
+        Check whether an (IP, name) pair is registered under the given role.
+
+        Args:
+            ip (str): The caller IP address.
+            agent_name (str): The caller agent name.
+            role (str): One of ROLE_FRIEND, ROLE_PRIVATE or ROLE_PUBLIC.
+
+        Returns:
+            bool: True if the pair exists in that table.
+        """
+        self._sync()
+        return role in self._access.get((ip, agent_name), ())
+
+    def is_active(self, ip: str, agent_name: str, role: str = ROLE_PUBLIC) -> bool:
+        """
+        Whether a registered agent is currently marked 'Active' (False if it is unknown).
+        """
+        self._sync()
+        with self._lock:
+            positions = self._access.get((ip, agent_name), {}).get(role)
+            if not positions:
+                return False
+            return self._flag(role, positions[0])
+
+    def access_role(self, ip: str, agent_name: str) -> Optional[str]:
+        """
+        Resolve the role of a caller with a single index lookup.
+
+        Args:
+            ip (str): The caller IP address.
+            agent_name (str): The caller agent name.
+
+        Returns:
+            Optional[str]: The highest-precedence role of the pair, or None if unknown.
+        """
+        self._sync()
+        entry = self._access.get((ip, agent_name))
+        if not entry:
+            return None
+        return next(role for role in ROLES if role in entry)
+
+    def agent_types(self) -> pd.DataFrame:
+        """
+        Return one row per distinct 'Agent Type' with its 'Description'.
+        """
+        df = self.public
+        if 'Agent Type' not in df.columns:
+            raise ValueError("'Agent Type' column not found in the registry")
+        if 'Description' not in df.columns:
+            raise ValueError("'Description' column not found in the registry")
+        return df.drop_duplicates(subset=['Agent Type'])
+
+    def friends(self) -> List[Friend]:
+        """
+        Return the active friend hubs as (Name, (IP, Port)) tuples.
+        """
+        df = self._materialize(ROLE_FRIEND)
+        if df.empty:
+            return []
+        active_friends = df[df['Active']] if 'Active' in df.columns else df
+        return [
+            (Name(name), (IP(ip), Port(str(port))))
+            for name, ip, port in zip(active_friends['Agent Name'], active_friends['IP Address'], active_friends['Port'])
+        ]
+
+    # ---------------------------------------------------------------- mutations
+
+    def add_agent(self, ip: str, agent_name: str, role: str, extra_columns: Optional[Dict[str, str]] = None) -> None:
+        """
+        Register a new agent in memory and schedule its table for persistence.
+
+        Args:
+            ip (str): The agent IP address.
+            agent_name (str): The agent name.
+            role (str): One of ROLE_FRIEND, ROLE_PRIVATE or ROLE_PUBLIC.
+            extra_columns (Dict[str, str], optional): Any other column values.
+        """
+        new_row = {"IP Address": ip, TABLES[role][1]: agent_name}
+        if extra_columns is not None:
+            new_row.update(extra_columns)
+        with self.transaction():
+            position = len(self._tables[role]) + len(self._pending[role])
+            if self.store is not None:
+                self.store.insert(role, position, new_row)
+            else:
+                self._dirty.add(role)
+            self._pending[role].append(new_row)
+            self._access.setdefault((ip, agent_name), {}).setdefault(role, []).append(position)
+            self.version += 1
+            self._record(role, CHANGE_INSERT, position)
+
+    def set_active(self, ip: str, agent_name: str, active: bool, role: str = ROLE_PUBLIC) -> bool:
+        """
+        Flip the 'Active' flag of a registered agent. Setting the flag it already has
+        changes nothing, so the version and the change journal only move on a real flip.
+
+        Args:
+            ip (str): The agent IP address.
+            agent_name (str): The agent name.
+            active (bool): The new activation status.
+            role (str): The table holding the agent.
+
+        Returns:
+            bool: False if the agent is not registered under that role.
+        """
+        name_column = TABLES[role][1]
+        with self.transaction():
+            df = self._tables[role]
+            if not df.empty and ('Active' not in df.columns or name_column not in df.columns):
+                logger.warning("The required columns (IP Address, %s, Active) do not exist in the registry.", name_column)
+                return False
+            positions = self._access.get((ip, agent_name), {}).get(role)
+            if not positions:
+                logger.warning("The specified IP and agent name combination was not found.")
+                return False
+            # An idempotent heartbeat must not clear the search cache or refresh the prompt tables
+            positions = [position for position in positions if self._flag(role, position) != bool(active)]
+            if not positions:
+                return True
+            if self.store is not None:
+                self.store.set_active(role, ip, agent_name, active)
+            else:
+                self._dirty.add(role)
+            self.version += 1
+            for position in positions:
+                self._set_flag(role, position, active)
+                self._record(role, CHANGE_ACTIVE, position)
+        return True
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Apply several mutations atomically: with a store they are committed together,
+        and if the store fails the in-memory tables are reloaded from it, so memory
+        never keeps a change the store rolled back.
+        """
+        with self._lock:
+            if self.store is None or self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            with self.shared.writer() if self.shared is not None else contextlib.nullcontext():
+                # Start from what the other workers last published, so row positions match the store
+                self._sync(force=True)
+                self._depth = 1
+                try:
+                    with self.store.transaction():
+                        yield
+                except Exception:
+                    self._tables = {role: self._coerce_types(self.store.load(role)) for role in ROLES}
+                    self._reset_index()
+                    self.version += 1
+                    self._reset_journal()
+                    raise
+                finally:
+                    self._depth = 0
+                if self.shared is not None:
+                    # The other workers replay this transaction from the store change log; the
+                    # whole tables are only republished every publish_every generations
+                    self._generation = self.store.generation()
+                    if self._generation - (self.shared.published_generation() or 0) >= self.shared.publish_every:
+                        self.shared.publish({role: self._materialize(role) for role in ROLES}, self._generation)
+
+    def add_agents(self, agents: Iterable[Tuple[str, str, str, Optional[Dict[str, str]]]]) -> List[str]:
+        """
+        Register many agents in one transaction.
+
+        Args:
+            agents (Iterable[Tuple[str, str, str, Optional[Dict[str, str]]]]): (IP, name, role,
+                extra columns) of every agent.
+
+        Returns:
+            List[str]: ITEM_CREATED or ITEM_EXISTS for each agent, in order.
+        """
+        results = []
+        with self.transaction():
+            for ip, agent_name, role, extra_columns in agents:
+                if self.is_agent_exist(ip, agent_name, role):
+                    results.append(ITEM_EXISTS)
+                    continue
+                self.add_agent(ip, agent_name, role, extra_columns)
+                results.append(ITEM_CREATED)
+        return results
+
+    def set_active_many(self, updates: Iterable[Tuple[str, str, bool]], role: str = ROLE_PUBLIC) -> List[str]:
+        """
+        Flip the 'Active' flag of many agents in one transaction.
+
+        Args:
+            updates (Iterable[Tuple[str, str, bool]]): (IP, name, active) of every agent.
+            role (str): The table holding the agents.
+
+        Returns:
+            List[str]: ITEM_UPDATED or ITEM_NOT_FOUND for each update, in order.
+        """
+        results = []
+        with self.transaction():
+            for ip, agent_name, active in updates:
+                if not self.is_agent_exist(ip, agent_name, role):
+                    results.append(ITEM_NOT_FOUND)
+                    continue
+                results.append(ITEM_UPDATED if self.set_active(ip, agent_name, active, role) else ITEM_NOT_FOUND)
+        return results
+
+    # ---------------------------------------------------------------- snapshots
+
+    def source_fingerprint(self) -> tuple:
+        """
+        Identity of the persisted registry: the store generation, or the size and
+        modification time of every CSV file.
+        """
+        if self.store is not None:
+            return ("sqlite", os.path.abspath(self.store.path), self.store.generation())
+        signature = []
+        for file_name, _ in TABLES.values():
+            try:
+                stat = os.stat(os.path.join(self.directory, file_name))
+                signature.append((file_name, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append((file_name, None, None))
+        return ("csv",) + tuple(signature)
+
+    def export_state(self) -> dict:
+        """
+        Persist pending changes, then copy the tables, access index and version together
+        with the fingerprint of what was persisted, for a warm-start snapshot.
+        """
+        with self._lock:
+            self.flush()
+            return {
+                "version": self.version,
+                "tables": {role: self._materialize(role).copy() for role in ROLES},
+                "access": {key: {role: list(positions) for role, positions in entry.items()}
+                           for key, entry in self._access.items()},
+                "fingerprint": self.source_fingerprint(),
+            }
+
+    # ------------------------------------------------------------- write-behind
+
+    def flush(self) -> None:
+        """
+        Persist every dirty table to its CSV file.
+        """
+        if self.store is not None:
+            return  # every mutation is already committed to the store
+        with self._lock:
+            pending = {role: self._materialize(role).copy() for role in self._dirty}
+            self._dirty.clear()
+        for role, df in pending.items():
+            path = os.path.join(self.directory, TABLES[role][0])
+            tmp_path = f"{path}.tmp"
+            try:
+                df.to_csv(tmp_path, index=False)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning("Error while saving %s: %s", path, e)
+                with self._lock:
+                    self._dirty.add(role)
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        """
+        Stop the write-behind thread and flush pending changes.
+        """
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.flush_interval + 1)
+        self.flush()
+        if self.store is not None:
+            self.store.close()
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().upper() == "TRUE"
+    if pd.isna(value):
+        return False
+    return bool(value)
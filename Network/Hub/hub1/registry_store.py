@@ -0,0 +1,335 @@
+"""
+SQLite storage engine of the hub registry.
+
+The three registry tables (friend hubs, private agents, public agents) live in one
+SQLite database in WAL mode, each with an index on (IP Address, agent name), so a
+registration is one indexed INSERT and an activation toggle one indexed UPDATE, both
+in their own transaction instead of a full CSV rewrite.
+
+The store is opt-in: the shipped config.json keeps the CSV files ("backend": "csv").
+Select it with "registry_store": {"backend": "sqlite", "path": "registry.db"}. The CSV
+files are imported only when the database is created; from then on the database is the
+registry, and later edits of the CSV files are not read (re-run the importer to apply them)
+nor does /add_agent write them.
+
+Every committed transaction bumps the store generation and records its row changes in
+a change log, so the worker processes of a hub catch up by replaying the changes since
+the generation they hold instead of reloading the tables.
+
+Import the existing CSV files into a database from the hub folder with:
+    python registry_store.py import [csv_directory] [database]
+"""
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from registry import CHANGE_ACTIVE, CHANGE_INSERT, ROLE_FRIEND, ROLE_PRIVATE, ROLE_PUBLIC, TABLES
+
+logger = logging.getLogger("hub")
+
+# role -> (table name, csv file, column holding the agent name)
+STORE_TABLES: Dict[str, Tuple[str, str, str]] = {
+    role: (table, *TABLES[role])
+    for role, table in ((ROLE_FRIEND, "hub_properties"), (ROLE_PRIVATE, "private_agents"), (ROLE_PUBLIC, "public_agents"))
+}
+
+# Row position in the in-memory table, used as the SQLite rowid
+POSITION_COLUMN = "position"
+
+_COLUMN_TYPES = {"Port": "INTEGER", "Rate": "REAL", "Active": "INTEGER"}
+
+# Generations kept in the change log; a worker further behind reloads the tables
+CHANGE_LOG_GENERATIONS = 4096
+
+# A change: (generation, role, kind, row position, value)
+Change = Tuple[int, str, str, int, Any]
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _to_sql_value(column: str, value: Any) -> Any:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if column == "Active":
+        if isinstance(value, str):
+            return int(value.strip().upper() == "TRUE")
+        return int(bool(value))
+    if column == "Port":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if column == "Rate":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+class SQLiteRegistryStore:
+    """
+    Transactional, indexed persistence of the registry tables.
+    """
+
+    def __init__(self, path: str = "registry.db", busy_timeout: float = 30.0) -> None:
+        """
+        Args:
+            path (str): SQLite database file.
+            busy_timeout (float): Seconds to wait for a lock held by another process.
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._next_generation = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Bumped by every committed transaction, so a warm-start snapshot can tell the data changed
+        self._conn.execute("CREATE TABLE IF NOT EXISTS registry_meta (key TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.execute("INSERT OR IGNORE INTO registry_meta VALUES ('generation', 0)")
+        # Changes of the generations after 'log_start' (older databases start their log now)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS registry_changes "
+                           "(generation INTEGER, role TEXT, kind TEXT, position INTEGER, value TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS registry_changes_generation ON registry_changes (generation)")
+        self._conn.execute("INSERT OR IGNORE INTO registry_meta SELECT 'log_start', value FROM registry_meta "
+                           "WHERE key = 'generation'")
+        self._columns: Dict[str, List[str]] = {}
+        for role, (table, _, _) in STORE_TABLES.items():
+            self._columns[role] = self._table_columns(table)
+
+    def _table_columns(self, table: str) -> List[str]:
+        rows = self._conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+        return [row[1] for row in rows if row[1] != POSITION_COLUMN]
+
+    def generation(self) -> int:
+        """
+        Number of transactions committed to the database so far.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT value FROM registry_meta WHERE key = 'generation'").fetchone()[0]
+
+    def changes_since(self, generation: int) -> Optional[List[Change]]:
+        """
+        The row changes committed after `generation`, oldest first.
+
+        Returns:
+            Optional[List[Change]]: (generation, role, kind, position, value) tuples, or None
+            when the log no longer covers that generation (the tables must be reloaded).
+        """
+        with self._lock:
+            log_start = self._conn.execute("SELECT value FROM registry_meta WHERE key = 'log_start'").fetchone()[0]
+            if generation < log_start:
+                return None
+            rows = self._conn.execute(
+                "SELECT generation, role, kind, position, value FROM registry_changes "
+                "WHERE generation > ? ORDER BY rowid", (generation,)).fetchall()
+        return [(changed, role, kind, position, json.loads(value)) for changed, role, kind, position, value in rows]
+
+    def _log(self, role: str, kind: str, position: int, value: Any) -> None:
+        self._conn.execute("INSERT INTO registry_changes VALUES (?, ?, ?, ?, ?)",
+                           (self._next_generation, role, kind, position, json.dumps(value, default=str)))
+
+    def is_empty(self) -> bool:
+        """
+        True when no registry table has been created yet.
+        """
+        return not any(self._columns.values())
+
+    # -------------------------------------------------------------- transactions
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        Group several mutations in one transaction; nested uses join the outer one.
+        """
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            changes = self._conn.total_changes
+            self._next_generation = self._conn.execute(
+                "SELECT value FROM registry_meta WHERE key = 'generation'").fetchone()[0] + 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            else:
+                if self._conn.total_changes != changes:
+                    self._conn.execute("UPDATE registry_meta SET value = value + 1 WHERE key = 'generation'")
+                    if self._next_generation % 256 == 0:
+                        self._trim_log(self._next_generation - CHANGE_LOG_GENERATIONS)
+                self._conn.execute("COMMIT")
+            finally:
+                self._depth = 0
+
+    def _trim_log(self, log_start: int) -> None:
+        # Forget the changes up to log_start; workers behind it reload the tables
+        self._conn.execute("DELETE FROM registry_changes WHERE generation <= ?", (log_start,))
+        self._conn.execute("UPDATE registry_meta SET value = MAX(value, ?) WHERE key = 'log_start'", (log_start,))
+
+    # ------------------------------------------------------------------ schema
+
+    def _ensure_table(self, role: str, columns: List[str]) -> None:
+        table, _, name_column = STORE_TABLES[role]
+        known = self._columns[role]
+        if not known:
+            definitions = [f"{POSITION_COLUMN} INTEGER PRIMARY KEY"] + [
+                f"{_quote(column)} {_COLUMN_TYPES.get(column, 'TEXT')}" for column in columns]
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} ({', '.join(definitions)})")
+            self._columns[role] = list(columns)
+        else:
+            for column in columns:
+                if column not in known:
+                    self._conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)} "
+                                       f"{_COLUMN_TYPES.get(column, 'TEXT')}")
+                    known.append(column)
+        if "IP Address" in self._columns[role] and name_column in self._columns[role]:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(table + '_access')} "
+                               f"ON {_quote(table)} ({_quote('IP Address')}, {_quote(name_column)})")
+
+    # ------------------------------------------------------------------- reads
+
+    def load(self, role: str) -> pd.DataFrame:
+        """
+        Read a whole table in row position order, with the same columns as its CSV file.
+        """
+        table = STORE_TABLES[role][0]
+        columns = self._columns[role]
+        if not columns:
+            return pd.DataFrame()
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(_quote(column) for column in columns)} FROM {_quote(table)} ORDER BY {POSITION_COLUMN}",
+                self._conn)
+        if "Active" in df.columns:
+            df["Active"] = df["Active"].fillna(0).astype(bool)
+        return df
+
+    # --------------------------------------------------------------- mutations
+
+    def insert(self, role: str, position: int, row: Dict[str, Any]) -> None:
+        """
+        Store one new row at the given position.
+        """
+        table = STORE_TABLES[role][0]
+        columns = list(row)
+        with self.transaction():
+            self._ensure_table(role, columns)
+            self._conn.execute(
+                f"INSERT INTO {_quote(table)} ({POSITION_COLUMN}, {', '.join(_quote(column) for column in columns)}) "
+                f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+                [position] + [_to_sql_value(column, row[column]) for column in columns])
+            self._log(role, CHANGE_INSERT, position, row)
+
+    def set_active(self, role: str, ip: str, agent_name: str, active: bool) -> int:
+        """
+        Update the 'Active' flag of an (IP, name) pair through the access index.
+
+        Returns:
+            int: The number of rows whose flag changed.
+        """
+        table, _, name_column = STORE_TABLES[role]
+        with self.transaction():
+            # Rows already in that state are left alone, so a no-op does not bump the generation
+            positions = self._conn.execute(
+                f"UPDATE {_quote(table)} SET {_quote('Active')} = ? "
+                f"WHERE {_quote('IP Address')} = ? AND {_quote(name_column)} = ? AND {_quote('Active')} IS NOT ? "
+                f"RETURNING {POSITION_COLUMN}",
+                (int(bool(active)), ip, agent_name, int(bool(active)))).fetchall()
+            for (position,) in positions:
+                self._log(role, CHANGE_ACTIVE, position, bool(active))
+        return len(positions)
+
+    def replace_table(self, role: str, df: pd.DataFrame) -> None:
+        """
+        Replace a whole table with a DataFrame (used by the CSV importer).
+        """
+        table = STORE_TABLES[role][0]
+        columns = [str(column) for column in df.columns]
+        with self.transaction():
+            # Row positions start over: the log cannot bring a worker to the new table
+            self._trim_log(self._next_generation)
+            self._conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            self._columns[role] = []
+            self._ensure_table(role, columns)
+            if columns:
+                self._conn.executemany(
+                    f"INSERT INTO {_quote(table)} ({POSITION_COLUMN}, {', '.join(_quote(column) for column in columns)}) "
+                    f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+                    ([position] + [_to_sql_value(column, value) for column, value in zip(columns, values)]
+                     for position, values in enumerate(df.itertuples(index=False, name=None))))
+
+    def import_csv(self, directory: str = ".") -> Dict[str, int]:
+        """
+        Import the registry CSV files of a hub folder, replacing the stored tables.
+
+        Args:
+            directory (str): Folder holding the hub CSV files.
+
+        Returns:
+            Dict[str, int]: Number of rows imported per role.
+        """
+        imported = {}
+        with self.transaction():
+            for role, (_, file_name, _) in STORE_TABLES.items():
+                try:
+                    df = pd.read_csv(os.path.join(directory, file_name), dtype=str, keep_default_na=False)
+                except FileNotFoundError:
+                    logger.warning("The file %s was not found.", file_name)
+                    continue
+                self.replace_table(role, df)
+                imported[role] = len(df)
+        return imported
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def make_registry_store(config: Optional[dict], directory: str = ".",
+                        lock: Optional[Callable[[], ContextManager]] = None) -> Optional[SQLiteRegistryStore]:
+    """
+    Open the store selected by the "registry_store" section of config.json, or None for
+    the CSV files. A new database is filled from the CSV files of `directory`.
+
+    `lock` is the cross-process writer lock of a multi-worker hub: the workers start
+    together, and under it only one switches the database to WAL mode and imports.
+    """
+    config = config or {}
+    if config.get("backend", "csv") != "sqlite":
+        return None
+    with lock() if lock is not None else contextlib.nullcontext():
+        store = SQLiteRegistryStore(os.path.join(directory, config.get("path", "registry.db")),
+                                    float(config.get("busy_timeout", 30)))
+        with store.transaction():
+            if store.is_empty():
+                logger.info("Importing the registry CSV files into %s: %s", store.path, store.import_csv(directory))
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "import":
+        print(__doc__)
+        sys.exit(1)
+    csv_directory = sys.argv[2] if len(sys.argv) > 2 else "."
+    database = sys.argv[3] if len(sys.argv) > 3 else os.path.join(csv_directory, "registry.db")
+    counts = SQLiteRegistryStore(database).import_csv(csv_directory)
+    print(f"Imported {counts} into {database}")
@@ -0,0 +1,220 @@
+import re
+import zlib
+from typing import Dict, List, Optional, Protocol, Tuple
+
+import numpy as np
+import pandas as pd
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "buy", "by", "can", "find", "for", "from", "help",
+    "i", "in", "is", "it", "me", "my", "need", "of", "on", "or", "please", "some", "the", "to",
+    "want", "we", "who", "with", "you", "your",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into lowercase word tokens with a light plural stemming.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        List[str]: Tokens without stop words.
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(str(text).lower()):
+        if token in _STOP_WORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class Encoder(Protocol):
+    """
+    Interface of the text encoders used by AgentTypeIndex.
+    """
+
+    def fit(self, texts: List[str]) -> None:
+        ...
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+class HashingEncoder:
+    """
+    Deterministic bag-of-words encoder using the hashing trick (no fitting, no vocabulary).
+    """
+
+    def __init__(self, dimension: int = 1024) -> None:
+        self.dimension = dimension
+
+    def fit(self, texts: List[str]) -> None:
+        return None
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = zlib.crc32(token.encode("utf-8"))
+                sign = 1.0 if digest & 1 else -1.0
+                vectors[row, (digest >> 1) % self.dimension] += sign
+        return _normalize(vectors)
+
+
+class TfidfEncoder:
+    """
+    TF-IDF encoder fitted on the agent corpus; unknown query words are ignored.
+    """
+
+    def __init__(self) -> None:
+        self.vocabulary: dict = {}
+        self.idf: np.ndarray = np.zeros(0, dtype=np.float32)
+
+    def fit(self, texts: List[str]) -> None:
+        document_frequency: dict = {}
+        for text in texts:
+            for token in set(tokenize(text)):
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+        self.vocabulary = {token: column for column, token in enumerate(sorted(document_frequency))}
+        counts = np.array([document_frequency[token] for token in sorted(document_frequency)], dtype=np.float32)
+        self.idf = np.log((1 + len(texts)) / (1 + counts)) + 1.0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    vectors[row, column] += 1.0
+        return _normalize(vectors * self.idf)
+
+
+class AgentTypeIndex:
+    """
+    Vector index over the public agents ('Agent Type' + 'Description') used to shortlist
+    agent types locally instead of asking the LLM.
+    """
+
+    def __init__(self, encoder: Optional[Encoder] = None) -> None:
+        """
+        Args:
+            encoder (Encoder, optional): Text encoder, a HashingEncoder by default.
+        """
+        self.encoder = encoder or HashingEncoder()
+        self._source: Optional[pd.DataFrame] = None
+        self._descriptions: Optional[np.ndarray] = None
+        self._types: np.ndarray = np.empty(0, dtype=object)
+        self._vectors: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _agent_texts(df: pd.DataFrame) -> List[str]:
+        return (df['Agent Type'].astype(str) + " " + df['Agent Type'].astype(str) + " "
+                + df['Description'].fillna("").astype(str)).tolist()
+
+    def _indexed(self, df: pd.DataFrame) -> bool:
+        # True if the first rows of df are the agents the index holds
+        known = len(self._types)
+        return (self._descriptions is not None and len(df) >= known
+                and np.array_equal(df['Agent Type'].iloc[:known].astype(str).to_numpy(), self._types)
+                and np.array_equal(df['Description'].iloc[:known].fillna("").astype(str).to_numpy(), self._descriptions))
+
+    def build(self, df: pd.DataFrame) -> None:
+        """
+        Encode every agent of the table.
+
+        Args:
+            df (pd.DataFrame): The public agents table.
+        """
+        texts = self._agent_texts(df)
+        self.encoder.fit(texts)
+        self._vectors = self.encoder.encode(texts)
+        self._types = df['Agent Type'].astype(str).to_numpy()
+        self._descriptions = df['Description'].fillna("").astype(str).to_numpy()
+        self._source = df
+
+    def ensure(self, df: pd.DataFrame) -> None:
+        """
+        Update the index if the given table is not the one it was built from. With the
+        HashingEncoder (no fitting), agents appended to the table are encoded on their own.
+        """
+        if df is self._source:
+            return
+        if isinstance(self.encoder, HashingEncoder) and self._indexed(df):
+            tail = df.iloc[len(self._types):]
+            self._vectors = np.vstack([self._vectors.reshape(len(self._types), self.encoder.dimension),
+                                       self.encoder.encode(self._agent_texts(tail))])
+            self._types = np.concatenate([self._types, tail['Agent Type'].astype(str).to_numpy()])
+            self._descriptions = np.concatenate([self._descriptions, tail['Description'].fillna("").astype(str).to_numpy()])
+            self._source = df
+            return
+        self.build(df)
+
+    def export_state(self, df: pd.DataFrame) -> Optional[dict]:
+        """
+        Encoder and vectors of the index for a warm-start snapshot, None if it was not built from `df`.
+        """
+        if df is not self._source:
+            return None
+        # Hashed bag-of-words vectors are almost all zeros: keep only the non-zero cells
+        rows, columns = np.nonzero(self._vectors)
+        return {"encoder": self.encoder, "types": self._types, "shape": self._vectors.shape,
+                "rows": rows.astype(np.int32), "columns": columns.astype(np.int32),
+                "values": self._vectors[rows, columns]}
+
+    def restore_state(self, state: dict, df: pd.DataFrame) -> None:
+        """
+        Reload a saved index as the index of `df`, the table it was built from.
+        """
+        vectors = np.zeros(state["shape"], dtype=np.float32)
+        vectors[state["rows"], state["columns"]] = state["values"]
+        self.encoder = state["encoder"]
+        self._types = state["types"]
+        self._vectors = vectors
+        self._descriptions = None
+        self._source = df
+
+    def search(self, prompt: str, top_k: int = 3, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Rank the agent types for a prompt by cosine similarity.
+
+        Args:
+            prompt (str): The search request.
+            top_k (int): Maximum number of types to return.
+            min_score (float): Types scoring below this value are dropped.
+
+        Returns:
+            List[Tuple[str, float]]: (agent type, score) pairs, best first.
+        """
+        ranked = sorted(self.type_scores(prompt).items(), key=lambda item: item[1], reverse=True)
+        return [(agent_type, score) for agent_type, score in ranked[:top_k] if score >= min_score]
+
+    def agent_scores(self, prompt: str) -> np.ndarray:
+        """
+        Cosine similarity of the prompt with every agent, in table row order.
+        """
+        if len(self._types) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return self._vectors @ self.encoder.encode([prompt])[0]
+
+    def type_scores(self, prompt: str) -> Dict[str, float]:
+        """
+        Best agent similarity per agent type.
+        """
+        best: Dict[str, float] = {}
+        for agent_type, score in zip(self._types, self.agent_scores(prompt)):
+            if score > best.get(agent_type, -1.0):
+                best[agent_type] = float(score)
+        return best
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
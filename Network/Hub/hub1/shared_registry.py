@@ -0,0 +1,240 @@
+"""
+Registry shared by the worker processes of one hub (`uvicorn main:app --workers N`).
+
+Every worker keeps serving reads from its own AgentRegistry, but the tables come from
+one columnar file, normally in /dev/shm, that all workers map into memory. Numeric
+columns (Port, Rate, Active) are used straight from the mapping without a copy.
+
+Writes are serialized across processes by an exclusive lock file and applied to the
+SQLite store, which stays the only source of truth. The other workers pick single writes
+up from the store change log (see AgentRegistry._sync), so the file is only an image of
+the tables that workers map at startup or when they fell behind the log: a writer
+publishes a new one (temporary file, then rename), stamped with the store generation,
+once the store is `publish_every` generations past the published one.
+
+File layout: 8-byte magic, 8-byte generation, 8-byte header length, JSON header, then
+8-byte aligned column blocks. A string column is an int64 offset array, a UTF-8 blob and a null mask.
+"""
+import contextlib
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("hub")
+
+SHARED_MAGIC = b"HUBREG01"
+_PREFIX = struct.Struct("<8sQQ")  # magic, generation, header length
+
+# Column kinds of the file; every other column is stored as text
+_KINDS = {"Port": "int", "Rate": "float", "Active": "bool"}
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def _encode_column(name: str, series: pd.Series) -> Tuple[str, List[bytes]]:
+    kind = _KINDS.get(name, "str")
+    if kind == "int":
+        values = pd.to_numeric(series, errors="coerce").astype("Int64")
+        return kind, [values.fillna(0).to_numpy(dtype=np.int64).tobytes(),
+                      values.isna().to_numpy(dtype=np.uint8).tobytes()]
+    if kind == "float":
+        return kind, [pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64).tobytes()]
+    if kind == "bool":
+        return kind, [series.fillna(False).to_numpy(dtype=np.uint8).tobytes()]
+    missing = series.isna().to_numpy(dtype=np.uint8)
+    encoded = [b"" if null else str(value).encode("utf-8") for value, null in zip(series, missing)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return kind, [offsets.tobytes(), b"".join(encoded), missing.tobytes()]
+
+
+def write_columnar(path: str, tables: Dict[str, pd.DataFrame], generation: int) -> int:
+    """
+    Write the registry tables to a columnar file, atomically.
+
+    Args:
+        path (str): Destination file.
+        tables (Dict[str, pd.DataFrame]): Tables per role.
+        generation (int): Store generation the tables correspond to.
+
+    Returns:
+        int: Size of the file in bytes.
+    """
+    header = {"tables": {}}
+    blocks: List[bytes] = []
+    offset = 0
+    for role, df in tables.items():
+        columns = []
+        for name in df.columns:
+            kind, parts = _encode_column(str(name), df[name])
+            spans = []
+            for part in parts:
+                spans.append([offset, len(part)])
+                blocks.append(part + b"\0" * (_align(len(part)) - len(part)))
+                offset += _align(len(part))
+            columns.append({"name": str(name), "kind": kind, "spans": spans})
+        header["tables"][role] = {"rows": len(df), "columns": columns}
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (_align(len(header_bytes)) - len(header_bytes))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(_PREFIX.pack(SHARED_MAGIC, generation, len(header_bytes)) + header_bytes)
+        for block in blocks:
+            file.write(block)
+    os.replace(tmp_path, path)
+    return _PREFIX.size + len(header_bytes) + offset
+
+
+class ColumnarSnapshot:
+    """
+    A published registry file mapped into memory.
+
+    The mapping is private copy-on-write: a worker may update its own tables in place
+    (e.g. an 'Active' flag) without touching the file the other workers read.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, self.generation, header_length = _PREFIX.unpack_from(self._map)
+        if magic != SHARED_MAGIC:
+            raise ValueError(f"{path} is not a shared registry file")
+        self.header = json.loads(bytes(self._map[_PREFIX.size:_PREFIX.size + header_length]))
+        self._data_start = _PREFIX.size + header_length
+
+    def _view(self, span: List[int], dtype) -> np.ndarray:
+        offset, length = span
+        return np.frombuffer(self._map, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                             offset=self._data_start + offset)
+
+    def table(self, role: str) -> pd.DataFrame:
+        """
+        The table of a role; numeric columns are views of the mapping, text columns are decoded.
+        """
+        layout = self.header["tables"].get(role)
+        if layout is None or not layout["columns"]:
+            return pd.DataFrame()
+        rows = layout["rows"]
+        data = {}
+        for column in layout["columns"]:
+            kind, spans = column["kind"], column["spans"]
+            if kind == "int":
+                data[column["name"]] = pd.arrays.IntegerArray(self._view(spans[0], np.int64), self._view(spans[1], np.bool_))
+            elif kind == "float":
+                data[column["name"]] = self._view(spans[0], np.float64)
+            elif kind == "bool":
+                data[column["name"]] = self._view(spans[0], np.bool_)
+            else:
+                offsets = self._view(spans[0], np.int64)
+                missing = self._view(spans[2], np.bool_)
+                blob_start = self._data_start + spans[1][0]
+                blob = self._map[blob_start:blob_start + spans[1][1]]
+                data[column["name"]] = [None if missing[i] else blob[offsets[i]:offsets[i + 1]].decode("utf-8")
+                                        for i in range(rows)]
+        return pd.DataFrame(data, copy=False)
+
+    def tables(self, roles: Iterable[str]) -> Dict[str, pd.DataFrame]:
+        return {role: self.table(role) for role in roles}
+
+
+class SharedRegistryFile:
+    """
+    The published registry file of a hub, its cross-process writer lock and the
+    mapping currently used by this process.
+    """
+
+    def __init__(self, path: str, refresh_interval: float = 0.05, publish_every: int = 256) -> None:
+        """
+        Args:
+            path (str): Columnar file shared by the workers, e.g. in /dev/shm.
+            refresh_interval (float): Seconds between two checks for changes of the other workers.
+            publish_every (int): Store generations between two published files.
+        """
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.publish_every = max(1, publish_every)
+        self._lock_file = open(f"{path}.lock", "a+")
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._snapshot: Optional[ColumnarSnapshot] = None
+        self._checked = 0.0
+        self.generation: Optional[int] = None
+        self.published = 0
+        self.reloads = 0
+
+    @contextlib.contextmanager
+    def writer(self) -> Iterator[None]:
+        """
+        Exclusive write access across the worker processes (re-entrant within one process).
+        """
+        with self._thread_lock:
+            if self._depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def published_generation(self) -> Optional[int]:
+        """
+        Generation of the published file, None if there is none.
+        """
+        # Inode, size and mtime do not tell two files apart reliably: tmpfs reuses inodes
+        # and its timestamps are coarse, so the generation itself is compared
+        try:
+            with open(self.path, "rb") as file:
+                magic, generation, _ = _PREFIX.unpack(file.read(_PREFIX.size))
+        except (OSError, struct.error):
+            return None
+        return generation if magic == SHARED_MAGIC else None
+
+    def current(self, force: bool = False) -> Optional[ColumnarSnapshot]:
+        """
+        The latest published file, checked at most every `refresh_interval` seconds unless forced.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_interval:
+            return self._snapshot
+        self._checked = now
+        generation = self.published_generation()
+        if generation is not None and generation != self.generation:
+            try:
+                snapshot = ColumnarSnapshot(self.path)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not map the shared registry %s: %s", self.path, e)
+                return self._snapshot
+            self._snapshot = snapshot
+            self.generation = snapshot.generation
+            self.reloads += 1
+        return self._snapshot
+
+    def publish(self, tables: Dict[str, pd.DataFrame], generation: int) -> None:
+        """
+        Publish the tables of a store generation. Must be called under writer().
+        """
+        write_columnar(self.path, tables, generation)
+        self.published += 1
+        self._snapshot = None
+        self.generation = generation
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "generation": self.generation,
+            "published": self.published,
+            "reloads": self.reloads,
+        }
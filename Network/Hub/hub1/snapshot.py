@@ -0,0 +1,65 @@
+"""
+Warm-start snapshot of a hub process.
+
+The registry tables and access index, the agent type index, the rendered prompt
+tables, the prompt templates and the search cache are pickled into one zlib
+compressed file, written on shutdown and every `snapshot.interval` seconds. On boot
+the registry reuses it when the CSV files (or the SQLite store) are unchanged since it
+was written, and the derived structures are restored instead of rebuilt on the first
+requests.
+"""
+import logging
+import os
+import pickle
+import time
+import zlib
+from typing import Optional
+
+logger = logging.getLogger("hub")
+
+SNAPSHOT_MAGIC = b"HUBSNAP1"
+
+
+def save_snapshot(path: str, state: dict) -> int:
+    """
+    Write a snapshot atomically (temporary file then rename).
+
+    Args:
+        path (str): Snapshot file.
+        state (dict): The state to save, as returned by Hub.export_state.
+
+    Returns:
+        int: Size of the written file in bytes.
+    """
+    state = dict(state, created_at=time.time())
+    data = SNAPSHOT_MAGIC + zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+    tmp_path = f"{path}.{os.getpid()}.tmp"  # workers of one hub may write the same snapshot
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load_snapshot(path: str) -> Optional[dict]:
+    """
+    Read a snapshot written by save_snapshot.
+
+    Returns:
+        Optional[dict]: The saved state, or None if the file is missing or unreadable.
+    """
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning("Could not read the snapshot %s: %s", path, e)
+        return None
+    if not data.startswith(SNAPSHOT_MAGIC):
+        logger.warning("Ignoring %s: not a hub snapshot.", path)
+        return None
+    try:
+        return pickle.loads(zlib.decompress(data[len(SNAPSHOT_MAGIC):]))
+    except Exception as e:
+        logger.warning("Ignoring the damaged snapshot %s: %s", path, e)
+        return None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The hub modules are imported flat, as main.py does when run from the hub folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import agent_table
+from agent_table import AgentTable
+
+AGENTS = pd.DataFrame({
+    "Agent Type": ["Pharmacy", "Hotel", "Pharmacy", "Doctor", "Pharmacy"],
+    "Name": ["P1", "H1", "P2", "D1", "P3"],
+    "Rate": [4.0, 5.0, None, 4.5, 4.8],
+    "IP Address": ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4", "10.0.0.5"],
+    "Port": [8001, 8002, "8003", 8004, 8005],
+    "Active": [True, True, True, True, False],
+})
+
+
+def test_select_filters_types_activity_and_block_list():
+    table = AgentTable(AGENTS)
+    assert table.select(["Pharmacy"]).tolist() == [0, 2]
+    assert table.select(["Pharmacy", "Doctor"], by_rate=True).tolist() == [3, 0, 2]
+    # A block list entry matches whatever the port type is
+    assert table.select(["Pharmacy"], person_block=[("P2", ("10.0.0.3", 8003))]).tolist() == [0]
+    assert table.select(["Taxi"]).tolist() == []
+    assert table.type_counts() == {"Pharmacy": 2, "Hotel": 1, "Doctor": 1}
+
+
+def test_a_hash_match_is_confirmed_on_the_values(monkeypatch):
+    # Every key hashing the same: only the exact (name, ip, port) is blocked
+    monkeypatch.setattr(agent_table, "_hash_keys", lambda names, ips, ports: np.zeros(len(names), dtype=np.uint64))
+    table = AgentTable(AGENTS)
+    assert table.blocked_mask([("P1", ("10.0.0.1", "8001"))]).tolist() == [True, False, False, False, False]
+    assert table.select(["Pharmacy"], person_block=[("P9", ("10.0.0.9", "8009"))]).tolist() == [0, 2]
+
+
+def test_updated_appends_rows_and_reads_flipped_flags():
+    table = AgentTable(AGENTS)
+    grown = pd.concat([AGENTS, pd.DataFrame({
+        "Agent Type": ["Taxi", "Pharmacy"], "Name": ["T1", "P4"], "Rate": [3.0, 4.9],
+        "IP Address": ["10.0.0.6", "10.0.0.7"], "Port": [8006, 8007], "Active": [True, True],
+    })], ignore_index=True)
+    grown.loc[0, "Active"] = False
+    grown.loc[4, "Active"] = True
+    updated = table.updated(grown, flipped=[0, 4])
+    full = AgentTable(grown)
+    assert updated.size == full.size == 7
+    for types in (["Pharmacy"], ["Taxi", "Doctor"], ["Hotel"]):
+        assert updated.select(types, by_rate=True).tolist() == full.select(types, by_rate=True).tolist()
+    assert updated.type_counts() == full.type_counts()
+    assert updated.select(["Pharmacy"], person_block=[("P4", ("10.0.0.7", "8007"))]).tolist() == [2, 4]
+    # The original table is left unchanged
+    assert table.select(["Pharmacy"]).tolist() == [0, 2]
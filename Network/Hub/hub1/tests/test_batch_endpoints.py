@@ -0,0 +1,127 @@
+import importlib
+import json
+import os
+import shutil
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from registry import ROLE_PUBLIC
+
+HUB_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT = ("127.0.0.1", 50000)  # the IP Reza Pharmacy and the other local agents are registered with
+TAXI = {"Agent Type": "Taxi", "Rate": "4", "Port": "9000", "Active": "TRUE", "Description": "A taxi."}
+
+
+@pytest.fixture(scope="module")
+def hub(tmp_path_factory):
+    # main.py reads config.json and the registry from the working directory when imported
+    folder = tmp_path_factory.mktemp("hub")
+    for name in ("config.json", "Hub_properties.csv", "Private_Agent_properties.csv", "Public_Agent_properties.csv"):
+        shutil.copy(os.path.join(HUB_DIRECTORY, name), folder)
+    with open(folder / "config.json") as file:
+        config = json.load(file)
+    config.update({"api_key": "test", "gossip_interval": 0, "health_probe_interval": 0, "lease_sweep_interval": 0,
+                   "registry_store": {"backend": "sqlite", "path": "registry.db"},
+                   "snapshot": {"path": "", "interval": 0}})
+    config["llm"] = dict(config.get("llm") or {}, backend="stub", cache_path="")
+    with open(folder / "config.json", "w") as file:
+        json.dump(config, file)
+    cwd = os.getcwd()
+    os.chdir(folder)
+    sys.modules.pop("main", None)
+    try:
+        main = importlib.import_module("main")
+        yield main
+        main.registry.close()
+    finally:
+        sys.modules.pop("main", None)
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(hub):
+    return TestClient(hub.app, client=CLIENT)
+
+
+def statuses(response) -> list:
+    assert response.status_code == 200
+    return [result["status"] for result in response.json()["results"]]
+
+
+def test_add_agents_reports_every_item(client, hub):
+    items = [
+        {"name_agent": "Batch Taxi", "type_agent": "Public", "extra_columns": TAXI},
+        {"name_agent": "Reza Pharmacy", "type_agent": "Public"},
+        {"name_agent": "Batch Taxi", "type_agent": "Public", "extra_columns": TAXI},
+        {"type_agent": "Public"},
+        {"name_agent": "Typeless", "type_agent": ["Public"]},
+        {"name_agent": "Mapped", "type_agent": {"Public": 1}},
+        {"name_agent": "Unknown role", "type_agent": "Secret"},
+        {"name_agent": "Bad columns", "type_agent": "Public", "extra_columns": ["Taxi"]},
+    ]
+    response = client.post("/add_agents", json=items)
+    assert statuses(response) == ["created", "exists", "exists", "invalid", "invalid", "invalid", "invalid", "invalid"]
+    assert response.json()["counts"] == {"created": 1, "exists": 2, "invalid": 5}
+    assert hub.registry.is_agent_exist(CLIENT[0], "Batch Taxi", ROLE_PUBLIC)
+    assert not hub.registry.is_agent_exist(CLIENT[0], "Typeless", ROLE_PUBLIC)
+
+
+def test_add_agents_reads_ndjson(client, hub):
+    lines = [{"name_agent": f"Line Taxi {i}", "type_agent": "Public", "extra_columns": TAXI} for i in range(3)]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+    response = client.post("/add_agents", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert statuses(response) == ["created"] * 3
+    assert all(hub.registry.is_agent_exist(CLIENT[0], f"Line Taxi {i}", ROLE_PUBLIC) for i in range(3))
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ('{"name_agent": "Not a list"}', "application/json"),
+    ("[1, 2]", "application/json"),
+    ("[{", "application/json"),
+    ('{"name_agent": "A"}\nnot json\n', "application/x-ndjson"),
+])
+def test_malformed_batches_are_rejected(client, body, content_type):
+    response = client.post("/add_agents", content=body, headers={"Content-Type": content_type})
+    assert response.status_code == 400
+
+
+def test_add_agents_is_one_transaction(client, hub):
+    registry = hub.registry
+    rows = len(registry.store.load(ROLE_PUBLIC))
+    insert, calls = registry.store.insert, []
+
+    def failing_insert(role, position, row):
+        calls.append(row)
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        insert(role, position, row)
+
+    registry.store.insert = failing_insert
+    try:
+        with pytest.raises(RuntimeError):
+            client.post("/add_agents", json=[{"name_agent": f"Atomic Taxi {i}", "type_agent": "Public", "extra_columns": TAXI}
+                                             for i in range(3)])
+    finally:
+        registry.store.insert = insert
+    # The first insert was rolled back with the failed one, in the store and in memory
+    assert len(registry.store.load(ROLE_PUBLIC)) == rows
+    assert not registry.is_agent_exist(CLIENT[0], "Atomic Taxi 0", ROLE_PUBLIC)
+
+
+def test_activation_batch_reports_every_item(client, hub):
+    items = [
+        {"name_agent": "Reza Pharmacy", "boolean": False},
+        {"name_agent": "Nobody", "boolean": True},
+        {"name_agent": "Almas Hotel", "boolean": "false"},
+        {"boolean": True},
+    ]
+    response = client.put("/activation_status/batch", json=items)
+    assert statuses(response) == ["updated", "not_found", "invalid", "invalid"]
+    assert not hub.registry.is_active(CLIENT[0], "Reza Pharmacy")
+    assert hub.registry.is_active(CLIENT[0], "Almas Hotel")
+    body = json.dumps({"name_agent": "Reza Pharmacy", "boolean": True}) + "\n"
+    response = client.put("/activation_status/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert statuses(response) == ["updated"]
+    assert hub.registry.is_active(CLIENT[0], "Reza Pharmacy")
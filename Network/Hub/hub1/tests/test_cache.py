@@ -0,0 +1,36 @@
+import time
+
+from cache import SearchCache, TTLCache, normalize_block_list, normalize_prompt
+
+
+def test_prompts_and_block_lists_are_normalized():
+    assert normalize_prompt("Can you  find Pharmacies ?") == normalize_prompt("can you find pharmacies?")
+    first = [("Hub2", ("127.0.0.1", "8002")), ("Hub3", ("127.0.0.1", 8003))]
+    assert normalize_block_list(first) == normalize_block_list(list(reversed(first)))
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # "b" is the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_search_cache_is_dropped_when_the_registry_version_changes():
+    cache = SearchCache(maxsize=8, ttl=60)
+    cache.sync_version(1)
+    cache.types.put(cache.type_key("pharmacy", 1), ["Pharmacy"])
+    cache.results.put(cache.result_key("pharmacy", None, 1), {"status": "Find"})
+    cache.sync_version(1)
+    assert cache.types.get(cache.type_key("pharmacy", 1)) == ["Pharmacy"]
+    assert cache.results.get(cache.result_key("Pharmacy ", [], 1)) == {"status": "Find"}
+    cache.sync_version(2)
+    assert cache.types.get(cache.type_key("pharmacy", 1)) is None
+    assert cache.results.get(cache.result_key("pharmacy", None, 1)) is None
+    assert cache.stats()["registry_version"] == 2
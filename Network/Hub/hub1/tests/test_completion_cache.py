@@ -0,0 +1,44 @@
+import asyncio
+
+from completion_cache import CompletionCache
+from llm_gateway import LLMGateway
+from model import Hub
+
+
+class ScriptedBackend:
+    """Backend answering with the next scripted completion."""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    async def complete(self, model, messages, **params):
+        self.calls += 1
+        return self.answers.pop(0)
+
+
+def test_unparseable_answer_is_not_cached(tmp_path):
+    backend = ScriptedBackend(["not json", '{"agents": []}', "unused"])
+    gateway = LLMGateway(backend, cache=CompletionCache(str(tmp_path / "cache.db")))
+    messages = [{"role": "user", "content": "find a pharmacy"}]
+
+    async def ask():
+        return await gateway.acomplete(messages, cache=True, cache_check=Hub._holds_json)
+
+    try:
+        assert asyncio.run(ask()) == "not json"
+        assert asyncio.run(ask()) == '{"agents": []}'
+        assert asyncio.run(ask()) == '{"agents": []}'  # answered from the cache
+    finally:
+        gateway.close()
+    assert backend.calls == 2
+    assert gateway.stats.cache_rejected == 1
+
+
+def test_entries_expire(tmp_path):
+    cache = CompletionCache(str(tmp_path / "cache.db"), ttl=0.0)
+    cache.put("key", "model", "answer")
+    assert cache.get("key") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["entries"] == 0
+    cache.close()
@@ -0,0 +1,92 @@
+import asyncio
+
+from federation import FEDERATION_FIRST, FEDERATION_MERGE, fan_out, iter_fan_out, merge_responses, merge_top_k
+
+HUB2 = ("Hub2", ("127.0.0.1", "8002"))
+HUB3 = ("Hub3", ("127.0.0.1", "8003"))
+HUB4 = ("Hub4", ("127.0.0.1", "8004"))
+
+
+class Friends:
+    """Friend hubs answering after a per-hub delay, recording which requests were cancelled."""
+
+    def __init__(self, answers: dict) -> None:
+        self.answers = answers
+        self.cancelled = []
+
+    async def ask(self, friend):
+        delay, response = self.answers[friend[0]]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(friend[0])
+            raise
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+FIND = {"status": "Find", "agents": [{"name": "Taxi"}]}
+NOT_FOUND = {"status": "Not Found", "agents": []}
+
+
+def test_first_mode_returns_the_first_find_and_cancels_the_rest():
+    friends = Friends({"Hub2": (0.05, NOT_FOUND), "Hub3": (0.1, FIND), "Hub4": (5.0, FIND)})
+    answers = asyncio.run(fan_out([HUB2, HUB3, HUB4], friends.ask, mode=FEDERATION_FIRST))
+    assert [friend[0] for friend, _ in answers] == ["Hub2", "Hub3"]
+    assert friends.cancelled == ["Hub4"]
+
+
+def test_deadline_cancels_the_slow_friends():
+    friends = Friends({"Hub2": (0.01, NOT_FOUND), "Hub3": (5.0, FIND), "Hub4": (0.02, RuntimeError("refused"))})
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        answers = await fan_out([HUB2, HUB3, HUB4], friends.ask, mode=FEDERATION_MERGE, deadline=0.1)
+        return answers, asyncio.get_running_loop().time() - start
+
+    answers, elapsed = asyncio.run(run())
+    assert elapsed < 1.0
+    assert dict((friend[0], response["status"]) for friend, response in answers) == {"Hub2": "Not Found", "Hub4": "error"}
+    assert friends.cancelled == ["Hub3"]
+
+
+def test_stopping_the_iteration_cancels_the_pending_requests():
+    friends = Friends({"Hub2": (0.01, FIND), "Hub3": (5.0, FIND)})
+
+    async def run():
+        stream = iter_fan_out([HUB2, HUB3], friends.ask)
+        async for friend, _ in stream:
+            assert friend == HUB2
+            break
+        await stream.aclose()
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert friends.cancelled == ["Hub3"]
+
+
+def test_merge_responses_keeps_the_agents_found():
+    merged = merge_responses([(HUB2, FIND), (HUB3, NOT_FOUND), (HUB4, FIND)])
+    assert merged == {"status": "Find", "agents": [{"name": "Taxi"}, {"name": "Taxi"}]}
+    assert merge_responses([(HUB3, NOT_FOUND)])["status"] == "Not Found"
+
+
+def agent(name, relevance, goodness, port="9000"):
+    return {"name": name, "relevance_rate": relevance, "goodness_rate": goodness, "location": {"ip": "10.0.0.1", "port": port}}
+
+
+def test_merge_top_k_normalizes_rates_and_dedupes_agents():
+    answers = [
+        (HUB2, {"status": "Find", "agents": [agent("A", 5, 5), agent("B", 3, 5)]}),
+        # Rates on a 0-100 scale are divided by the best rate of that hub, not clipped to 5
+        (HUB3, {"status": "Find", "agents": [agent("C", 5, 100), agent("D", 5, 50)]}),
+        # The same agent from another hub keeps its best score once
+        (HUB4, {"status": "Find", "agents": [agent("A", 1, 0), "not an agent"]}),
+        (("Hub5", ("127.0.0.1", "8005")), NOT_FOUND),
+    ]
+    merged = merge_top_k(answers, k=3)
+    assert merged["status"] == "Find"
+    assert [(found["name"], found["hub"], found["score"]) for found in merged["agents"]] == [
+        ("A", "Hub2", 1.0), ("C", "Hub3", 1.0), ("D", "Hub3", 0.85)]
+    assert merge_top_k([(HUB2, NOT_FOUND)]) == {"status": "Not Found", "agents": []}
@@ -0,0 +1,63 @@
+import asyncio
+from types import SimpleNamespace
+
+from health import CLOSED, HALF_OPEN, HealthTracker
+from model import Hub
+
+FRIEND = ("Hub2", ("127.0.0.1", "8002"))
+
+
+class HangingTransport:
+    """Transport whose requests never answer, until cancelled."""
+
+    async def apost(self, *args, **kwargs):
+        await asyncio.Event().wait()
+
+    async def aget(self, *args, **kwargs):
+        await asyncio.Event().wait()
+
+
+def open_breaker(**kwargs) -> HealthTracker:
+    tracker = HealthTracker(failure_threshold=1, open_seconds=0.0, **kwargs)
+    tracker.record(FRIEND, 0.1, ok=False)
+    return tracker
+
+
+def fake_hub(tracker: HealthTracker) -> SimpleNamespace:
+    return SimpleNamespace(name="Hub1", transport=HangingTransport(), peer_health=tracker,
+                           metrics=SimpleNamespace(observe=lambda *args, **kwargs: None), friend_timeout=30.0, gossip_timeout=5.0)
+
+
+async def cancel_after_start(coroutine) -> None:
+    task = asyncio.ensure_future(coroutine)
+    await asyncio.sleep(0.01)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def test_cancelled_search_trial_is_released():
+    tracker = open_breaker()
+    assert tracker.order([FRIEND]) == [FRIEND]  # the search takes the half-open trial
+    assert tracker.order([FRIEND]) == []
+    hub = fake_hub(tracker)
+    asyncio.run(cancel_after_start(Hub._ask_friend(hub, "prompt", FRIEND, [], [], "request", 1)))
+    assert tracker.stats()["peers"]["Hub2"]["state"] == HALF_OPEN
+    assert tracker.due_probes([FRIEND]) == [FRIEND]
+
+
+def test_cancelled_probe_trial_is_released():
+    tracker = open_breaker()
+    assert tracker.due_probes([FRIEND]) == [FRIEND]
+    asyncio.run(cancel_after_start(Hub.probe_friend(fake_hub(tracker), FRIEND)))
+    assert tracker.order([FRIEND]) == [FRIEND]
+
+
+def test_stale_trial_is_handed_out_again():
+    tracker = open_breaker(trial_seconds=0.0)
+    assert tracker.due_probes([FRIEND]) == [FRIEND]
+    assert tracker.due_probes([FRIEND]) == [FRIEND]  # the first trial never answered
+    tracker.record(FRIEND, 0.1, ok=True)
+    assert tracker.stats()["peers"]["Hub2"]["state"] == CLOSED
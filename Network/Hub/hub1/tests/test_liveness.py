@@ -0,0 +1,80 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from liveness import LeaseTable, SQLiteLeaseTable
+from model import Hub
+from registry import AgentRegistry
+
+AGENT = ("10.0.0.7", "Reza Pharmacy")
+
+
+def test_leases_expire_once_in_expiry_order():
+    leases = LeaseTable(default_ttl=10, max_ttl=20)
+    now = time.monotonic()
+    assert leases.renew(AGENT) == 10
+    assert leases.renew(("10.0.0.8", "Almas Hotel"), ttl=1000) == 20  # capped at max_ttl
+    assert leases.expired(now + 5) == []
+    assert leases.expired(now + 11) == [AGENT]
+    assert leases.expired(now + 11) == []
+    assert leases.expired(now + 21) == [("10.0.0.8", "Almas Hotel")]
+    assert leases.stats()["expirations"] == 2
+
+
+def test_a_renewal_replaces_the_old_expiry():
+    leases = LeaseTable(default_ttl=10)
+    now = time.monotonic()
+    leases.renew(AGENT, ttl=1)
+    leases.renew(AGENT, ttl=10)
+    # The heap entry of the first lease is skipped: the agent is still alive
+    assert leases.expired(now + 5) == []
+    assert leases.has_lease(AGENT)
+    leases.release(AGENT)
+    assert leases.expired(now + 11) == []
+
+
+def test_stale_heap_entries_are_compacted():
+    leases = LeaseTable()
+    for _ in range(200):
+        leases.renew(AGENT)
+    assert leases.stats()["heap_entries"] < 70
+
+
+def test_sqlite_leases_expire_once(tmp_path):
+    leases = SQLiteLeaseTable(str(tmp_path / "leases.db"), default_ttl=10)
+    other = SQLiteLeaseTable(str(tmp_path / "leases.db"))  # another worker of the same hub
+    leases.renew(AGENT)
+    assert other.has_lease(AGENT)
+    assert leases.expired(time.time() + 5) == []
+    assert other.expired(time.time() + 11) == [AGENT]
+    assert leases.expired(time.time() + 11) == []
+
+
+def lease_hub(folder) -> SimpleNamespace:
+    (folder / "Hub_properties.csv").write_text("Agent Name,IP Address,Port,Active\n")
+    (folder / "Private_Agent_properties.csv").write_text("IP Address,Agent Name\n")
+    (folder / "Public_Agent_properties.csv").write_text(
+        "Agent Type,Name,Rate,IP Address,Port,Active,Description\n"
+        "Pharmacy,Reza Pharmacy,4.6,10.0.0.7,8020,TRUE,A pharmacy.\n")
+    registry = AgentRegistry(str(folder), flush_interval=60)
+    hub = SimpleNamespace(registry=registry, leases=LeaseTable(default_ttl=0.05), lease_sweep_interval=0.01)
+    hub.sweep_leases = lambda: Hub.sweep_leases(hub)
+    return hub
+
+
+def test_sweeper_deactivates_silent_agents_and_heartbeats_reactivate_them(tmp_path):
+    hub = lease_hub(tmp_path)
+    assert Hub.heartbeat(hub, [(*AGENT, None), ("10.0.0.9", "Unknown", None)]) == [0.05, None]
+
+    async def sweep_for(seconds):
+        task = asyncio.ensure_future(Hub.lease_sweep_loop(hub))
+        await asyncio.sleep(seconds)
+        task.cancel()
+
+    asyncio.run(sweep_for(0.2))
+    assert not hub.registry.is_active(*AGENT)
+    assert not hub.leases.has_lease(AGENT)
+    # The next heartbeat starts a new lease and marks the agent active again
+    assert Hub.heartbeat(hub, [(*AGENT, 30)]) == [30.0]
+    assert hub.registry.is_active(*AGENT)
+    hub.registry.close()
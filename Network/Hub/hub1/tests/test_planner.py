@@ -0,0 +1,55 @@
+import pytest
+
+from planner import PLAN_FEDERATE, PLAN_LLM, PLAN_RATE, QueryPlanner
+from prompt_tables import PromptTables
+from registry import AgentRegistry
+
+PUBLIC = (
+    "Agent Type,Name,Rate,IP Address,Port,Active,Description\n"
+    "Pharmacy,Reza Pharmacy,4.6,10.0.0.7,8020,TRUE,A pharmacy.\n"
+    "Doctor,Bob Clinic,4.0,10.0.0.8,8021,TRUE,A clinic.\n"
+    "Doctor,Dani Clinic,4.8,10.0.0.9,8025,TRUE,A clinic.\n"
+    "Hotel,Almas Hotel,5,10.0.0.10,8030,FALSE,A hotel.\n"
+)
+
+
+@pytest.fixture
+def tables(tmp_path):
+    (tmp_path / "Hub_properties.csv").write_text("Agent Name,IP Address,Port,Active\n")
+    (tmp_path / "Private_Agent_properties.csv").write_text("IP Address,Agent Name\n")
+    (tmp_path / "Public_Agent_properties.csv").write_text(PUBLIC)
+    registry = AgentRegistry(str(tmp_path), flush_interval=60)
+    yield PromptTables(registry)
+    registry.close()
+
+
+def test_plan_choice_follows_the_candidates(tables):
+    planner = QueryPlanner(tables, direct_max_candidates=1, direct_relevance_rate=4)
+    # Nothing retrieved (the only hotel is inactive): straight to the friend hubs
+    plan = planner.plan(tables.agents_for_types(["Hotel"]))
+    assert plan.decision == PLAN_FEDERATE
+    assert plan.response == {"status": "Not Found", "agents": []}
+    # One candidate: answered without the LLM, shaped like its ranking
+    plan = planner.plan(tables.agents_for_types(["Pharmacy"]))
+    assert plan.decision == PLAN_RATE
+    assert plan.response["agents"][0]["name"] == "Reza Pharmacy"
+    assert plan.response["agents"][0]["relevance_rate"] == 4
+    # More candidates than direct_max_candidates: the LLM ranks them
+    plan = planner.plan(tables.agents_for_types(["Doctor"]))
+    assert plan.decision == PLAN_LLM
+    assert plan.response is None and len(plan.rows) == 2
+    assert planner.stats()["decisions"] == {PLAN_FEDERATE: 1, PLAN_RATE: 1, PLAN_LLM: 1}
+
+
+def test_rate_plans_need_a_single_agent_type(tables):
+    planner = QueryPlanner(tables, direct_max_candidates=3)
+    plan = planner.plan(tables.agents_for_types(["Doctor"]))
+    assert plan.decision == PLAN_RATE
+    assert [agent["name"] for agent in plan.response["agents"]] == ["Dani Clinic", "Bob Clinic"]
+    assert planner.plan(tables.agents_for_types(["Doctor", "Pharmacy"])).decision == PLAN_LLM
+
+
+def test_a_disabled_planner_always_asks_the_llm(tables):
+    planner = QueryPlanner(tables, enabled=False)
+    assert planner.plan([]).decision == PLAN_LLM
+    assert planner.stats()["saved_ratio"] == 0.0
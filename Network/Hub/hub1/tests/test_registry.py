@@ -0,0 +1,70 @@
+from registry import CHANGE_ACTIVE, ITEM_UPDATED, ROLE_FRIEND, ROLE_PRIVATE, ROLE_PUBLIC, AgentRegistry
+
+TABLES = {
+    "Hub_properties.csv": "Agent Name,IP Address,Port,Active\nHub2,10.0.0.2,8002,TRUE\n",
+    "Private_Agent_properties.csv": "IP Address,Agent Name\n10.0.0.5,Chief\n10.0.0.9,Both\n",
+    "Public_Agent_properties.csv": (
+        "Agent Type,Name,Rate,IP Address,Port,Active,Description\n"
+        "Pharmacy,Reza Pharmacy,4.6,10.0.0.7,8020,TRUE,A pharmacy.\n"
+        "Hotel,Almas Hotel,5,10.0.0.8,8025,FALSE,A hotel.\n"
+        "Taxi,Both,4,10.0.0.9,8030,TRUE,A taxi.\n"
+    ),
+}
+
+
+def open_registry(folder) -> AgentRegistry:
+    for name, content in TABLES.items():
+        (folder / name).write_text(content)
+    return AgentRegistry(str(folder), flush_interval=60)
+
+
+def test_access_index_resolves_roles(tmp_path):
+    registry = open_registry(tmp_path)
+    assert registry.access_role("10.0.0.2", "Hub2") == ROLE_FRIEND
+    assert registry.access_role("10.0.0.5", "Chief") == ROLE_PRIVATE
+    assert registry.access_role("10.0.0.7", "Reza Pharmacy") == ROLE_PUBLIC
+    # A pair in several tables gets the role with the highest precedence
+    assert registry.access_role("10.0.0.9", "Both") == ROLE_PRIVATE
+    assert registry.is_agent_exist("10.0.0.9", "Both", ROLE_PUBLIC)
+    # The IP is part of the key
+    assert registry.access_role("10.0.0.8", "Reza Pharmacy") is None
+    assert not registry.is_agent_exist("10.0.0.7", "Reza Pharmacy", ROLE_PRIVATE)
+    registry.close()
+
+
+def test_mutations_keep_the_index_in_sync(tmp_path):
+    registry = open_registry(tmp_path)
+    registry.add_agent("10.0.0.10", "New Taxi", ROLE_PUBLIC,
+                       {"Agent Type": "Taxi", "Rate": "4", "Port": "9000", "Active": "TRUE", "Description": "d"})
+    # Indexed while the row is still buffered, before the table is read again
+    assert registry.access_role("10.0.0.10", "New Taxi") == ROLE_PUBLIC
+    assert registry.is_active("10.0.0.10", "New Taxi")
+    assert registry.set_active("10.0.0.10", "New Taxi", False)
+    assert not registry.is_active("10.0.0.10", "New Taxi")
+    assert registry.set_active("10.0.0.8", "Almas Hotel", True)
+    assert registry.is_active("10.0.0.8", "Almas Hotel")
+    assert not registry.set_active("10.0.0.99", "Nobody", True)
+    assert len(registry.public) == 4
+    assert registry.public["Active"].tolist() == [True, True, True, False]
+    registry.close()
+
+    # The write-behind flush on close persisted the changes and the index is rebuilt the same
+    reloaded = AgentRegistry(str(tmp_path), flush_interval=60)
+    assert reloaded.access_role("10.0.0.10", "New Taxi") == ROLE_PUBLIC
+    assert not reloaded.is_active("10.0.0.10", "New Taxi")
+    assert reloaded.is_active("10.0.0.8", "Almas Hotel")
+    reloaded.close()
+
+
+def test_setting_the_same_flag_leaves_the_version_alone(tmp_path):
+    registry = open_registry(tmp_path)
+    version, _, _ = registry.table_since(ROLE_PUBLIC, None)
+    # A heartbeat of an agent already active changes nothing the caches depend on
+    assert registry.set_active("10.0.0.7", "Reza Pharmacy", True)
+    assert registry.set_active_many([("10.0.0.7", "Reza Pharmacy", True)]) == [ITEM_UPDATED]
+    assert registry.table_since(ROLE_PUBLIC, version)[0] == version
+    assert registry.set_active("10.0.0.7", "Reza Pharmacy", False)
+    new_version, _, changes = registry.table_since(ROLE_PUBLIC, version)
+    assert new_version > version
+    assert changes == [(CHANGE_ACTIVE, 0)]
+    registry.close()
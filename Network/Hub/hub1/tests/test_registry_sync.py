@@ -0,0 +1,45 @@
+import os
+import shutil
+
+from prompt_tables import PromptTables
+from registry import ROLE_PUBLIC, AgentRegistry
+from registry_store import make_registry_store
+from shared_registry import SharedRegistryFile
+
+HUB_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAXI = {"Agent Type": "Taxi", "Rate": "4", "Port": "9000", "Active": "TRUE", "Description": "A taxi."}
+
+
+def open_worker(folder: str) -> AgentRegistry:
+    # One worker process of a multi-worker hub: its own store connection and shared file handle
+    shared = SharedRegistryFile(os.path.join(folder, "registry.bin"), refresh_interval=0.0)
+    store = make_registry_store({"backend": "sqlite", "path": "registry.db"}, folder, lock=shared.writer)
+    return AgentRegistry(folder, store=store, shared=shared)
+
+
+def test_writes_of_another_worker_are_replayed(tmp_path):
+    for file_name in ("Hub_properties.csv", "Private_Agent_properties.csv", "Public_Agent_properties.csv"):
+        shutil.copy(os.path.join(HUB_DIRECTORY, file_name), tmp_path)
+    writer, reader = open_worker(str(tmp_path)), open_worker(str(tmp_path))
+    tables = PromptTables(reader)
+    types = len(tables.type_lines())
+    rows = len(reader.public)
+
+    writer.add_agent("10.9.9.9", "Taxi Nine", ROLE_PUBLIC, dict(TAXI, **{"Agent Type": "Night Taxi"}))
+    public = reader.public
+    agent = public[public["Active"]].iloc[0]
+    name, ip = agent["Name"], agent["IP Address"]
+    assert writer.set_active(ip, name, False)
+
+    assert reader.is_agent_exist("10.9.9.9", "Taxi Nine", ROLE_PUBLIC)
+    assert not reader.is_active(ip, name)
+    assert (reader.replayed, reader.reloads) == (2, 0)
+    assert reader.generation == writer.generation
+    # The prompt tables applied the two changes instead of being rebuilt
+    assert len(tables.type_lines()) == types + 1
+    selected = tables.agents_for_types(["Night Taxi", str(agent["Agent Type"])])
+    assert "Taxi Nine" in [row.key[0] for row in selected]
+    assert name not in [row.key[0] for row in selected]
+    assert len(reader.public) == rows + 1
+    writer.close()
+    reader.close()
@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+from cache import TTLCache
+from gossip import PeerCatalogs, build_digest
+from health import HealthTracker
+from model import Hub
+from planner import PLAN_LLM, SearchPlan
+
+HUB1 = ("Hub1", ("127.0.0.1", "8001"))
+HUB2 = ("Hub2", ("127.0.0.1", "8002"))
+HUB3 = ("Hub3", ("127.0.0.1", "8003"))
+
+
+def fake_hub(friends=()) -> SimpleNamespace:
+    return SimpleNamespace(name="Hub1", address="127.0.0.1", port="8001", hub_friends=list(friends),
+                           seen_requests=TTLCache(100, 60), duplicate_requests=0, federation_max_hops=4,
+                           peer_catalogs=PeerCatalogs(), peer_health=HealthTracker())
+
+
+def test_a_request_seen_before_is_rejected():
+    hub = fake_hub()
+    request_id, hops_left = Hub.admit_request(hub, None, None)
+    assert hops_left == 4
+    # The same search reaching the hub again through another friend is answered at once
+    assert Hub.admit_request(hub, request_id, 3) is None
+    assert hub.duplicate_requests == 1
+    assert Hub.admit_request(hub, "other", 3) == ("other", 3)
+
+
+def test_hops_are_capped_by_the_local_limit():
+    hub = fake_hub()
+    assert Hub.admit_request(hub, "far", 100) == ("far", 4)
+
+
+def test_no_friend_is_asked_without_hops_left():
+    hub = fake_hub([HUB2, HUB3])
+    friends, visited = Hub._friends_to_ask(hub, [HUB2], hops_left=0)
+    assert friends == []
+    assert visited == [HUB2, HUB1]
+
+
+def test_visited_hubs_are_not_asked_again():
+    hub = fake_hub([HUB2, HUB3])
+    # The caller already searched Hub2 (sent with an integer port): only Hub3 is asked
+    friends, visited = Hub._friends_to_ask(hub, [("Hub2", ("127.0.0.1", 8002))], hops_left=2)
+    assert friends == [HUB3]
+    assert [hub_name for hub_name, _ in visited] == ["Hub2", "Hub1", "Hub3"]
+
+
+def test_friends_are_routed_on_their_digests_only_with_local_candidates():
+    hub = fake_hub([HUB2, HUB3])
+    hub.peer_catalogs.update(HUB2, build_digest("Hub2", "127.0.0.1", "8002", 1, {"Taxi Booking": 2}, []))
+    hub.peer_catalogs.update(HUB3, build_digest("Hub3", "127.0.0.1", "8003", 1, {"Hotel Reservation": 1}, []))
+    candidates = SearchPlan(PLAN_LLM, rows=[object()])
+    friends, _ = Hub._friends_to_ask(hub, [], ["Taxi Booking"], hops_left=2, plan=candidates)
+    assert friends == [HUB2]
+    # No active local agent of the guessed type: the friends may name it otherwise, all are asked
+    friends, _ = Hub._friends_to_ask(hub, [], ["Taxi Booking"], hops_left=2, plan=SearchPlan(PLAN_LLM, rows=[]))
+    assert friends == [HUB2, HUB3]
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from retrieval import AgentTypeIndex, TfidfEncoder, tokenize
+
+AGENTS = pd.DataFrame({
+    "Agent Type": ["Pharmacy", "Pharmacy", "Hotel", "Doctor"],
+    "Description": ["Sells medications and prescription drugs.", "Open late for medicine.",
+                    "Rooms, breakfast and a spa.", "Cardiology clinic treating heart conditions."],
+})
+
+
+def test_tokenize_drops_stop_words_and_plurals():
+    assert tokenize("Can you find some Pharmacies for me?") == ["pharmacy"]
+    assert tokenize("hotels with rooms") == ["hotel", "room"]
+
+
+def test_search_ranks_the_matching_type_first():
+    index = AgentTypeIndex()
+    index.build(AGENTS)
+    assert index.search("I need a pharmacy for my prescription", top_k=1)[0][0] == "Pharmacy"
+    assert index.search("a doctor for my heart", top_k=1)[0][0] == "Doctor"
+    # min_score drops the types that do not match at all
+    assert [agent_type for agent_type, _ in index.search("hotel spa", top_k=3, min_score=0.1)] == ["Hotel"]
+
+
+def test_type_scores_keep_the_best_agent_of_each_type():
+    index = AgentTypeIndex(TfidfEncoder())
+    index.build(AGENTS)
+    scores = index.type_scores("medicine open late")
+    assert set(scores) == {"Pharmacy", "Hotel", "Doctor"}
+    assert scores["Pharmacy"] == max(index.agent_scores("medicine open late")[:2])
+    assert scores["Pharmacy"] > scores["Hotel"]
+
+
+def test_ensure_encodes_appended_agents_only_when_the_table_grew():
+    index = AgentTypeIndex()
+    index.ensure(AGENTS)
+    grown = pd.concat([AGENTS, pd.DataFrame({"Agent Type": ["Taxi"], "Description": ["Airport rides."]})],
+                      ignore_index=True)
+    index.ensure(grown)
+    full = AgentTypeIndex()
+    full.build(grown)
+    assert (index.agent_scores("taxi to the airport") == full.agent_scores("taxi to the airport")).all()
+    assert index.search("taxi to the airport", top_k=1)[0][0] == "Taxi"
+    # A table that is not an extension of the indexed one is encoded again
+    index.ensure(AGENTS.iloc[::-1].reset_index(drop=True))
+    assert list(index._types) == ["Doctor", "Hotel", "Pharmacy", "Pharmacy"]
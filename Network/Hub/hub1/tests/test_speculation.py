@@ -0,0 +1,83 @@
+import asyncio
+
+from cache import TTLCache
+from federation import FEDERATION_FIRST
+from gossip import PeerCatalogs
+from health import HealthTracker
+from model import Hub
+from planner import PLAN_LLM, PLAN_RATE, SearchPlan
+
+HUB2 = ("Hub2", ("127.0.0.1", "8002"))
+HUB3 = ("Hub3", ("127.0.0.1", "8003"))
+HUB4 = ("Hub4", ("127.0.0.1", "8004"))
+
+FIND = {"status": "Find", "agents": [{"name": "Local"}]}
+NOT_FOUND = {"status": "Not Found", "agents": []}
+
+
+def speculating_hub(local_delay: float, local_response: dict, friend_delay: float = 5.0) -> Hub:
+    """A hub with three friends whose local ranking and friend requests take fixed times."""
+    hub = Hub.__new__(Hub)
+    hub.name, hub.address, hub.port = "Hub1", "127.0.0.1", "8001"
+    hub.hub_friends = [HUB2, HUB3, HUB4]
+    hub.peer_catalogs, hub.peer_health = PeerCatalogs(), HealthTracker()
+    hub.seen_requests, hub.duplicate_requests = TTLCache(100, 60), 0
+    hub.federation_mode, hub.federation_max_hops, hub.federation_deadline = FEDERATION_FIRST, 4, 10.0
+    hub.speculative_federation, hub.speculative_max_candidates, hub.speculative_max_friends = True, 3, 2
+    hub.speculative_delay, hub.speculative_max_inflight = 0.0, 8
+    hub.speculation = {"started": 0, "sent": 0, "used": 0, "discarded": 0, "cancelled": 0, "skipped_busy": 0}
+    hub._speculating = 0
+    hub.asked, hub.cancelled = [], []
+
+    async def search_local(chat_dictionary, prompt, person_block=None, plan=None):
+        await asyncio.sleep(local_delay)
+        return dict(local_response)
+
+    async def ask_friend(prompt, friend, visited, person_block, request_id=None, hops_left=None, mode=None, top_k=None):
+        hub.asked.append(friend[0])
+        try:
+            await asyncio.sleep(friend_delay)
+        except asyncio.CancelledError:
+            hub.cancelled.append(friend[0])
+            raise
+        return {"status": "Find", "agents": [{"name": f"{friend[0]} agent"}]}
+
+    hub._search_local, hub._ask_friend = search_local, ask_friend
+    return hub
+
+
+def weak_plan() -> SearchPlan:
+    return SearchPlan(PLAN_LLM, rows=[])
+
+
+def test_a_local_hit_cancels_the_speculative_requests():
+    hub = speculating_hub(local_delay=0.05, local_response=FIND)
+
+    async def run():
+        response = await hub.hub_search_agent([], "taxi", plan=weak_plan())
+        await asyncio.sleep(0)  # let the cancelled requests unwind
+        return response
+
+    assert asyncio.run(run()) == FIND
+    assert hub.asked == ["Hub2", "Hub3"]  # the first speculative_max_friends friends only
+    assert sorted(hub.cancelled) == ["Hub2", "Hub3"]
+    assert hub.speculation == {"started": 1, "sent": 1, "used": 0, "discarded": 1, "cancelled": 1, "skipped_busy": 0}
+    assert hub._speculating == 0
+
+
+def test_a_local_miss_uses_the_speculative_answers():
+    hub = speculating_hub(local_delay=0.05, local_response=NOT_FOUND, friend_delay=0.01)
+    response = asyncio.run(hub.hub_search_agent([], "taxi", plan=weak_plan()))
+    assert response["status"] == "Find"
+    assert response["agents"][0]["name"] in ("Hub2 agent", "Hub3 agent")
+    # A speculative friend already found an agent: the other friend is not asked
+    assert hub.asked == ["Hub2", "Hub3"]
+    assert hub.speculation["used"] == 1
+
+
+def test_searches_answered_by_the_planner_do_not_speculate():
+    hub = speculating_hub(local_delay=0.0, local_response=FIND)
+    plan = SearchPlan(PLAN_RATE, rows=[], response=FIND)
+    assert asyncio.run(hub.hub_search_agent(None, "taxi", plan=plan)) == FIND
+    assert hub.asked == []
+    assert hub.speculation["started"] == 0
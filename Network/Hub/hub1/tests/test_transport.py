@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+from transport import HostStats, Transport
+
+
+def mocked(handler) -> Transport:
+    """Transport whose host pools answer with `handler`, without backoff delays."""
+    transport = Transport(retries=2, backoff=0.0)
+    transport._stats["http://peer"] = HostStats()
+    transport._client = lambda host: httpx.Client(transport=httpx.MockTransport(handler))
+    transport._async_client = lambda host: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return transport
+
+
+def counting(outcome):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        return outcome(request)
+
+    return handler, calls
+
+
+def unavailable(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(503)
+
+
+def dropped(request: httpx.Request) -> httpx.Response:
+    raise httpx.RemoteProtocolError("Server disconnected without sending a response.", request=request)
+
+
+def refused(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("Connection refused", request=request)
+
+
+def test_post_is_not_retried_after_503():
+    handler, calls = counting(unavailable)
+    transport = mocked(handler)
+    assert transport.post("http://peer/search_agent").status_code == 503
+    assert asyncio.run(transport.apost("http://peer/search_agent")).status_code == 503
+    assert calls == ["POST", "POST"]
+
+
+def test_post_is_not_retried_after_a_dropped_connection():
+    handler, calls = counting(dropped)
+    transport = mocked(handler)
+    with pytest.raises(httpx.RemoteProtocolError):
+        transport.post("http://peer/add_agent")
+    with pytest.raises(httpx.RemoteProtocolError):
+        asyncio.run(transport.apost("http://peer/add_agent"))
+    assert calls == ["POST", "POST"]
+
+
+def test_post_is_retried_when_the_connection_fails():
+    handler, calls = counting(refused)
+    transport = mocked(handler)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(transport.apost("http://peer/search_agent"))
+    assert len(calls) == 3
+
+
+def test_get_is_retried_after_503_and_dropped_connection():
+    for outcome, attempts in ((unavailable, 3), (dropped, 3)):
+        handler, calls = counting(outcome)
+        transport = mocked(handler)
+        try:
+            asyncio.run(transport.aget("http://peer/ping"))
+        except httpx.RemoteProtocolError:
+            pass
+        assert len(calls) == attempts
@@ -0,0 +1,264 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# Errors raised before the request was sent, safe to retry for any method
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# A dropped connection or a gateway error may come after the peer processed the request:
+# only idempotent methods are retried after them (a retried POST /search_agent would be
+# answered "Not Found" by the dedup of the friend, a retried POST /add_agent registers twice)
+_COUNTED_ERRORS = _CONNECT_ERRORS + (httpx.RemoteProtocolError,)
+_RETRYABLE_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def _retry_policy(method: str) -> tuple:
+    # (errors, statuses) retried for a request method
+    if method.upper() in IDEMPOTENT_METHODS:
+        return _COUNTED_ERRORS, _RETRYABLE_STATUSES
+    return _CONNECT_ERRORS, ()
+
+
+class HostStats:
+    """
+    Counters of one host pool: requests, connection reuse, pool wait time, retries and errors.
+    """
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.new_connections = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.retries = 0
+        self.errors = 0
+
+    def as_dict(self, open_connections: int) -> Dict[str, Any]:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "open_connections": open_connections,
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            "avg_wait_time": self.wait_time / self.requests if self.requests else 0.0,
+            "max_wait_time": self.max_wait_time,
+            "retries": self.retries,
+            "errors": self.errors,
+        }
+
+
+class _Trace:
+    """
+    httpcore trace hook measuring how long a request waited for a connection and whether
+    it opened a new one.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.wait: Optional[float] = None
+        self.new_connection = False
+
+    def on_event(self, event_name: str) -> None:
+        if event_name == "connection.connect_tcp.started":
+            self.new_connection = True
+        if self.wait is None and (event_name == "connection.connect_tcp.started"
+                                  or event_name.endswith("send_request_headers.started")):
+            self.wait = time.perf_counter() - self.start
+
+    def sync_hook(self, event_name: str, info: dict) -> None:
+        self.on_event(event_name)
+
+    async def async_hook(self, event_name: str, info: dict) -> None:
+        self.on_event(event_name)
+
+
+class Transport:
+    """
+    Shared HTTP transport for every inter-node call (hub to hub, agent to hub, agent to agent).
+
+    Each host gets its own keep-alive connection pool, for both blocking (httpx.Client) and
+    asyncio (httpx.AsyncClient) callers. Requests that fail to connect are retried with
+    exponential backoff; idempotent ones (GET, PUT, ...) also after a dropped connection
+    or a 502/503/504.
+    """
+
+    def __init__(self, timeout: float = 120.0, connect_timeout: float = 5.0,
+                 max_connections_per_host: int = 20, max_keepalive_per_host: int = 10,
+                 keepalive_expiry: float = 30.0, retries: int = 2, backoff: float = 0.2) -> None:
+        """
+        Args:
+            timeout (float): Default read/write timeout in seconds.
+            connect_timeout (float): Timeout to open a TCP connection.
+            max_connections_per_host (int): Upper bound of connections kept per host.
+            max_keepalive_per_host (int): Idle keep-alive connections kept per host.
+            keepalive_expiry (float): Seconds an idle connection stays open.
+            retries (int): Extra attempts after the first one.
+            backoff (float): Base delay of the exponential backoff, in seconds.
+        """
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout, pool=timeout)
+        self.limits = httpx.Limits(max_connections=max_connections_per_host,
+                                   max_keepalive_connections=max_keepalive_per_host,
+                                   keepalive_expiry=keepalive_expiry)
+        self.retries = retries
+        self.backoff = backoff
+        self._clients: Dict[str, httpx.Client] = {}
+        self._async_clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> "Transport":
+        """
+        Build a transport from the optional "transport" section of config.json.
+        """
+        return cls(**(config or {}))
+
+    # ------------------------------------------------------------------ pools
+
+    @staticmethod
+    def _host(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _client(self, host: str) -> httpx.Client:
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                client = httpx.Client(timeout=self.timeout, limits=self.limits)
+                self._clients[host] = client
+                self._stats.setdefault(host, HostStats())
+            return client
+
+    def _async_client(self, host: str) -> httpx.AsyncClient:
+        with self._lock:
+            client = self._async_clients.get(host)
+            if client is None:
+                client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+                self._async_clients[host] = client
+                self._stats.setdefault(host, HostStats())
+            return client
+
+    def _record(self, host: str, trace: _Trace) -> None:
+        with self._lock:
+            stats = self._stats[host]
+            stats.requests += 1
+            stats.new_connections += trace.new_connection
+            wait = trace.wait or 0.0
+            stats.wait_time += wait
+            stats.max_wait_time = max(stats.max_wait_time, wait)
+
+    def _count(self, host: str, field: str) -> None:
+        with self._lock:
+            setattr(self._stats[host], field, getattr(self._stats[host], field) + 1)
+
+    # --------------------------------------------------------------- requests
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a blocking request through the host pool, retrying transient failures.
+        """
+        host = self._host(url)
+        client = self._client(host)
+        user_extensions = kwargs.pop("extensions", None) or {}
+        retry_errors, retry_statuses = _retry_policy(method)
+        for attempt in range(self.retries + 1):
+            trace = _Trace()
+            extensions = dict(user_extensions, trace=trace.sync_hook)
+            try:
+                response = client.request(method, url, extensions=extensions, **kwargs)
+            except _COUNTED_ERRORS as e:
+                self._count(host, "errors")
+                if not isinstance(e, retry_errors) or attempt == self.retries:
+                    raise
+            else:
+                self._record(host, trace)
+                if response.status_code not in retry_statuses or attempt == self.retries:
+                    return response
+            self._count(host, "retries")
+            time.sleep(self.backoff * (2 ** attempt))
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request from asyncio code through the host pool, retrying transient failures.
+        """
+        host = self._host(url)
+        client = self._async_client(host)
+        user_extensions = kwargs.pop("extensions", None) or {}
+        retry_errors, retry_statuses = _retry_policy(method)
+        for attempt in range(self.retries + 1):
+            trace = _Trace()
+            extensions = dict(user_extensions, trace=trace.async_hook)
+            try:
+                response = await client.request(method, url, extensions=extensions, **kwargs)
+            except _COUNTED_ERRORS as e:
+                self._count(host, "errors")
+                if not isinstance(e, retry_errors) or attempt == self.retries:
+                    raise
+            else:
+                self._record(host, trace)
+                if response.status_code not in retry_statuses or attempt == self.retries:
+                    return response
+            self._count(host, "retries")
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", url, **kwargs)
+
+    # ---------------------------------------------------------------- metrics
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Pool metrics per host: open connections, reuse ratio, wait time, retries and errors.
+        """
+        with self._lock:
+            result = {}
+            for host, stats in self._stats.items():
+                open_connections = 0
+                for client in (self._clients.get(host), self._async_clients.get(host)):
+                    if client is not None:
+                        open_connections += _open_connections(client)
+                result[host] = stats.as_dict(open_connections)
+            return result
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            clients, self._async_clients = self._async_clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+def _open_connections(client) -> int:
+    pool = getattr(client._transport, "_pool", None)
+    connections = getattr(pool, "connections", None)
+    return len(connections) if connections is not None else 0
+
+
+_shared_transport: Optional[Transport] = None
+
+
+def shared_transport(config: Optional[dict] = None) -> Transport:
+    """
+    Return the process-wide transport, creating it from `config` on first use.
+    """
+    global _shared_transport
+    if _shared_transport is None:
+        _shared_transport = Transport.from_config(config)
+    return _shared_transport
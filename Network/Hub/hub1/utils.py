@@ -1,5 +1,10 @@
-import pandas as pd
-from typing import Any,List,Dict, NewType,Tuple
+import os
+from typing import TYPE_CHECKING, Any,List,Dict, NewType,Tuple
+
+# pandas is imported by the CSV helpers that use it, so that importing the prompt
+# helpers (make_chat_history, PromptTemplates) does not load it
+if TYPE_CHECKING:
+    import pandas as pd
 IP = NewType('IP address',str)
 Port = NewType('Port',str)
 Address = Tuple [IP,Port]
@@ -7,6 +12,7 @@ Name = NewType('Name',str)
 Friend = Tuple[Name,Address]
 
 def is_agent_exist(ip: str, agent_name: str, name_csv: str = "Public_Agent_properties.csv") -> bool:
+    import pandas as pd
     try:
         # Load the CSV file into a DataFrame
         df = pd.read_csv(name_csv)
@@ -25,6 +31,7 @@ def is_agent_exist(ip: str, agent_name: str, name_csv: str = "Public_Agent_prope
 
  
 def agent_activision(ip: str, agent: str, boolean: bool = False, name_csv: str = "Public_Agent_properties.csv") -> bool:
+    import pandas as pd
     try:
         # Load the CSV file into a DataFrame
         df = pd.read_csv(name_csv)
@@ -70,6 +77,7 @@ def mapping_ip_to_agent(ip: str, name_csv: str = "Public_Agent_properties.csv"):
     Returns:
     - str or None: The name of the agent corresponding to the IP address, or None if no match is found.
     """
+    import pandas as pd
     
     # Load the DataFrame from the CSV file
     try:
@@ -100,82 +108,48 @@ def read_file_as_strings(filename:str="system_prompt.txt"):
     except FileNotFoundError:
         print(f"Sorry, the file {filename} does not exist.")
         return "You are good assistant."
-def find_row_of_data_frame_by_type_agent(list_type: List[str], person_block: List[Friend], name_csv: str = "Public_Agent_properties.csv") -> pd.DataFrame:
+
+
+class PromptTemplates:
     """
-    Find rows in a DataFrame where the 'Agent Type' column matches any of the types in list_type,
-    the agent is active, and the agent's Name, IP Address, and Port do not match those from the person_block list.
-    
-    Parameters:
-    - list_type (list): A list of agent types to filter by.
-    - person_block (list): A list of tuples containing names and addresses of blocked persons.
-    - name_csv (str): The name of the CSV file to load into the DataFrame.
-    
-    Returns:
-    - DataFrame: A pandas DataFrame containing the filtered rows of active agents excluding the blocked ones.
+    Prompt files kept in memory, read again only when their modification time changes.
     """
-    
-    # Load the CSV into a DataFrame
-    df = pd.read_csv(name_csv)
-    
-    # Validate required columns
-    required_columns = ['Agent Type', 'Active', 'Name', 'IP Address', 'Port']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    
-    if missing_columns:
-        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
-    
-    # Filter by agent type and active status
-    filtered_df = df[(df['Agent Type'].isin(list_type)) & (df['Active'] == True)]
-    
-    # Exclude blocked persons if the list is provided
-    if person_block:
-        filtered_df = exclude_blocked_agents(filtered_df, person_block)
 
-    # Remove the 'Active' column before returning
-    return filtered_df.drop(columns=['Active'])
+    def __init__(self, templates: Dict[str, Tuple[int, str]] = None):
+        # filename -> (modification time in ns, content)
+        self._files: Dict[str, Tuple[int, str]] = dict(templates or {})
 
-def exclude_blocked_agents(df: pd.DataFrame, person_block: List[Friend]) -> pd.DataFrame:
-    """
-    Exclude rows from the DataFrame where the agent's 'Name', 'IP Address', and 'Port'
-    match any of the entries in the person_block list.
+    def get(self, filename: str = "system_prompt.txt") -> str:
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+        except OSError:
+            return read_file_as_strings(filename)
+        entry = self._files.get(filename)
+        if entry is None or entry[0] != mtime:
+            entry = self._files[filename] = (mtime, read_file_as_strings(filename))
+        return entry[1]
 
-    Parameters:
-    - df (DataFrame): The DataFrame to filter.
-    - person_block (list): A list of tuples containing names and addresses of blocked persons.
+    def export_state(self) -> Dict[str, Tuple[int, str]]:
+        return dict(self._files)
 
-    Returns:
-    - DataFrame: The filtered DataFrame.
-    """
-    
-    # Convert person_block into a DataFrame for merging
-    person_block_df = pd.DataFrame([(friend[0], friend[1][0], int(friend[1][1])) for friend in person_block], 
-                                   columns=['Name', 'IP Address', 'Port'])
-    print(10 * "*" + "block row person" + 10 * "*")
-    print(person_block)
-    # Perform a left merge and filter out matches (blocked agents)
-    merged_df = df.merge(person_block_df, on=['Name', 'IP Address', 'Port'], how='left', indicator=True)
-    
-    # Exclude rows that were matched in the merge (i.e., rows with '_merge' == 'both')
-    filtered_df = merged_df[merged_df['_merge'] == 'left_only'].drop(columns=['_merge'])
-    
-    print(10 * "*" + "filtered row person" + 10 * "*")
-    print(filtered_df)
-    
-    return filtered_df
 
-def generate_markdown_table(name_csv: str = "Public_Agent_properties.csv"):
+def generate_markdown_table(name_csv: str = "Public_Agent_properties.csv", data_frame: "pd.DataFrame" = None):
     """
     Generate a Markdown table from the DataFrame containing 'Agent Type' and 'Description' columns.
 
     Parameters:
     - name_csv (str): The name of the CSV file to load into the DataFrame.
+    - data_frame (DataFrame): An already loaded table to use instead of reading name_csv.
 
     Returns:
     - str: A Markdown formatted string of the unique table.
     """
     
-    # Load the DataFrame from the CSV file
-    df = pd.read_csv(name_csv)
+    # Load the DataFrame from the CSV file unless the caller already has it in memory
+    if data_frame is None:
+        import pandas as pd
+        data_frame = pd.read_csv(name_csv)
+    df = data_frame
 
     # Check if 'Agent Type' and 'Description' columns exist in the DataFrame
     if 'Agent Type' not in df.columns: